@@ -0,0 +1,49 @@
+# engine="c" (cgen_v3.py) against the tree walker and engine="python" on integer heavy programs.
+# "c (cold)" builds the binary into an empty cache first, "c" is the cached run (just spawning the binary).
+
+import os
+import tempfile
+
+from common import time_program, print_row
+
+FIB = """
+func fib(n: int): int {
+  if (n < 2) { return n; }
+  return fib(n - 1) + fib(n - 2);
+}
+func main(): void { print(fib(22)); }"""
+
+LOOPS = """
+func main(): void {
+  var i: int; var j: int; var s: int;
+  for (i = 0; i < 500; i = i + 1) {
+    for (j = 0; j < 500; j = j + 1) { if (j < i) { s = s + j; } else { s = s - 1; } }
+  }
+  print(s);
+}"""
+
+STRUCTS = """
+struct node { val: int; next: node; }
+func main(): void {
+  var head: node; var n: node; var i: int; var s: int;
+  for (i = 0; i < 50000; i = i + 1) { n = new node; n.val = i; n.next = head; head = n; }
+  n = head;
+  for (i = 0; i < 50000; i = i + 1) { s = s + n.val; n = n.next; }
+  print(s);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "engine", "total (s)", "vs tree")
+    for name, program in [("fib(22)", FIB), ("loops", LOOPS), ("structs", STRUCTS)]:
+        # (memo_size=0: compare engines on the calls themselves, not on the tree walker's memoization)
+        tree_time, _ = time_program(program, engine="tree", memo_size=0)
+        print_row(name, "tree", f"{tree_time:.3f}", "1.0x")
+        elapsed, _ = time_program(program, engine="python")
+        print_row(name, "python", f"{elapsed:.3f}", f"{tree_time / elapsed:.1f}x")
+        with tempfile.TemporaryDirectory() as cache:
+            os.environ["BREWIN_C_CACHE"] = cache
+            elapsed, _ = time_program(program, repeat=1, engine="c")
+            print_row(name, "c (cold)", f"{elapsed:.3f}", f"{tree_time / elapsed:.1f}x")
+            elapsed, _ = time_program(program, engine="c")
+            print_row(name, "c", f"{elapsed:.3f}", f"{tree_time / elapsed:.1f}x")
+            del os.environ["BREWIN_C_CACHE"]
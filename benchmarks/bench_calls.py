@@ -0,0 +1,38 @@
+# Call overhead: naive recursive fib and ackermann, both are almost nothing but brewin calls.
+# "nested" makes its calls from 8 nested blocks that all declare something, so the caller has a deep scope stack.
+# Memoization is off (memo_size=0), fib and ackermann would be cache hits otherwise.
+
+from common import time_program, print_row
+
+FIB = """
+func fib(n: int): int {
+  if (n < 2) { return n; }
+  return fib(n - 1) + fib(n - 2);
+}
+func main(): void { print(fib(20)); }"""
+
+ACKERMANN = """
+func ack(m: int, n: int): int {
+  if (m == 0) { return n + 1; }
+  if (n == 0) { return ack(m - 1, 1); }
+  return ack(m - 1, ack(m, n - 1));
+}
+func main(): void { print(ack(3, 5)); }"""
+
+NESTED = """
+func leaf(n: int): int { return n; }
+func main(): void {
+  var i: int; var s: int;
+  if (true) { var v0: int; if (true) { var v1: int; if (true) { var v2: int; if (true) { var v3: int;
+  if (true) { var v4: int; if (true) { var v5: int; if (true) { var v6: int; if (true) { var v7: int;
+    for (i = 0; i < 20000; i = i + 1) { s = s + leaf(i); }
+  } } } } } } } }
+  print(s);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "engine", "total (s)", "output")
+    for name, program in [("fib(20)", FIB), ("ack(3, 5)", ACKERMANN), ("nested", NESTED)]:
+        for engine in ["tree", "closure", "vm"]:
+            elapsed, output = time_program(program, repeat=5, engine=engine, memo_size=0)
+            print_row(name, engine, f"{elapsed:.3f}", output[-1])
@@ -0,0 +1,40 @@
+# Common subexpression elimination (cse_v3.py) on the kind of code a generator writes: the same dotted reads and
+# arithmetic spelled out several times per statement. Compares Interpreter(cse=False) with the default on the tree
+# walker (plain and jit=True) and prints Interpreter.get_cse_stats().
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+CHAINS = """
+struct node { value: int; next: node; }
+func main(): void {
+  var head: node; var n: node; var i: int; var s: int;
+  for (i = 0; i < 3; i = i + 1) { n = new node; n.value = i + 1; n.next = head; head = n; }
+  for (i = 0; i < 10000; i = i + 1) {
+    s = s + head.next.next.value * head.next.next.value + head.next.value * head.next.next.value;
+    if (head.next.next.value * head.next.next.value > head.next.value) { s = s - head.next.value; }
+  }
+  print(s);
+}"""
+
+ARITHMETIC = """
+func main(): void {
+  var i: int; var x: int; var y: int; var d: int;
+  for (i = 0; i < 10000; i = i + 1) {
+    x = i / 7; y = i / 3;
+    d = d + (x - y) * (x - y) + (x + y) * (x + y) - (x - y) * (x + y);
+  }
+  print(d);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "mode", "no cse (s)", "cse (s)", "speedup", "eliminated")
+    for name, program in [("chains", CHAINS), ("arithmetic", ARITHMETIC)]:
+        for mode, args in [("tree", {}), ("jit", {"jit": True})]:
+            before, expected = time_program(program, cse=False, **args)
+            after, output = time_program(program, **args)
+            assert output == expected, name
+            interpreter = Interpreter(console_output=False, **args)
+            interpreter.run(program)
+            stats = interpreter.get_cse_stats()
+            print_row(name, mode, f"{before:.3f}", f"{after:.3f}", f"{before / after:.2f}x", stats["functions"])
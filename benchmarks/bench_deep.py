@@ -0,0 +1,28 @@
+# Deep recursion: build a linked list, then walk it recursively (one brewin call per node).
+# The tree walker and closure engine recurse in python, so they only get the shallow runs (common.py raises the
+# recursion limit, but going much deeper risks blowing the C stack). The vm keeps brewin frames on its own stack
+# and also does the 1,000,000 deep run. Walk time = run time minus a run that only builds the list.
+
+from common import time_program, print_row
+
+def make_program(nodes, walk=True):
+    return f"""
+struct node {{ val: int; next: node; }}
+func length(n: node): int {{
+  if (n == nil) {{ return 0; }}
+  return 1 + length(n.next);
+}}
+func main(): void {{
+  var head: node; var n: node; var i: int;
+  for (i = 0; i < {nodes}; i = i + 1) {{ n = new node; n.val = i; n.next = head; head = n; }}
+  {"print(length(head));" if walk else ""}
+}}"""
+
+if __name__ == "__main__":
+    print_row("depth", "engine", "walk (s)", "us per call", "output")
+    runs = [(1000, "tree"), (1000, "closure"), (1000, "vm"), (1000000, "vm")]
+    for depth, engine in runs:
+        repeat = 1 if depth > 1000 else 3
+        elapsed, output = time_program(make_program(depth), repeat=repeat, engine=engine)
+        build, _ = time_program(make_program(depth, walk=False), repeat=repeat, engine=engine)
+        print_row(depth, engine, f"{elapsed - build:.3f}", f"{(elapsed - build) / depth * 1e6:.2f}", output[-1])
@@ -0,0 +1,47 @@
+# Scalar replacement of structs that never leave their function (escape_v3.py): helpers that build a struct as
+# scratch space and only read its fields back, and a loop that uses a struct as a bag of locals. Compares
+# Interpreter(scalar_replace=False) with the default on the tree walker (plain and jit=True) and prints
+# Interpreter.get_escape_stats().
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+HELPERS = """
+struct point { x: int; y: int; }
+func dist2(ax: int, ay: int, bx: int, by: int): int {
+  var d: point;
+  d = new point;
+  d.x = bx - ax; d.y = by - ay;
+  return d.x * d.x + d.y * d.y;
+}
+func main(): void {
+  var i: int; var s: int;
+  for (i = 0; i < 5000; i = i + 1) { s = s + dist2(i, i / 2, i / 3, 7); }
+  print(s);
+}"""
+
+ACCUMULATOR = """
+struct stats { count: int; total: int; low: int; high: int; }
+func main(): void {
+  var i: int; var v: int; var st: stats;
+  st = new stats; st.low = 1000000;
+  for (i = 0; i < 5000; i = i + 1) {
+    v = (i * 7919) / 13 - (i * 7919) / 13 / 100 * 100;
+    st.count = st.count + 1; st.total = st.total + v;
+    if (v < st.low) { st.low = v; }
+    if (v > st.high) { st.high = v; }
+  }
+  print(st.count, " ", st.total, " ", st.low, " ", st.high);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "mode", "objects (s)", "scalars (s)", "speedup", "replaced")
+    for name, program in [("helpers", HELPERS), ("accumulator", ACCUMULATOR)]:
+        for mode, args in [("tree", {}), ("jit", {"jit": True})]:
+            before, expected = time_program(program, scalar_replace=False, **args)
+            after, output = time_program(program, **args)
+            assert output == expected, name
+            interpreter = Interpreter(console_output=False, **args)
+            interpreter.run(program)
+            stats = interpreter.get_escape_stats()
+            print_row(name, mode, f"{before:.3f}", f"{after:.3f}", f"{before / after:.2f}x", stats["functions"])
@@ -0,0 +1,41 @@
+# Constant folding and dead branch elimination (fold_v3.py) on the kind of code a template expands to: config
+# values pasted in as literals, size computations spelled out, and debug/feature checks that are constant. Compares
+# Interpreter(fold=False) with the default on the tree walker and the vm, and prints Interpreter.get_fold_stats().
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+TEMPLATED = """
+func main(): void {
+  var i: int; var total: int; var label: string;
+  for (i = 0; i < 100 * 200; i = i + 1) {
+    total = total + (60 * 60 * 24) / (12 * 2) - 3600 + i * (4 - 3);
+    if (0 == 1) { print("debug: ", i); }
+    if (1 < 2 && !false) { label = "item" + "_" + "name"; } else { label = "unused"; }
+    if (2 * 8 >= 16) { total = total - (1024 / 512); }
+  }
+  print(total, " ", label);
+}"""
+
+CONDITIONS = """
+func check(n: int): bool {
+  if (3 > 2) { return n > 10 * 10 || (5 - 5 == 1); }
+  return false;
+}
+func main(): void {
+  var i: int; var c: int;
+  for (i = 0; i < 20000; i = i + 1) { if (check(i) && 7 != 7 - 0 * 100) { c = c + 1; } else { c = c + (2 + 2) / 4; } }
+  print(c);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "engine", "no fold (s)", "fold (s)", "folded", "dead branches")
+    for name, program in [("templated", TEMPLATED), ("conditions", CONDITIONS)]:
+        for engine in ["tree", "vm"]:
+            unfolded, expected = time_program(program, engine=engine, fold=False)
+            folded, output = time_program(program, engine=engine)
+            assert output == expected, name
+            interpreter = Interpreter(console_output=False, engine=engine)
+            interpreter.run(program)
+            stats = interpreter.get_fold_stats()
+            print_row(name, engine, f"{unfolded:.3f}", f"{folded:.3f}", stats["folded"], stats["dead_branches"])
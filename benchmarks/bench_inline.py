@@ -0,0 +1,48 @@
+# Inlining of small leaf functions (inline_v3.py) on a program that goes through getters/setters for everything,
+# plus small arithmetic helpers. Compares Interpreter(inline_budget=0) with the default budget on the tree walker
+# (plain and jit=True) and prints Interpreter.get_inline_stats().
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+ACCESSORS = """
+struct point { x: int; y: int; }
+func get_x(p: point): int { return p.x; }
+func get_y(p: point): int { return p.y; }
+func set_x(p: point, v: int): void { p.x = v; }
+func set_y(p: point, v: int): void { p.y = v; }
+func sq(a: int): int { return a * a; }
+func main(): void {
+  var p: point; var i: int; var d: int;
+  p = new point;
+  for (i = 0; i < 10000; i = i + 1) {
+    set_x(p, get_x(p) + 1);
+    set_y(p, get_y(p) + 2);
+    d = d + sq(get_x(p) - get_y(p)) / (get_x(p) + 1);
+  }
+  print(get_x(p), " ", get_y(p), " ", d);
+}"""
+
+HELPERS = """
+func add(a: int, b: int): int { return a + b; }
+func half(n: int): int { return n / 2; }
+func is_even(n: int): bool { return n / 2 * 2 == n; }
+func main(): void {
+  var i: int; var s: int;
+  for (i = 0; i < 10000; i = i + 1) {
+    if (is_even(i)) { s = add(s, half(i)); } else { s = add(s, -1); }
+  }
+  print(s);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "mode", "no inline (s)", "inline (s)", "speedup", "inlined funcs", "call sites")
+    for name, program in [("accessors", ACCESSORS), ("helpers", HELPERS)]:
+        for mode, args in [("tree", {}), ("jit", {"jit": True})]:
+            before, expected = time_program(program, inline_budget=0, **args)
+            after, output = time_program(program, **args)
+            assert output == expected, name
+            interpreter = Interpreter(console_output=False, **args)
+            interpreter.run(program)
+            stats = interpreter.get_inline_stats()
+            print_row(name, mode, f"{before:.3f}", f"{after:.3f}", f"{before / after:.2f}x", stats["inlined_functions"], stats["call_sites"])
@@ -0,0 +1,67 @@
+# Tracing JIT (Interpreter(jit=True), tracejit_v3.py) against the plain tree walker: a counting loop with arithmetic
+# and a branch that always goes the same way, a general loop (condition evaluated twice per iteration), a nested loop
+# (the inner loop gets its own trace), a loop that builds a struct list through calls, and a loop whose branch
+# alternates so its trace keeps side exiting and gets blacklisted. In the counting loop the branch flips once, a few
+# hundred iterations in, and the loop gets traced again. Prints Interpreter.get_jit_stats() for each.
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+COUNTING = """
+func main(): void {
+  var i: int; var s: int; var t: int;
+  for (i = 0; i < 40000; i = i + 1) {
+    t = (i * 3 + 7) / 2 - i;
+    if (t > 100 && i != 5) { s = s + t - (t / 3); } else { s = s - 1; }
+  }
+  print(s);
+}"""
+
+GENERAL = """
+func main(): void {
+  var i: int; var n: int; var s: int;
+  n = 40000;
+  for (i = 0; i * 2 < n + n; i = i + 1) { var d: int; d = n - i; s = s + d * d / (i + 1); }
+  print(s);
+}"""
+
+NESTED = """
+func main(): void {
+  var i: int; var j: int; var s: int;
+  for (i = 0; i < 200; i = i + 1) {
+    for (j = 0; j < 200; j = j + 1) { if (i == j) { s = s + 1; } else { s = s + i - j; } }
+  }
+  print(s);
+}"""
+
+CALLS = """
+struct node { val: int; next: node; }
+func push(head: node, v: int): node { var n: node; n = new node; n.val = v; n.next = head; return n; }
+func main(): void {
+  var head: node; var i: int; var s: int;
+  for (i = 0; i < 10000; i = i + 1) { head = push(head, i); }
+  for (i = 0; i < 10000; i = i + 1) { s = s + head.val; head = head.next; }
+  print(s);
+}"""
+
+ALTERNATING = """
+func main(): void {
+  var i: int; var even: bool; var s: int;
+  for (i = 0; i < 40000; i = i + 1) {
+    even = !even;
+    if (even) { s = s + i; } else { s = s - 1; }
+  }
+  print(s);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "tree (s)", "jit (s)", "speedup", "traces", "trace iters", "side exits", "retraces", "blacklisted")
+    for name, program in [("counting", COUNTING), ("general", GENERAL), ("nested", NESTED), ("calls", CALLS), ("alternating", ALTERNATING)]:
+        tree, expected = time_program(program)
+        jit, output = time_program(program, jit=True)
+        assert output == expected, name
+        interpreter = Interpreter(console_output=False, jit=True)
+        interpreter.run(program)
+        stats = interpreter.get_jit_stats()
+        print_row(name, f"{tree:.3f}", f"{jit:.3f}", f"{tree / jit:.1f}x", stats["traces"], stats["trace_iterations"],
+                  stats["side_exits"], stats["retraces"], stats["blacklisted"])
@@ -0,0 +1,44 @@
+# Loop overhead: nested counting loops (the `for (i = a; i < b; i = i + c)` fast path) next to the same
+# loops written with a condition the fast path doesn't take (a function call in the bound), and a loop nest
+# whose bodies are if/else blocks (one declares a variable, one doesn't) to show the cost of block scopes.
+
+from common import time_program, print_row
+
+N = 300
+
+COUNTING = f"""
+func main(): void {{
+  var i: int; var j: int; var s: int;
+  for (i = 0; i < {N}; i = i + 1) {{
+    for (j = 0; j < {N}; j = j + 1) {{ s = s + j; }}
+  }}
+  print(s);
+}}"""
+
+GENERAL = f"""
+func bound(): int {{ return {N}; }}
+func main(): void {{
+  var i: int; var j: int; var s: int;
+  for (i = 0; i < bound(); i = i + 1) {{
+    for (j = 0; j < bound(); j = j + 1) {{ s = s + j; }}
+  }}
+  print(s);
+}}"""
+
+BLOCKS = f"""
+func main(): void {{
+  var i: int; var j: int; var s: int;
+  for (i = 0; i < {N}; i = i + 1) {{
+    for (j = 0; j < {N}; j = j + 1) {{
+      if (j < i) {{ s = s + j; }} else {{ var t: int; t = j * 2; s = s + t; }}
+    }}
+  }}
+  print(s);
+}}"""
+
+if __name__ == "__main__":
+    print_row("loop", "engine", "total (s)", "ns per iter")
+    for name, program in [("counting", COUNTING), ("general", GENERAL), ("blocks", BLOCKS)]:
+        for engine in ["tree", "closure", "vm"]:
+            elapsed, _ = time_program(program, engine=engine)
+            print_row(name, engine, f"{elapsed:.3f}", f"{elapsed / (N * N) * 1e9:.0f}")
@@ -0,0 +1,52 @@
+# Memoization of pure functions (memo_v3.py) on the tree walker: naive recursive fib and grid path counting go
+# from exponential to linear, collatz reuses the chains of earlier numbers (and shows evictions with a small cache).
+# Compares Interpreter(memo_size=0) with the default (and memo_size=64 for collatz) and prints
+# Interpreter.get_memo_stats(). Without memoization fib(30) takes half a minute, so it's only run with it.
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+FIB = """
+func fib(n: int): int { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main(): void { print(fib(%d)); }"""
+
+PATHS = """
+func paths(r: int, c: int): int {
+  if (r == 0 || c == 0) { return 1; }
+  return paths(r - 1, c) + paths(r, c - 1);
+}
+func main(): void { print(paths(9, 9)); }"""
+
+COLLATZ = """
+func steps(n: int): int {
+  if (n == 1) { return 0; }
+  if (n / 2 * 2 == n) { return 1 + steps(n / 2); }
+  return 1 + steps(3 * n + 1);
+}
+func main(): void {
+  var i: int; var total: int;
+  for (i = 1; i < 3000; i = i + 1) { total = total + steps(i); }
+  print(total);
+}"""
+
+# (name, program, memo_size for the memoized run, run without memoization too)
+RUNS = [
+    ("fib(20)", FIB % 20, 4096, True),
+    ("fib(24)", FIB % 24, 4096, True),
+    ("fib(30)", FIB % 30, 4096, False),
+    ("paths(9, 9)", PATHS, 4096, True),
+    ("collatz", COLLATZ, 4096, True),
+    ("collatz", COLLATZ, 64, False),
+]
+
+if __name__ == "__main__":
+    print_row("program", "memo_size", "no memo (s)", "memo (s)", "hits", "misses", "evictions")
+    for name, program, memo_size, compare in RUNS:
+        before, expected = time_program(program, memo_size=0) if compare else (None, None)
+        after, output = time_program(program, memo_size=memo_size)
+        assert expected is None or output == expected, name
+        interpreter = Interpreter(console_output=False, memo_size=memo_size)
+        interpreter.run(program)
+        stats = interpreter.get_memo_stats()
+        print_row(name, memo_size, "-" if before is None else f"{before:.3f}", f"{after:.3f}",
+                  stats["hits"], stats["misses"], stats["evictions"])
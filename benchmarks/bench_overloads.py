@@ -0,0 +1,33 @@
+# Function lookup scaling: a program with N overloaded functions calling the last one defined.
+# With the old linear scan of func_defs, time per call grew with N; with the (name, arg count)
+# table and the per-call-site cache it should stay flat.
+
+from common import time_program, print_row
+
+CALLS = 2000
+
+# N functions: N // 5 names, each overloaded with 1..5 params
+def make_program(num_funcs, calls):
+    funcs = []
+    for k in range(num_funcs // 5):
+        for arity in range(1, 6):
+            params = ", ".join(f"a{i}: int" for i in range(arity))
+            body = " + ".join(f"a{i}" for i in range(arity))
+            funcs.append(f"func f{k}({params}): int {{ return {body}; }}")
+    last = num_funcs // 5 - 1
+    funcs.append(f"""
+func main(): void {{
+  var i: int; var s: int;
+  for (i = 0; i < {calls}; i = i + 1) {{ s = s + f{last}(i, 1, 2, 3, 4); }}
+  print(s);
+}}""")
+    return "\n".join(funcs)
+
+if __name__ == "__main__":
+    print_row("functions", "engine", "total (s)", "us per call")
+    for num_funcs in [10, 100, 500]:
+        for engine in ["tree", "closure", "vm"]:
+            # parsing/compiling grows with the number of functions, so subtract a run that makes no calls
+            elapsed, _ = time_program(make_program(num_funcs, CALLS), engine=engine)
+            load_time, _ = time_program(make_program(num_funcs, 0), engine=engine)
+            print_row(num_funcs, engine, f"{elapsed:.3f}", f"{(elapsed - load_time) / CALLS * 1e6:.1f}")
@@ -0,0 +1,26 @@
+# engine="python" (transpile_v3.py) against the other engines on cpu heavy programs: calls, counting loops, struct fields.
+# The python engine's time includes transpiling and compile() of the generated source.
+
+from common import time_program, print_row
+from bench_calls import FIB
+from bench_loops import COUNTING, BLOCKS
+
+STRUCTS = """
+struct node { val: int; next: node; }
+func main(): void {
+  var head: node; var n: node; var i: int; var s: int;
+  for (i = 0; i < 20000; i = i + 1) { n = new node; n.val = i; n.next = head; head = n; }
+  n = head;
+  for (i = 0; i < 20000; i = i + 1) { s = s + n.val; n = n.next; }
+  print(s);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "engine", "total (s)", "vs tree")
+    for name, program in [("fib(20)", FIB), ("counting", COUNTING), ("blocks", BLOCKS), ("structs", STRUCTS)]:
+        tree_time = None
+        for engine in ["tree", "closure", "vm", "python"]:
+            # (no memoization in the tree walker, it would turn fib into a few dozen calls)
+            elapsed, _ = time_program(program, engine=engine, memo_size=0)
+            tree_time = tree_time or elapsed
+            print_row(name, engine, f"{elapsed:.3f}", f"{tree_time / elapsed:.1f}x")
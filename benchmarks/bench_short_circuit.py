@@ -0,0 +1,55 @@
+# Interpreter(short_circuit=True) on guard-heavy list traversal: conditions whose first operand usually decides the
+# result, so the default strict && / || still pays for the second one every time. Compares the default with
+# short_circuit=True on the tree walker (plain and jit=True), the closure engine and the VM.
+# (memo_size=0 so the expensive check isn't answered from the memo cache either way)
+
+from common import time_program, print_row
+
+LIST = """
+struct node { value: int; next: node; }
+func digits_even(v: int): bool {
+  var s: int;
+  for (s = 0; v > 0; v = v / 10) { s = s + v - v / 10 * 10; }
+  return s / 2 * 2 == s;
+}
+func build(n: int): node {
+  var head: node; var x: node; var i: int;
+  for (i = 0; i < n; i = i + 1) { x = new node; x.value = i * 7919 + 13; x.next = head; head = x; }
+  return head;
+}
+"""
+
+# && : most nodes fail the cheap test
+FILTER = LIST + """
+func main(): void {
+  var head: node; var n: node; var pass: int; var c: int;
+  head = build(1000);
+  for (pass = 0; pass < 5; pass = pass + 1) {
+    for (n = head; n != nil; n = n.next) {
+      if (n.value > 7500000 && digits_even(n.value)) { c = c + 1; }
+    }
+  }
+  print(c);
+}"""
+
+# || : most nodes pass the cheap test
+DEFAULTS = LIST + """
+func main(): void {
+  var head: node; var n: node; var pass: int; var c: int;
+  head = build(1000);
+  for (pass = 0; pass < 5; pass = pass + 1) {
+    for (n = head; n != nil; n = n.next) {
+      if (n.value < 7000000 || digits_even(n.value)) { c = c + 1; }
+    }
+  }
+  print(c);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "engine", "strict (s)", "short (s)", "speedup")
+    for name, program in [("filter &&", FILTER), ("defaults ||", DEFAULTS)]:
+        for engine, args in [("tree", {}), ("tree jit", {"jit": True}), ("closure", {"engine": "closure"}), ("vm", {"engine": "vm"})]:
+            before, expected = time_program(program, memo_size=0, **args)
+            after, output = time_program(program, memo_size=0, short_circuit=True, **args)
+            assert output == expected, name
+            print_row(name, engine, f"{before:.3f}", f"{after:.3f}", f"{before / after:.2f}x")
@@ -0,0 +1,45 @@
+# Self-specializing operator nodes in the tree walker: an arithmetic/comparison heavy loop (every operator node
+# specializes on int operands), string building (str + str and str == str), and a struct != struct node that
+# deoptimizes when it reaches the nil at the end of a list. Prints Interpreter.get_specialization_stats() for each.
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+ARITH = """
+func main(): void {
+  var i: int; var s: int; var t: int;
+  for (i = 0; i < 40000; i = i + 1) {
+    t = (i * 3 + 7) / 2 - i;
+    if (t > 100 && i != 5) { s = s + t - (t / 3); } else { s = s - 1; }
+  }
+  print(s);
+}"""
+
+STRINGS = """
+func main(): void {
+  var i: int; var s: string; var n: int;
+  for (i = 0; i < 20000; i = i + 1) {
+    s = "ab" + "cd";
+    if (s == "abcd") { n = n + 1; }
+  }
+  print(n);
+}"""
+
+MIXED = """
+struct node { next: node; }
+func main(): void {
+  var head: node; var n: node; var i: int; var c: int;
+  for (i = 0; i < 20000; i = i + 1) { n = new node; n.next = head; head = n; }
+  n = head;
+  for (i = 0; i < 20000; i = i + 1) { if (n.next != head) { c = c + 1; } n = n.next; }
+  print(c);
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "total (s)", "specialized", "deoptimized")
+    for name, program in [("arith", ARITH), ("strings", STRINGS), ("mixed", MIXED)]:
+        elapsed, _ = time_program(program)
+        interpreter = Interpreter(console_output=False)
+        interpreter.run(program)
+        stats = getattr(interpreter, "get_specialization_stats", lambda: {})()
+        print_row(name, f"{elapsed:.3f}", stats.get("specialized", "-"), stats.get("deoptimized", "-"))
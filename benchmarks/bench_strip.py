@@ -0,0 +1,53 @@
+# Stripping what main can't reach (reach_v3.py) on a generated program: a library of helper functions and structs of
+# which main only uses a few. Compares Interpreter(strip=False) with the default on run() as a whole (parsing
+# included, the load time passes are what gets cheaper), plus its peak memory and what's left in the tables.
+# Pass a library size to try others, e.g. `python benchmarks/bench_strip.py 5000`.
+
+import sys
+
+from common import time_program, peak_memory, print_row
+from interpreterv3 import Interpreter
+
+STRUCT = """
+struct rec%(i)d { key: int; value: int; next: rec%(i)d; }"""
+
+HELPER = """
+func make%(i)d(key: int): rec%(i)d {
+  var r: rec%(i)d;
+  r = new rec%(i)d; r.key = key; r.value = key * %(i)d + 1;
+  return r;
+}
+func sum%(i)d(r: rec%(i)d, n: int): int {
+  var i: int; var s: int;
+  for (i = 0; i < n; i = i + 1) { if (r != nil) { s = s + r.value; r = r.next; } }
+  return s + helper%(i)d(n);
+}
+func helper%(i)d(n: int): int { if (n > 1) { return n * %(i)d - 1; } return n; }
+"""
+
+MAIN = """
+func main(): void {
+  var i: int; var s: int;
+  for (i = 0; i < 20; i = i + 1) { s = s + sum0(make0(i), 3) + sum1(make1(i), 2); }
+  print(s);
+}"""
+
+def library(size):
+    # (the grammar wants every struct before the functions)
+    return "".join(STRUCT % {"i": i} for i in range(size)) + "".join(HELPER % {"i": i} for i in range(size)) + MAIN
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 500, 2000]
+    print_row("helpers", "engine", "no strip (s)", "strip (s)", "speedup", "no strip peak", "strip peak", "funcs left")
+    for size in sizes:
+        program = library(size)
+        for engine in ["tree", "vm"]:
+            before, expected = time_program(program, strip=False, engine=engine)
+            after, output = time_program(program, engine=engine)
+            assert output == expected, size
+            before_peak, _ = peak_memory(program, strip=False, engine=engine)
+            after_peak, _ = peak_memory(program, engine=engine)
+            interpreter = Interpreter(console_output=False, engine=engine)
+            interpreter.run(program)
+            print_row(size, engine, f"{before:.3f}", f"{after:.3f}", f"{before / after:.2f}x", f"{before_peak // 1024} KiB",
+                      f"{after_peak // 1024} KiB", f"{len(interpreter.func_table)}/{size * 3 + 1}")
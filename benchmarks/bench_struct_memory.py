@@ -0,0 +1,53 @@
+# Memory per struct instance: build a linked list of N nodes (default 1M) and report bytes per node.
+# Usage: python benchmarks/bench_struct_memory.py [nodes] [engine]
+#
+# "dict fields" is the old instance layout (a dict of {'value': .., 'type': ..} dicts per instance) rebuilt
+# in plain python for comparison, "slots" is what the interpreter allocates now (__slots__ + a list of values).
+
+import sys
+import tracemalloc
+
+from common import peak_memory, print_row
+
+def make_program(nodes):
+    return f"""
+struct node {{ val: int; next: node; name: string; flag: bool; }}
+func main(): void {{
+  var head: node; var n: node; var i: int;
+  for (i = 0; i < {nodes}; i = i + 1) {{
+    n = new node;
+    n.val = i;
+    n.next = head;
+    head = n;
+  }}
+  print(head.val);
+}}"""
+
+# same list, built the way StructObject used to store its fields
+class OldStructObject():
+    def __init__(self, fields, _type):
+        self._fields = fields
+        self._type = _type
+
+def old_layout_peak(nodes):
+    tracemalloc.start()
+    head = None
+    for i in range(nodes):
+        n = OldStructObject({'val': {'value': 0, 'type': "int"}, 'next': {'value': None, 'type': "node"},
+                             'name': {'value': "", 'type': "string"}, 'flag': {'value': False, 'type': "bool"}}, "node")
+        n._fields['val']['value'] = i
+        n._fields['next']['value'] = head
+        head = n
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+if __name__ == "__main__":
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    engine = sys.argv[2] if len(sys.argv) > 2 else "closure"
+    # whatever run() allocates besides the nodes (parsing, compiling, ...)
+    base, _ = peak_memory(make_program(1), engine=engine)
+    peak, _ = peak_memory(make_program(nodes), engine=engine)
+    print_row("layout", "nodes", "bytes per node")
+    print_row("dict fields", nodes, f"{old_layout_peak(nodes) / nodes:.1f}")
+    print_row("slots", nodes, f"{(peak - base) / nodes:.1f}")
@@ -0,0 +1,26 @@
+# Struct allocation: build a linked list of N nodes with `new`.
+# `new` used to search struct_defs and work out every field's default value on each call,
+# with the struct registry it's a single copy of the struct's prebuilt template.
+
+from common import time_program, print_row
+
+def make_program(nodes):
+    return f"""
+struct node {{ val: int; next: node; name: string; flag: bool; }}
+func main(): void {{
+  var head: node; var n: node; var i: int;
+  for (i = 0; i < {nodes}; i = i + 1) {{
+    n = new node;
+    n.val = i;
+    n.next = head;
+    head = n;
+  }}
+  print(head.val);
+}}"""
+
+if __name__ == "__main__":
+    print_row("nodes", "engine", "total (s)", "us per node")
+    for nodes in [10000, 100000]:
+        for engine in ["tree", "closure", "vm"]:
+            elapsed, _ = time_program(make_program(nodes), engine=engine)
+            print_row(nodes, engine, f"{elapsed:.3f}", f"{elapsed / nodes * 1e6:.2f}")
@@ -0,0 +1,33 @@
+# Tail call elimination (tailcall_v3.py): a tail recursive countdown at growing depths on the tree walker, with
+# Interpreter(tail_calls=False) next to the default where the recursion still fits on the python stack. Peak memory
+# should stay flat with tail calls on. Pass depths to run others, e.g. `python benchmarks/bench_tailcall.py 10000000`
+# (a minute or so per run, and it runs twice).
+
+import sys
+
+from common import time_program, peak_memory, print_row
+
+COUNTDOWN = """
+func count(n: int, total: int): int {
+  if (n == 0) { return total; }
+  return count(n - 1, total + 1);
+}
+func main(): void { print(count(%d, 0)); }"""
+
+# deepest run without tail calls (deeper can overflow the C stack)
+MAX_RECURSIVE_DEPTH = 10000
+
+if __name__ == "__main__":
+    depths = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000]
+    print_row("depth", "no tco (s)", "no tco peak", "tco (s)", "tco peak")
+    for depth in depths:
+        program = COUNTDOWN % depth
+        before, before_peak = "-", "-"
+        if depth <= MAX_RECURSIVE_DEPTH:
+            elapsed, expected = time_program(program, tail_calls=False)
+            peak, _ = peak_memory(program, tail_calls=False)
+            before, before_peak = f"{elapsed:.3f}", f"{peak // 1024} KiB"
+        elapsed, output = time_program(program, repeat=1 if depth > 100000 else 3)
+        assert output == [str(depth)], output
+        peak, _ = peak_memory(program)
+        print_row(depth, before, before_peak, f"{elapsed:.3f}", f"{peak // 1024} KiB")
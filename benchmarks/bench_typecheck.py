@@ -0,0 +1,37 @@
+# Static type checker (typecheck_v3.py): how many of the assignment/argument/return checks in each program it proves
+# unnecessary, and how long the tree walker takes with those checks skipped (memoization off). fib is all argument
+# and return checks, the loop is all int/bool/string assignments, and the list program assigns struct fields and
+# passes structs around.
+
+from common import time_program, print_row
+from interpreterv3 import Interpreter
+
+FIB = """
+func fib(n: int): int { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main(): void { print(fib(20)); }"""
+
+ASSIGNMENTS = """
+func main(): void {
+  var i: int; var s: int; var b: bool; var t: string;
+  for (i = 0; i < 30000; i = i + 1) { s = s + i * 2; b = s > i; t = "x"; b = !b; }
+  print(s, b, t);
+}"""
+
+STRUCTS = """
+struct node { val: int; next: node; }
+func push(head: node, v: int): node { var n: node; n = new node; n.val = v; n.next = head; return n; }
+func total(n: node): int { var s: int; for (s = 0; n != nil; n = n.next) { s = s + n.val; } return s; }
+func main(): void {
+  var head: node; var i: int;
+  for (i = 0; i < 20000; i = i + 1) { head = push(head, i); }
+  print(total(head));
+}"""
+
+if __name__ == "__main__":
+    print_row("program", "total (s)", "checks", "proven", "mismatches")
+    for name, program in [("fib", FIB), ("assignments", ASSIGNMENTS), ("structs", STRUCTS)]:
+        elapsed, _ = time_program(program, memo_size=0)
+        interpreter = Interpreter(console_output=False)
+        interpreter.run(program)
+        stats = interpreter.get_typecheck_stats()
+        print_row(name, f"{elapsed:.3f}", stats["checks"], stats["proven"], stats["mismatches"])
@@ -0,0 +1,39 @@
+# Shared helpers for the benchmark scripts in this folder.
+# Run any of them from the repo root, e.g. `python benchmarks/bench_overloads.py`
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.setrecursionlimit(100000)
+
+from interpreterv3 import Interpreter
+
+# runs a brewin program `repeat` times, returns (best time in seconds, output of the last run)
+def time_program(program, repeat=3, inp=None, **interpreter_args):
+    best = None
+    output = None
+    for _ in range(repeat):
+        interpreter = Interpreter(console_output=False, inp=inp, **interpreter_args)
+        start = time.perf_counter()
+        interpreter.run(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        output = interpreter.get_output()
+    return best, output
+
+# runs a brewin program once under tracemalloc, returns (peak bytes allocated during run(), output)
+def peak_memory(program, inp=None, **interpreter_args):
+    interpreter = Interpreter(console_output=False, inp=inp, **interpreter_args)
+    tracemalloc.start()
+    try:
+        interpreter.run(program)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, interpreter.get_output()
+
+def print_row(*columns):
+    print("".join(f"{str(column):<16}" for column in columns))
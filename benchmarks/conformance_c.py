@@ -0,0 +1,146 @@
+# Conformance run for engine="c" (cgen_v3.py): every program here is run on the tree walker and on the C backend,
+# and the outputs and errors have to be the same. The "mode" column says whether the C run was native, fell back
+# to the tree walker before starting, or was replayed after the binary bailed out. Exits with 1 on any mismatch.
+
+import sys
+
+from common import print_row
+from interpreterv3 import Interpreter
+
+PROGRAMS = [
+    ("fib", """
+func fib(n: int): int { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main(): void { print(fib(15)); }""", None),
+    ("overloads", """
+func f(): int { return 1; }
+func f(a: int): int { return a * 10; }
+func f(a: int, b: bool): string { if (b) { return "yes"; } return "no"; }
+func main(): void { print(f(), " ", f(4), " ", f(1, 0), " ", f(1, 7)); }""", None),
+    ("arith", """
+func main(): void {
+  print(7 / 2, " ", -7 / 2, " ", 7 / -2, " ", -(3 - 10) * 4, " ", 2 - 3 - 4);
+  print("con" + "cat", " ", "a" == "a", " ", "a" != "b", " ", 1 == true, " ", 0 == false, " ", 3 == "3");
+  print(!0, " ", !5, " ", true && 0, " ", false || 2, " ", nil == nil);
+}""", None),
+    ("linked list", """
+struct node { val: int; next: node; }
+func build(n: int): node {
+  var head: node; var i: int;
+  for (i = 0; i < n; i = i + 1) { var x: node; x = new node; x.val = i; x.next = head; head = x; }
+  return head;
+}
+func sum(n: node): int { if (n == nil) { return 0; } return n.val + sum(n.next); }
+func main(): void { var l: node; l = build(100); print(sum(l), " ", l.next.next.val, " ", l == l, " ", l == l.next); }""", None),
+    ("struct fields", """
+struct inner { flag: bool; name: string; }
+struct outer { in: inner; count: int; }
+func main(): void {
+  var o: outer; o = new outer;
+  print(o.count, " ", o.in == nil);
+  o.in = new inner; o.in.flag = 5; o.in.name = "x";
+  print(o.in.flag, " ", o.in.name, "|");
+}""", None),
+    ("nested returns", """
+func pick(n: int): int {
+  var i: int;
+  for (i = 0; i < 10; i = i + 1) { if (i == n) { return i * 100; } }
+  return -1;
+}
+func noisy(): int { print("noisy"); return 3; }
+func f(): int { if (true) { noisy(); print("unreached"); } return 0; }
+func g(): int { if (true) { return nil; } return 5; }
+func main(): void { print(pick(4), " ", pick(20), " ", f(), " ", g()); }""", None),
+    ("last statement", """
+func a(): int { 5; return 6; print("still runs"); }
+func b(): int { return 1; return 2; }
+func c(): bool { return 3; }
+func main(): void { print(a(), " ", b(), " ", c()); }""", None),
+    ("general loop", """
+func bound(): int { print("bound"); return 2; }
+func main(): void { var i: int; for (i = 0; i < bound(); i = i + 1) { print(i); } }""", None),
+    ("input", """
+func main(): void {
+  var a: int; var s: string; var b: bool;
+  a = inputi("first: "); s = inputs(); b = inputi(7);
+  print(a + 1, " ", s, " ", b);
+}""", ["41", "words", "0"]),
+    ("input returned", """
+func get(): int { if (true) { inputi(); } return 0; }
+func main(): void { print(get() * 2); }""", ["21"]),
+    ("bad input type", """
+func main(): void { var a: int; a = inputi("n: "); }""", ["abc"]),
+    ("nil field", """
+struct p { x: int; }
+func main(): void { var q: p; print("before"); print(q.x); }""", None),
+    ("bad arg", """
+struct p { x: int; }
+struct r { x: int; }
+func f(v: p): int { return 1; }
+func main(): void { var q: r; print(f(q)); q = new r; print(f(q)); }""", None),
+    ("bad return", """
+func f(): string { return 5; }
+func main(): void { print("start"); f(); }""", None),
+    ("void call value", """
+func f(): int { return 1; }
+func main(): void { print("x"); f(); }""", None),
+    ("div by zero", """
+func main(): void { var z: int; print("a"); print(5 / z); }""", None),
+    ("overflow replay", """
+func main(): void {
+  var x: int; var i: int; x = inputi("start: ");
+  for (i = 0; i < 70; i = i + 1) { x = x * 2; }
+  print(x);
+}""", ["3"]),
+    ("deep recursion", """
+func down(n: int): int { if (n == 0) { return 0; } return 1 + down(n - 1); }
+func main(): void { print(down(500)); }""", None),
+    ("dynamic types", """
+func main(): void { var s: string; s = "n"; print(s + 1); }""", None),
+    ("nil as int", """
+struct Node { v: int; }
+func f0(): int { return f1(); }
+func f1(): Node { return nil; }
+func main(): void { print(f0() + 1); }""", None),
+    ("nil as bool", """
+struct Node { v: int; }
+func f0(d: int): bool { f1(d); }
+func f1(d: int): Node { var n: int; }
+func main(): void { print(f0(1) || false); }""", None),
+    ("nil as string", """
+struct Node { v: int; }
+func f0(d: int): string { f1(d); }
+func f1(d: int): Node { var n: int; }
+func main(): void { print(f0(1) + "z"); }""", None),
+    ("struct as int", """
+struct Node { v: int; }
+func f0(): int { return f1(); }
+func f1(): Node { return new Node; }
+func main(): void { print("a"); print(f0()); }""", None),
+    ("undeclared var", """
+func main(): void { print("hi"); x = 1; }""", None),
+]
+
+def run(program, inp, engine):
+    interpreter = Interpreter(console_output=False, inp=inp, engine=engine)
+    try:
+        interpreter.run(program)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return interpreter, (interpreter.get_output(), error)
+
+if __name__ == "__main__":
+    print_row("program", "mode", "result")
+    mismatches = 0
+    for name, program, inp in PROGRAMS:
+        _, expected = run(program, inp, "tree")
+        interpreter, got = run(program, inp, "c")
+        mode = "native" if interpreter.c_fallback is None else interpreter.c_fallback.split(":")[0]
+        ok = got == expected
+        mismatches += not ok
+        print_row(name, mode, "ok" if ok else "MISMATCH")
+        if not ok:
+            print("    tree:", expected)
+            print("    c:   ", got)
+    print(f"{len(PROGRAMS)} programs, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
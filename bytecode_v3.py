@@ -0,0 +1,407 @@
+# Bytecode compiler for the v3 interpreter (the VM that runs it is in vm_v3.py).
+# Each function is lowered into one flat list of ints: an opcode followed by its operands.
+# Variables are resolved to local slot numbers here, so the VM never looks a name up at runtime.
+# Like closure_v3.py, anything the tree walker only reports at runtime (unknown names, wrong arg counts, ...)
+# is compiled into a RAISE_ERROR at the spot where the tree walker would have raised it.
+
+from brewparse import parse_program
+from intbase import *
+from type_valuev3 import *
+from resolver_v3 import ScopeResolver
+
+## Opcodes ##
+# (name, number of operands)
+OPCODES = [
+    ("LOAD_CONST", 1),          # push consts[k]
+    ("LOAD_LOCAL", 1),          # push locals[s]
+    ("LOAD_LOCAL_CHECKED", 2),  # push locals[s], NAME_ERROR consts[k] if it was never bound (main's params)
+    ("LOAD_FIELD", 1),          # replace struct on top of stack with its field consts[k]
+    ("STORE_LOCAL", 2),         # pop into locals[s], coerced/type checked against type consts[k]
+    ("STORE_LOCAL_CHECKED", 3), # same as STORE_LOCAL, NAME_ERROR consts[n] if never bound
+    ("STORE_FIELD", 1),         # pop struct, pop value, store value into field consts[k]
+    ("DEFINE_LOCAL", 1),        # pop into locals[s] (no checks, used for var definitions)
+    ("DEFAULT_VALUE", 1),       # push get_default_value(consts[k]) (only emitted for types that error)
+    ("BINARY_ADD", 0),
+    ("BINARY_SUB", 0),
+    ("BINARY_MUL", 0),
+    ("BINARY_DIV", 0),
+    ("UNARY_NEG", 0),
+    ("UNARY_NOT", 0),
+    ("COMPARE_EQ", 0),
+    ("COMPARE_NE", 0),
+    ("COMPARE_LT", 0),
+    ("COMPARE_LE", 0),
+    ("COMPARE_GT", 0),
+    ("COMPARE_GE", 0),
+    ("BOOL_AND", 0),
+    ("BOOL_OR", 0),
+    ("JUMP", 1),                # pc = t
+    ("POP_JUMP_IF_FALSY", 1),   # python truthiness, used by the first for loop condition check
+    ("POP_JUMP_IF_NOT_COND", 1),# coerce to bool (TYPE_ERROR if it can't be), jump if false
+    ("CHECK_COND", 0),          # pop, coerce to bool, TYPE_ERROR if it can't be
+    ("JUMP_IF_FALSE_OR_POP", 1),# short_circuit &&: coerce top to bool (TYPE_ERROR if it can't be), jump if false, else pop
+    ("JUMP_IF_TRUE_OR_POP", 1), # short_circuit ||: same, jump if true
+    ("CHECK_BOOL_OPERAND", 1),  # short_circuit: coerce top to bool, TYPE_ERROR for operator consts[k] if it can't be
+    ("POP", 0),
+    ("CHECK_ARG", 1),           # coerce/type check top of stack against param consts[k] = (name, type)
+    ("CALL", 2),                # call funcs[f] with the top n values as arguments
+    ("RETURN", 0),              # pop, type check against the return type, return to caller
+    ("RETURN_IF_NOT_NIL", 0),   # pop, RETURN it unless it's nil
+    ("PRINT", 1),               # pop n values and print them
+    ("INPUT", 1),               # pop+output a prompt if operand is 1, push input
+    ("NEW", 1),                 # push new struct of type consts[k]
+    ("RAISE_ERROR", 1),         # consts[k] = (ErrorType, message)
+]
+
+OPCODE_NAMES = [name for name, _ in OPCODES]
+OPERAND_COUNTS = [count for _, count in OPCODES]
+for _opcode, (_name, _) in enumerate(OPCODES):
+    globals()[_name] = _opcode
+
+BINARY_OPS = {"+": BINARY_ADD, "-": BINARY_SUB, "*": BINARY_MUL, "/": BINARY_DIV}
+COMPARE_OPS = {"==": COMPARE_EQ, "!=": COMPARE_NE, "<": COMPARE_LT, "<=": COMPARE_LE, ">": COMPARE_GT, ">=": COMPARE_GE}
+BOOL_OPS = {"&&": BOOL_AND, "||": BOOL_OR}
+OPERATOR_SYMBOLS = {opcode: symbol for symbol, opcode in (BINARY_OPS | COMPARE_OPS | BOOL_OPS).items()}
+
+# Compiled form of a single brewin function
+class CodeObject():
+    def __init__(self, name, params, return_type):
+        self.name = name
+        self.params = params # [(name, type)]
+        self.return_type = return_type
+        self.code = []
+        self.consts = []
+        self.local_names = [] # slot -> variable name (for the disassembler)
+        self.nlocals = 0
+
+class BytecodeCompiler():
+    def __init__(self, interpreter):
+        self.interp = interpreter
+        self.func_index = {} # id(func node) -> index into funcs
+
+    # returns a list of CodeObjects, in the same order as interp.func_defs
+    def compile_program(self):
+        self.main_func_node = None
+        for i, func_node in enumerate(self.interp.func_defs):
+            self.func_index[id(func_node)] = i
+            if self.main_func_node is None and func_node.dict['name'] == "main":
+                self.main_func_node = func_node
+        return [self.compile_func(func_node) for func_node in self.interp.func_defs]
+
+    def compile_func(self, func_node):
+        params = [(arg.dict['name'], arg.dict['var_type']) for arg in func_node.dict['args']]
+        self.code_obj = CodeObject(func_node.dict['name'], params, func_node.dict['return_type'])
+        self.const_index = {}
+        # main is started without any arguments bound, so its params have to be checked on use
+        self.unbound_params = func_node is self.main_func_node
+        # scopes are name -> (slot, type), same nesting as variable_scope_stack would have
+        self.scopes = [{}]
+        for name, var_type in params:
+            self.scopes[-1][name] = (self.new_slot(name), var_type)
+
+        ### BEGIN FUNC SCOPE ###
+        self.scopes.append({})
+        statements = func_node.dict['statements']
+        # only the last statement's result can become the return value (see run_func)
+        for statement in statements[:-1]:
+            self.compile_statement(statement, nested=False)
+        self.compile_last_statement(statements[-1])
+        self.emit(RETURN)
+        self.scopes.pop()
+        return self.code_obj
+
+    ## helpers ##
+    def emit(self, opcode, *operands):
+        self.code_obj.code.append(opcode)
+        self.code_obj.code.extend(operands)
+        return len(self.code_obj.code) - 1 # index of last operand, used to patch jumps
+
+    def emit_jump(self, opcode):
+        return self.emit(opcode, -1)
+
+    def patch_jump(self, operand_index):
+        self.code_obj.code[operand_index] = len(self.code_obj.code)
+
+    def const(self, value):
+        key = (type(value), value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.code_obj.consts)
+            self.code_obj.consts.append(value)
+        return self.const_index[key]
+
+    def new_slot(self, name):
+        self.code_obj.local_names.append(name)
+        self.code_obj.nlocals += 1
+        return self.code_obj.nlocals - 1
+
+    # returns (slot, type, is_param) or None if the name isn't declared here
+    def resolve(self, var_name):
+        for depth in range(len(self.scopes) - 1, -1, -1):
+            if var_name in self.scopes[depth]:
+                slot, var_type = self.scopes[depth][var_name]
+                return slot, var_type, depth == 0
+        return None
+
+    def emit_error(self, error_type, message):
+        self.emit(RAISE_ERROR, self.const((error_type, message)))
+
+    ## Statements ##
+    # nested=True means we're inside an if/for block, where any non-nil statement result returns from the function
+    def compile_statement(self, statement_node, nested):
+        match statement_node.elem_type:
+            case "vardef":
+                self.compile_definition(statement_node)
+            case "=":
+                self.compile_assignment(statement_node)
+            case "fcall":
+                self.compile_func_call(statement_node)
+                self.emit(RETURN_IF_NOT_NIL if nested else POP)
+            case "return":
+                if not statement_node.dict['expression']:
+                    self.emit(LOAD_CONST, self.const(nil))
+                    self.emit(RETURN)
+                else:
+                    # return with a value is just a statement that results in that value (see do_return_statement)
+                    self.compile_expression(statement_node.dict['expression'])
+                    self.emit(RETURN_IF_NOT_NIL if nested else POP)
+            case "if":
+                self.compile_if_statement(statement_node)
+            case "for":
+                self.compile_for_loop(statement_node)
+
+    # last statement of a function body leaves its result on the stack
+    def compile_last_statement(self, statement_node):
+        if statement_node.elem_type == "fcall":
+            self.compile_func_call(statement_node)
+        elif statement_node.elem_type == "return" and statement_node.dict['expression']:
+            self.compile_expression(statement_node.dict['expression'])
+        else:
+            self.compile_statement(statement_node, nested=False)
+            self.emit(LOAD_CONST, self.const(nil))
+
+    def compile_block(self, statements):
+        self.scopes.append({})
+        for statement in statements or []:
+            self.compile_statement(statement, nested=True)
+        self.scopes.pop()
+
+    def compile_definition(self, statement_node):
+        var_name = statement_node.dict['name']
+        var_type = statement_node.dict['var_type']
+        if var_name in self.scopes[-1]:
+            self.emit_error(ErrorType.NAME_ERROR, f"Variable {var_name} defined more than once")
+            return
+        if var_type in ["int", "bool", "string", "void"] or var_type in self.interp.struct_registry:
+            self.emit(LOAD_CONST, self.const(self.interp.get_default_value(var_type)))
+        else:
+            self.emit(DEFAULT_VALUE, self.const(var_type)) # errors at runtime
+        slot = self.new_slot(var_name)
+        self.emit(DEFINE_LOCAL, slot)
+        self.scopes[-1][var_name] = (slot, var_type)
+
+    def compile_assignment(self, statement_node):
+        var_name = statement_node.dict['var_name']
+        fields = statement_node.dict['fields']
+        # right side is evaluated before the variable is looked up
+        self.compile_expression(statement_node.dict['expression'])
+        resolved = self.resolve(var_name)
+        not_declared = (ErrorType.NAME_ERROR, f"variable used and not declared: {var_name}")
+        if resolved is None:
+            self.emit(RAISE_ERROR, self.const(not_declared))
+            return
+        slot, var_type, is_param = resolved
+        checked = is_param and self.unbound_params
+        if not fields:
+            if checked:
+                self.emit(STORE_LOCAL_CHECKED, slot, self.const(var_type), self.const(not_declared))
+            else:
+                self.emit(STORE_LOCAL, slot, self.const(var_type))
+            return
+        if checked:
+            self.emit(LOAD_LOCAL_CHECKED, slot, self.const(not_declared))
+        else:
+            self.emit(LOAD_LOCAL, slot)
+        for field in fields[:-1]:
+            self.emit(LOAD_FIELD, self.const(field))
+        self.emit(STORE_FIELD, self.const(fields[-1]))
+
+    def compile_if_statement(self, statement_node):
+        self.compile_expression(statement_node.dict['condition'])
+        else_jump = self.emit_jump(POP_JUMP_IF_NOT_COND)
+        self.compile_block(statement_node.dict['statements'])
+        if statement_node.dict['else_statements']:
+            end_jump = self.emit_jump(JUMP)
+            self.patch_jump(else_jump)
+            self.compile_block(statement_node.dict['else_statements'])
+            self.patch_jump(end_jump)
+        else:
+            self.patch_jump(else_jump)
+
+    def compile_for_loop(self, statement_node):
+        self.compile_statement(statement_node.dict['init'], nested=False)
+        loop_start = len(self.code_obj.code)
+        if statement_node.dict['counting']:
+            # the condition of a counting loop has no side effects (see ScopeResolver.is_counting_loop),
+            # so evaluating it once gives the same result and errors
+            self.compile_expression(statement_node.dict['condition'])
+            exit_jump = self.emit_jump(POP_JUMP_IF_NOT_COND)
+        else:
+            # condition is evaluated twice per iteration, just like the tree walker
+            self.compile_expression(statement_node.dict['condition'])
+            exit_jump = self.emit_jump(POP_JUMP_IF_FALSY)
+            self.compile_expression(statement_node.dict['condition'])
+            self.emit(CHECK_COND)
+        self.compile_block(statement_node.dict['statements'])
+        self.compile_statement(statement_node.dict['update'], nested=False)
+        self.emit(JUMP, loop_start)
+        self.patch_jump(exit_jump)
+
+    ## Function Calls ##
+    def compile_func_call(self, call_node):
+        func_call = call_node.dict['name']
+        args = call_node.dict['args']
+        if func_call == "print":
+            for arg in args:
+                self.compile_expression(arg)
+            self.emit(PRINT, len(args))
+            return
+        if func_call in ["inputi", "inputs"]:
+            if len(args) > 1:
+                self.emit_error(ErrorType.NAME_ERROR, f"No {func_call}() function found that takes > 1 parameter")
+                return
+            for arg in args:
+                self.compile_expression(arg)
+            self.emit(INPUT, len(args))
+            return
+
+        ## USER-DEFINED FUNCTION ##
+        if not self.interp.check_valid_func(func_call):
+            self.emit_error(ErrorType.NAME_ERROR, f"Function {func_call} was not found")
+            return
+        func_def = self.find_func_def(func_call, len(args))
+        if func_def is None:
+            self.emit_error(ErrorType.NAME_ERROR, f"Incorrect amount of arguments given: {len(args)} ")
+            return
+        # each arg is evaluated and checked before the next one is evaluated
+        for arg, param in zip(args, func_def.dict['args']):
+            self.compile_expression(arg)
+            self.emit(CHECK_ARG, self.const((param.dict['name'], param.dict['var_type'])))
+        self.emit(CALL, self.func_index[id(func_def)], len(args))
+
+    def find_func_def(self, func_call, arg_len):
+        return self.interp.func_table.get((func_call, arg_len))
+
+    ## Expressions ##
+    def compile_expression(self, expression_node):
+        elem_type = expression_node.elem_type
+        if elem_type in ["int", "string", "bool"]:
+            self.emit(LOAD_CONST, self.const(expression_node.dict['val']))
+        elif elem_type == "nil":
+            self.emit(LOAD_CONST, self.const(nil))
+        elif elem_type == "var":
+            self.compile_variable(expression_node)
+        elif elem_type in BOOL_OPS and self.interp.short_circuit:
+            # the first operand is the result if it decides it, otherwise the (checked) second one is
+            self.compile_expression(expression_node.dict['op1'])
+            end_jump = self.emit_jump(JUMP_IF_FALSE_OR_POP if elem_type == "&&" else JUMP_IF_TRUE_OR_POP)
+            self.compile_expression(expression_node.dict['op2'])
+            self.emit(CHECK_BOOL_OPERAND, self.const(elem_type))
+            self.patch_jump(end_jump)
+        elif elem_type in BINARY_OPS or elem_type in COMPARE_OPS or elem_type in BOOL_OPS:
+            self.compile_expression(expression_node.dict['op1'])
+            self.compile_expression(expression_node.dict['op2'])
+            opcode = BINARY_OPS.get(elem_type)
+            if opcode is None:
+                opcode = COMPARE_OPS.get(elem_type, BOOL_OPS.get(elem_type))
+            self.emit(opcode)
+        elif elem_type == "neg":
+            self.compile_expression(expression_node.dict['op1'])
+            self.emit(UNARY_NEG)
+        elif elem_type == "!":
+            self.compile_expression(expression_node.dict['op1'])
+            self.emit(UNARY_NOT)
+        elif elem_type == "fcall":
+            self.compile_func_call_expression(expression_node)
+        elif elem_type == "new":
+            self.emit(NEW, self.const(expression_node.dict['var_type']))
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+
+    def compile_variable(self, expression_node):
+        var_name = expression_node.dict['var_name']
+        fields = expression_node.dict['fields']
+        not_declared = (ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared")
+        resolved = self.resolve(var_name)
+        if resolved is None:
+            self.emit(RAISE_ERROR, self.const(not_declared))
+            return
+        slot, _, is_param = resolved
+        if is_param and self.unbound_params:
+            self.emit(LOAD_LOCAL_CHECKED, slot, self.const(not_declared))
+        else:
+            self.emit(LOAD_LOCAL, slot)
+        for field in fields:
+            self.emit(LOAD_FIELD, self.const(field))
+
+    # same as evaluate_expression's fcall case: void check first, then the call itself
+    def compile_func_call_expression(self, expression_node):
+        func_call = expression_node.dict['name']
+        if func_call not in self.interp.builtin_funcs:
+            arg_len = len(expression_node.dict['args'])
+            func_def = self.find_func_def(func_call, arg_len)
+            if func_def is None:
+                self.emit_error(ErrorType.NAME_ERROR, f"Incorrect amount of arguments given: {arg_len} ")
+                return
+            if func_def.dict['return_type'] == "void":
+                self.emit_error(ErrorType.TYPE_ERROR, f"Function return type void must not be in expression.")
+                return
+        self.compile_func_call(expression_node)
+
+## Disassembler ##
+# funcs (the whole compiled program) is only used to show the names of called functions
+def disassemble(code_obj, funcs=None):
+    lines = [f"func {code_obj.name}({', '.join(f'{n}: {t}' for n, t in code_obj.params)}): {code_obj.return_type}"
+             f"  [{code_obj.nlocals} locals]"]
+    code = code_obj.code
+    pc = 0
+    while pc < len(code):
+        opcode = code[pc]
+        operands = code[pc + 1:pc + 1 + OPERAND_COUNTS[opcode]]
+        lines.append(f"  {pc:5} {OPCODE_NAMES[opcode]:<22}{' '.join(str(x) for x in operands):<10}{describe_operands(code_obj, opcode, operands, funcs)}")
+        pc += 1 + OPERAND_COUNTS[opcode]
+    return "\n".join(lines)
+
+def describe_operands(code_obj, opcode, operands, funcs):
+    if opcode in [LOAD_CONST, LOAD_FIELD, STORE_FIELD, DEFAULT_VALUE, CHECK_ARG, NEW, RAISE_ERROR, CHECK_BOOL_OPERAND]:
+        return f"({show_const(code_obj.consts[operands[0]])})"
+    if opcode in [LOAD_LOCAL, LOAD_LOCAL_CHECKED, STORE_LOCAL, STORE_LOCAL_CHECKED, DEFINE_LOCAL]:
+        return f"({code_obj.local_names[operands[0]]})"
+    if opcode in [JUMP, POP_JUMP_IF_FALSY, POP_JUMP_IF_NOT_COND, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP]:
+        return f"(to {operands[0]})"
+    if opcode == CALL and funcs:
+        return f"({funcs[operands[0]].name})"
+    return ""
+
+def show_const(value):
+    if value is nil:
+        return "nil"
+    if type(value) is tuple and value and type(value[0]) is ErrorType:
+        return f"{value[0].name}: {value[1]}"
+    return repr(value)
+
+def disassemble_program(interpreter, program):
+    ast = parse_program(program)
+    interpreter.struct_defs = interpreter.get_struct_defs(ast)
+    interpreter.build_struct_registry()
+    interpreter.func_defs = interpreter.get_func_defs(ast)
+    interpreter.build_func_table()
+    ScopeResolver().resolve_program(interpreter.func_defs)
+    funcs = BytecodeCompiler(interpreter).compile_program()
+    return "\n\n".join(disassemble(code_obj, funcs) for code_obj in funcs)
+
+# python bytecode_v3.py program.br -> prints the disassembly
+if __name__ == "__main__":
+    import sys
+    from interpreterv3 import Interpreter
+    with open(sys.argv[1]) as f:
+        print(disassemble_program(Interpreter(), f.read()))
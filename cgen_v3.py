@@ -0,0 +1,843 @@
+# Brewin -> C backend for the v3 interpreter (engine="c").
+# The program is translated to C, built with the system C compiler (CC, default cc) and the binary is cached by the
+# hash of the generated source, so a program is only compiled once. The binary doesn't print or read anything itself:
+# it sends every output and input request over a pipe (see the runtime below) and NativeRunner passes them to
+# Interpreter.output / get_input, so the I/O contract is the same as the other engines.
+#
+# Only a statically typed subset is translated. Every variable, param and return type has to be int, bool, string or
+# a struct, and every operator has to get operand types it's defined for (an input value can only be assigned,
+# passed, returned or printed). Anything else raises Unsupported while generating and the program is run by the
+# tree walker instead, so a program that would error on the type rules is never compiled. What can still go wrong at
+# runtime is reported the way interpreterv3.py reports it (nil field access, bad input types, return type mismatches,
+# division by zero). Things C can't do the same way (int64 overflow, an input the interpreter would turn into None,
+# a crash) make the binary bail out: the run is replayed on the tree walker with the inputs it already read, and the
+# outputs that were already shown are skipped.
+#
+# Statement values follow run_func like transpile_v3.py: a function returns (type checked) whatever its last top level
+# statement gave back, a bare `return;` stops it, and inside if/for bodies any non-nil statement value returns it.
+# Structs are heap records that are never freed.
+
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+
+from brewparse import parse_program
+from intbase import *
+from type_valuev3 import *
+from resolver_v3 import ScopeResolver
+from fold_v3 import ConstantFolder
+
+# anything the C backend can't translate, the message says what
+class Unsupported(Exception):
+    pass
+
+# python type names in the interpreter's error messages, by static type (structs are handled separately)
+ASSIGN_TYPE_NAMES = {"int": "int", "bool": "bool", "string": "str", "nil": "Element"}
+ARG_TYPE_NAMES = {"int": "<class 'int'>", "bool": "<class 'bool'>", "string": "<class 'str'>", "nil": "<class 'element.Element'>"}
+
+# Messages from the binary are a tag byte, the data's length in decimal, ':' and the data.
+#   o print output       I/B/S/N input prompt (int, bool, string, nil)
+#   r input request      E error ("<ErrorType value> <message>")
+#   Z division by zero   X bail out (replay on the tree walker)     D done
+# An input request is answered with i (int), s (string) or x (bail out) in the same format.
+RUNTIME = r"""#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef const char *brw_str;
+typedef struct { bool is_str; int64_t i; brw_str s; } brw_dyn; /* what inputi/inputs give back */
+
+static void brw_send(char tag, const char *data, size_t len) {
+    printf("%c%zu:", tag, len);
+    fwrite(data, 1, len, stdout);
+}
+
+static void brw_exit(char tag, const char *data) {
+    brw_send(tag, data, strlen(data));
+    fflush(stdout);
+    exit(0);
+}
+
+__attribute__((noreturn)) static void brw_error(int type, const char *message) {
+    char buf[1024];
+    snprintf(buf, sizeof buf, "%d %s", type, message);
+    brw_exit('E', buf);
+    exit(0);
+}
+
+__attribute__((noreturn)) static void brw_bail(const char *reason) {
+    brw_exit('X', reason);
+    exit(0);
+}
+
+/* pieces of the next print/prompt, sent as one message */
+static char *out_buf;
+static size_t out_len, out_cap;
+
+static void out_bytes(const char *data, size_t len) {
+    if (out_len + len > out_cap) {
+        out_cap = (out_len + len) * 2 + 64;
+        out_buf = realloc(out_buf, out_cap);
+    }
+    memcpy(out_buf + out_len, data, len);
+    out_len += len;
+}
+
+static void out_str(brw_str s) { out_bytes(s, strlen(s)); }
+
+static void out_int(int64_t v) {
+    char buf[32];
+    out_bytes(buf, snprintf(buf, sizeof buf, "%lld", (long long)v));
+}
+
+static void out_bool(bool v) { out_str(v ? "true" : "false"); }
+
+static void out_dyn(brw_dyn v) {
+    if (v.is_str) out_str(v.s);
+    else out_int(v.i);
+}
+
+static void out_flush(char tag) {
+    brw_send(tag, out_buf ? out_buf : "", out_len);
+    out_len = 0;
+}
+
+static brw_dyn brw_input(void) {
+    brw_send('r', "", 0);
+    fflush(stdout);
+    int tag = getchar();
+    size_t len = 0;
+    int c;
+    while ((c = getchar()) != ':') {
+        if (c == EOF) exit(1);
+        len = len * 10 + (c - '0');
+    }
+    char *data = malloc(len + 1);
+    if (fread(data, 1, len, stdin) != len) exit(1);
+    data[len] = 0;
+    brw_dyn result = {tag == 's', 0, data};
+    if (tag == 'i') result.i = strtoll(data, NULL, 10);
+    else if (tag != 's') exit(0); /* the interpreter replays the run */
+    return result;
+}
+
+static int64_t brw_add(int64_t a, int64_t b) {
+    int64_t r;
+    if (__builtin_add_overflow(a, b, &r)) brw_bail("int overflow");
+    return r;
+}
+
+static int64_t brw_sub(int64_t a, int64_t b) {
+    int64_t r;
+    if (__builtin_sub_overflow(a, b, &r)) brw_bail("int overflow");
+    return r;
+}
+
+static int64_t brw_mul(int64_t a, int64_t b) {
+    int64_t r;
+    if (__builtin_mul_overflow(a, b, &r)) brw_bail("int overflow");
+    return r;
+}
+
+/* python's // rounds toward negative infinity */
+static int64_t brw_div(int64_t a, int64_t b) {
+    if (b == 0) brw_exit('Z', "");
+    if (a == INT64_MIN && b == -1) brw_bail("int overflow");
+    int64_t q = a / b;
+    if ((a % b != 0) && ((a < 0) != (b < 0))) q--;
+    return q;
+}
+
+static int64_t brw_neg(int64_t a) {
+    if (a == INT64_MIN) brw_bail("int overflow");
+    return -a;
+}
+
+static brw_str brw_concat(brw_str a, brw_str b) {
+    size_t la = strlen(a), lb = strlen(b);
+    char *r = malloc(la + lb + 1);
+    memcpy(r, a, la);
+    memcpy(r + la, b, lb + 1);
+    return r;
+}
+"""
+
+def c_string(text):
+    # octal escapes for anything that isn't plain ascii, so utf-8 bytes go through untouched
+    out = []
+    for byte in text.encode("utf-8"):
+        char = chr(byte)
+        if char.isascii() and (char.isalnum() or char in " _.,:;!?()[]{}<>=+-*/&|^~#%'@$`"):
+            out.append(char)
+        else:
+            out.append(f"\\{byte:03o}")
+    return '"' + "".join(out) + '"'
+
+class CCodeGenerator():
+    def __init__(self, interpreter):
+        self.interp = interpreter
+        self.struct_registry = interpreter.struct_registry
+
+    # C source for main and every function it can reach
+    def generate_program(self, main_func_node):
+        if main_func_node.dict['args']:
+            raise Unsupported("main takes parameters")
+        self.func_names = {} # id(func node) -> C name
+        self.pending = []
+        main_name = self.c_func_name(main_func_node)
+        prototypes, bodies = [], []
+        while self.pending:
+            func_node = self.pending.pop()
+            prototypes.append(self.prototype(func_node) + ";")
+            bodies.append(self.generate_func(func_node))
+        parts = [RUNTIME, self.generate_structs(), "\n".join(prototypes)]
+        parts += bodies
+        parts.append(f"int main(void) {{\n    {main_name}();\n    brw_send('D', \"\", 0);\n    fflush(stdout);\n    return 0;\n}}")
+        return "\n\n".join(parts) + "\n"
+
+    def c_func_name(self, func_node):
+        if id(func_node) not in self.func_names:
+            self.func_names[id(func_node)] = f"bf_{func_node.dict['name']}_{len(func_node.dict['args'])}"
+            self.pending.append(func_node)
+        return self.func_names[id(func_node)]
+
+    ## Types ##
+    # a struct can only be used if `new` works on it and it has no void fields
+    def struct_ok(self, name):
+        struct_type = self.struct_registry.get(name)
+        return (struct_type is not None and struct_type.template is not None
+                and all(field_type != "void" for _, field_type in struct_type.fields.values()))
+
+    def check_type(self, type_name, allow_void=False):
+        if type_name in ["int", "bool", "string"] or (type_name == "void" and allow_void):
+            return type_name
+        if type_name in self.struct_registry:
+            if not self.struct_ok(type_name):
+                raise Unsupported(f"struct {type_name}")
+            return type_name
+        raise Unsupported(f"type {type_name}")
+
+    def is_struct(self, static_type):
+        return static_type in self.struct_registry
+
+    def c_type(self, static_type):
+        match static_type:
+            case "int":
+                return "int64_t"
+            case "bool":
+                return "bool"
+            case "string":
+                return "brw_str"
+            case "dyn":
+                return "brw_dyn"
+            case "nil":
+                return "void *"
+            case "void":
+                return "void"
+        return f"s_{static_type} *"
+
+    def c_default(self, static_type):
+        match static_type:
+            case "int" | "bool":
+                return "0"
+            case "string":
+                return '""'
+        return "NULL"
+
+    # every struct gets a typedef (fields can point at any of them), usable ones get a layout and a constructor
+    def generate_structs(self):
+        lines = [f"typedef struct s_{name} s_{name};" for name in self.struct_registry]
+        for name, struct_type in self.struct_registry.items():
+            if not self.struct_ok(name):
+                continue
+            by_offset = {offset: (field, field_type) for field, (offset, field_type) in struct_type.fields.items()}
+            lines.append(f"struct s_{name} {{")
+            lines.append("    char _pad; /* so every instance has its own address */")
+            for offset in range(len(struct_type.template)):
+                field, field_type = by_offset[offset]
+                lines.append(f"    {self.c_type(field_type)} f{offset}; /* {field} */")
+            lines.append("};")
+            lines.append(f"static s_{name} *new_s_{name}(void) {{")
+            lines.append(f"    s_{name} *o = malloc(sizeof *o);")
+            for offset in range(len(struct_type.template)):
+                lines.append(f"    o->f{offset} = {self.c_default(by_offset[offset][1])};")
+            lines.append("    return o;")
+            lines.append("}")
+        return "\n".join(lines)
+
+    ## Functions ##
+    def prototype(self, func_node):
+        params = []
+        for i, arg in enumerate(func_node.dict['args']):
+            params.append(f"{self.c_type(self.check_type(arg.dict['var_type']))} p{i}")
+        return_type = self.check_type(func_node.dict['return_type'], allow_void=True)
+        return f"static {self.c_type(return_type)} {self.c_func_name(func_node)}({', '.join(params) or 'void'})"
+
+    def generate_func(self, func_node):
+        self.lines = []
+        self.indent = 1
+        self.temp_count = 0
+        self.return_type = func_node.dict['return_type']
+        self.types = {f"p{i}": arg.dict['var_type'] for i, arg in enumerate(func_node.dict['args'])} # C local -> type
+        statements = func_node.dict['statements'] or []
+        for statement in statements[:-1]:
+            self.generate_statement(statement, nested=False)
+        if statements:
+            self.generate_last_statement(statements[-1])
+        else:
+            self.generate_return("0", "nil")
+        return "\n".join([self.prototype(func_node) + " {"] + self.lines + ["}"])
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    # binds a value to a fresh local (_t1, _t2, ...) so it's computed right here
+    def temp(self, static_type, value):
+        self.temp_count += 1
+        name = f"_t{self.temp_count}"
+        self.emit(f"{self.c_type(static_type)} {name} = {value};")
+        return name
+
+    def emit_error(self, error_type, message):
+        self.emit(f"brw_error({error_type.value}, {c_string(message)});")
+
+    def local_name(self, frame, slot):
+        return f"p{slot}" if frame == 0 else f"v{frame}_{slot}"
+
+    ## Statements ##
+    def generate_last_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "return" if statement_node.dict['expression']:
+                self.generate_return(*self.generate_expression(statement_node.dict['expression']))
+                return
+            case "fcall":
+                self.generate_return(*self.generate_call(statement_node, statement=True))
+                return
+        self.generate_statement(statement_node, nested=False)
+        self.generate_return("0", "nil")
+
+    # nested = inside an if/for body, where any non-nil value returns from the function
+    def generate_statement(self, statement_node, nested):
+        match statement_node.elem_type:
+            case "vardef":
+                self.generate_definition(statement_node)
+            case "=":
+                self.generate_assignment(statement_node)
+            case "fcall":
+                value, static_type = self.generate_call(statement_node, statement=True)
+                if nested:
+                    self.generate_return_if_not_nil(value, static_type)
+            case "return":
+                if not statement_node.dict['expression']:
+                    self.generate_return("0", "nil")
+                    return
+                value, static_type = self.generate_expression(statement_node.dict['expression'])
+                # a top level return with a value doesn't stop the function (see do_return_statement)
+                if nested:
+                    self.generate_return_if_not_nil(value, static_type)
+            case "if":
+                self.generate_if_statement(statement_node)
+            case "for":
+                self.generate_for_loop(statement_node)
+
+    # same checks as do_func_typecheck
+    def generate_return(self, value, static_type):
+        return_type = self.return_type
+        message = f"Return type misaligns with functions return type: {return_type}"
+        if static_type == "nil":
+            self.emit("return;" if return_type == "void" else f"return {self.c_default(return_type)};")
+        elif return_type == "void":
+            if self.is_struct(static_type):
+                # a nil struct value is still nil
+                self.emit(f"if ({value}) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message)});")
+                self.emit("return;")
+            else:
+                self.emit_error(ErrorType.TYPE_ERROR, message)
+        elif static_type == "dyn" and return_type in ["int", "bool", "string"]:
+            self.emit(f"if ({'!' if return_type == 'string' else ''}{value}.is_str) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message)});")
+            if return_type == "string":
+                self.emit(f"return {value}.s;")
+            else:
+                self.emit(f"return {value}.i{' != 0' if return_type == 'bool' else ''};")
+        elif static_type == return_type:
+            self.emit(f"return {value};")
+        elif return_type == "bool" and static_type == "int":
+            self.emit(f"return {value} != 0;")
+        elif self.is_struct(return_type) and self.is_struct(static_type):
+            self.emit(f"if ({value}) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message)});")
+            self.emit("return NULL;")
+        elif self.is_struct(static_type) and return_type in ["int", "bool", "string"]:
+            # a nil struct value is still nil, which returns the default
+            self.emit(f"if ({value}) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message)});")
+            self.emit(f"return {self.c_default(return_type)};")
+        else:
+            self.emit_error(ErrorType.TYPE_ERROR, message)
+
+    def generate_return_if_not_nil(self, value, static_type):
+        if static_type == "nil":
+            return
+        if self.is_struct(static_type):
+            self.emit(f"if ({value}) {{")
+            self.indent += 1
+            self.generate_return(value, static_type)
+            self.indent -= 1
+            self.emit("}")
+            return
+        self.generate_return(value, static_type)
+
+    def generate_block(self, statements):
+        for statement in statements or []:
+            self.generate_statement(statement, nested=True)
+
+    def generate_definition(self, statement_node):
+        if statement_node.dict['redefined']:
+            raise Unsupported("variable defined more than once")
+        var_type = self.check_type(statement_node.dict['var_type'])
+        target = self.local_name(statement_node.dict['frame'], statement_node.dict['slot'])
+        self.types[target] = var_type
+        self.emit(f"{self.c_type(var_type)} {target} = {self.c_default(var_type)};")
+
+    def generate_assignment(self, statement_node):
+        # right side first, then the variable
+        value, static_type = self.generate_expression(statement_node.dict['expression'])
+        if statement_node.dict['frame'] is None:
+            raise Unsupported(f"undeclared variable {statement_node.dict['var_name']}")
+        target = self.local_name(statement_node.dict['frame'], statement_node.dict['slot'])
+        target, var_type = self.follow_fields(target, self.types[target], statement_node.dict['fields'])
+        self.emit(f"{target} = {self.convert(value, static_type, var_type)};")
+
+    # nil checks for every step of a.b.c, gives back the C lvalue of the last field and its type
+    def follow_fields(self, value, static_type, fields):
+        for field in fields:
+            if not self.is_struct(static_type) or not self.struct_ok(static_type):
+                raise Unsupported(f"field {field} of a {static_type}")
+            field_info = self.struct_registry[static_type].fields.get(field)
+            if field_info is None:
+                raise Unsupported(f"missing field {field}")
+            self.emit(f"if (!{value}) brw_error({ErrorType.FAULT_ERROR.value}, {c_string(f'Cannot apply field {field} to nil-value variable')});")
+            value = f"{value}->f{field_info[0]}"
+            static_type = field_info[1]
+        return value, static_type
+
+    # value as var_type, with the coercion and check an assignment (or with param_name, an argument) does
+    def convert(self, value, static_type, var_type, param_name=None):
+        def message(type_name):
+            if param_name is None:
+                return f"Invalid type {type_name} assigned to variable with type {var_type}"
+            return f"Invalid arg type {type_name} given to formal parameter {param_name} of type {var_type}"
+        def struct_name(struct_type):
+            return "StructObject" if param_name is None else struct_type
+        type_names = ASSIGN_TYPE_NAMES if param_name is None else ARG_TYPE_NAMES
+
+        if static_type == var_type:
+            return value
+        if var_type == "bool" and static_type == "int":
+            return f"({value} != 0)"
+        if self.is_struct(var_type):
+            if static_type == "nil":
+                return "NULL"
+            if self.is_struct(static_type):
+                self.emit(f"if ({value}) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message(struct_name(static_type)))});")
+                return "NULL"
+        if static_type == "dyn" and var_type in ["int", "bool", "string"]:
+            if var_type == "string":
+                self.emit(f"if (!{value}.is_str) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message(type_names['int']))});")
+                return f"{value}.s"
+            self.emit(f"if ({value}.is_str) brw_error({ErrorType.TYPE_ERROR.value}, {c_string(message(type_names['string']))});")
+            return f"({value}.i != 0)" if var_type == "bool" else f"{value}.i"
+        type_name = struct_name(static_type) if self.is_struct(static_type) else type_names[static_type]
+        self.emit_error(ErrorType.TYPE_ERROR, message(type_name))
+        return self.c_default(var_type)
+
+    # int and bool conditions only, a string or struct condition goes to the tree walker
+    def generate_condition(self, condition_node):
+        value, static_type = self.generate_expression(condition_node)
+        if static_type == "bool":
+            return value
+        if static_type == "int":
+            return f"({value} != 0)"
+        raise Unsupported(f"{static_type} condition")
+
+    def generate_if_statement(self, statement_node):
+        self.emit(f"if ({self.generate_condition(statement_node.dict['condition'])}) {{")
+        self.indent += 1
+        self.generate_block(statement_node.dict['statements'])
+        self.indent -= 1
+        if statement_node.dict['else_statements']:
+            self.emit("} else {")
+            self.indent += 1
+            self.generate_block(statement_node.dict['else_statements'])
+            self.indent -= 1
+        self.emit("}")
+
+    def generate_for_loop(self, statement_node):
+        self.generate_statement(statement_node.dict['init'], nested=False)
+        condition = statement_node.dict['condition']
+        self.emit("for (;;) {")
+        self.indent += 1
+        self.emit(f"if (!{self.generate_condition(condition)}) break;")
+        if not statement_node.dict['counting']:
+            # the condition is evaluated twice per iteration, just like the tree walker
+            self.generate_condition(condition)
+        self.generate_block(statement_node.dict['statements'])
+        self.generate_statement(statement_node.dict['update'], nested=False)
+        self.indent -= 1
+        self.emit("}")
+
+    ## Function Calls ##
+    # gives back (value, static type), a void call is ("0", "nil")
+    def generate_call(self, call_node, statement=False):
+        func_call = call_node.dict['name']
+        args = call_node.dict['args']
+        if func_call == "print":
+            self.generate_output([self.generate_expression(arg) for arg in args], "o")
+            return "0", "nil"
+        if func_call in ["inputi", "inputs"]:
+            if len(args) > 1:
+                raise Unsupported(f"{func_call} with {len(args)} args")
+            if args:
+                self.generate_output([self.generate_expression(args[0])], "prompt")
+            return self.temp("dyn", "brw_input()"), "dyn"
+        func_def = self.interp.func_table.get((func_call, len(args)))
+        if func_def is None:
+            raise Unsupported(f"no function {func_call} with {len(args)} args")
+        return_type = func_def.dict['return_type']
+        if return_type == "void" and not statement:
+            raise Unsupported("void function in an expression")
+        func_name = self.c_func_name(func_def)
+        # args are evaluated and checked one at a time, in order
+        checked_args = []
+        for arg, param in zip(args, func_def.dict['args']):
+            value, static_type = self.generate_expression(arg)
+            var_type = self.check_type(param.dict['var_type'])
+            checked_args.append(self.convert(value, static_type, var_type, param_name=param.dict['name']))
+        call = f"{func_name}({', '.join(checked_args)})"
+        if return_type == "void":
+            self.emit(call + ";")
+            return "0", "nil"
+        return self.temp(return_type, call), return_type
+
+    # one print (tag "o") or an input prompt, values are already evaluated
+    def generate_output(self, values, tag):
+        for value, static_type in values:
+            match static_type:
+                case "int":
+                    self.emit(f"out_int({value});")
+                case "bool":
+                    self.emit(f"out_bool({value});")
+                case "string":
+                    self.emit(f"out_str({value});")
+                case "dyn":
+                    self.emit(f"out_dyn({value});")
+                case "nil":
+                    if tag == "o":
+                        self.emit('out_str("nil");')
+                case _:
+                    raise Unsupported(f"printing a {static_type}")
+        if tag == "o":
+            self.emit("out_flush('o');")
+            return
+        # the prompt is shown as the value itself, not its text
+        value, static_type = values[0]
+        if static_type == "dyn":
+            self.emit(f"out_flush({value}.is_str ? 'S' : 'I');")
+        else:
+            tag = {"int": "I", "bool": "B", "string": "S", "nil": "N"}[static_type]
+            self.emit(f"out_flush('{tag}');")
+
+    ## Expressions ##
+    # gives back (C expression, static type). Anything that can fail or has side effects is bound to a temp right
+    # away, what's left is pure and only reads locals, which nothing else in the expression can change.
+    def generate_expression(self, expression_node):
+        match expression_node.elem_type:
+            case "int":
+                val = expression_node.dict['val']
+                if not -2**63 <= val < 2**63:
+                    raise Unsupported("int literal too big")
+                if val == -2**63:
+                    # can be folded from -(2**63 - 1) - 1, and has no C literal of its own
+                    return "INT64_MIN", "int"
+                return f"INT64_C({val})", "int"
+            case "bool":
+                return ("1" if expression_node.dict['val'] else "0"), "bool"
+            case "string":
+                return c_string(expression_node.dict['val']), "string"
+            case "nil":
+                return "NULL", "nil"
+            case "var":
+                return self.generate_variable(expression_node)
+            case "+" | "-" | "*" | "/":
+                return self.generate_binary_operator(expression_node)
+            case "neg" | "!":
+                return self.generate_unary_operator(expression_node)
+            case "==" | "!=" | "<" | "<=" | ">" | ">=":
+                return self.generate_comparison_operator(expression_node)
+            case "&&" | "||":
+                return self.generate_binary_boolean_operator(expression_node)
+            case "fcall":
+                return self.generate_call(expression_node)
+            case "new":
+                struct_name = self.check_type(expression_node.dict['var_type'])
+                if not self.is_struct(struct_name):
+                    raise Unsupported(f"new {struct_name}")
+                return self.temp(struct_name, f"new_s_{struct_name}()"), struct_name
+        raise Unsupported(f"{expression_node.elem_type} expression")
+
+    def generate_variable(self, expression_node):
+        if expression_node.dict['frame'] is None:
+            raise Unsupported(f"undeclared variable {expression_node.dict['var_name']}")
+        value = self.local_name(expression_node.dict['frame'], expression_node.dict['slot'])
+        fields = expression_node.dict['fields']
+        if not fields:
+            return value, self.types[value]
+        # a call later in the expression could change the field, so read it now
+        value, static_type = self.follow_fields(value, self.types[value], fields)
+        return self.temp(static_type, value), static_type
+
+    def generate_binary_operator(self, expression_node):
+        op = expression_node.elem_type
+        a, a_type = self.generate_expression(expression_node.dict['op1'])
+        b, b_type = self.generate_expression(expression_node.dict['op2'])
+        if op == "+" and a_type == "string" and b_type == "string":
+            return self.temp("string", f"brw_concat({a}, {b})"), "string"
+        if a_type != "int" or b_type != "int":
+            raise Unsupported(f"{a_type} {op} {b_type}")
+        func = {"+": "brw_add", "-": "brw_sub", "*": "brw_mul", "/": "brw_div"}[op]
+        return self.temp("int", f"{func}({a}, {b})"), "int"
+
+    def generate_unary_operator(self, expression_node):
+        a, a_type = self.generate_expression(expression_node.dict['op1'])
+        if expression_node.elem_type == "neg" and a_type == "int":
+            return self.temp("int", f"brw_neg({a})"), "int"
+        if expression_node.elem_type == "!" and a_type in ["int", "bool"]:
+            return f"(!{a})", "bool"
+        raise Unsupported(f"{expression_node.elem_type} {a_type}")
+
+    def generate_comparison_operator(self, expression_node):
+        op = expression_node.elem_type
+        a, a_type = self.generate_expression(expression_node.dict['op1'])
+        b, b_type = self.generate_expression(expression_node.dict['op2'])
+        if op not in ["==", "!="]:
+            if a_type != "int" or b_type != "int":
+                raise Unsupported(f"{a_type} {op} {b_type}")
+            return f"({a} {op} {b})", "bool"
+        pointers = ["nil"] + list(self.struct_registry)
+        if a_type == b_type == "string":
+            return f"(strcmp({a}, {b}) {op} 0)", "bool"
+        if a_type in ["int", "bool"] and b_type in ["int", "bool"]:
+            if a_type != b_type:
+                # the int side is coerced to bool
+                a, b = (f"({a} != 0)" if a_type == "int" else a), (f"({b} != 0)" if b_type == "int" else b)
+            return f"({a} {op} {b})", "bool"
+        if a_type in pointers and b_type in pointers:
+            return f"((void *){a} {op} (void *){b})", "bool"
+        if a_type in ["int", "bool", "string"] and b_type in ["int", "bool", "string"]:
+            # different python types are never equal
+            return ("0" if op == "==" else "1"), "bool"
+        raise Unsupported(f"{a_type} {op} {b_type}")
+
+    # both sides are always evaluated (strict), unless short_circuit
+    def generate_binary_boolean_operator(self, expression_node):
+        op = expression_node.elem_type
+        if self.interp.short_circuit:
+            return self.generate_short_circuit_operator(expression_node)
+        a, a_type = self.generate_expression(expression_node.dict['op1'])
+        b, b_type = self.generate_expression(expression_node.dict['op2'])
+        if a_type not in ["int", "bool"] or b_type not in ["int", "bool"]:
+            raise Unsupported(f"{a_type} {op} {b_type}")
+        return f"(({a} != 0) {op} ({b} != 0))", "bool"
+
+    # the temps op2 needs (calls, field reads) go in a block that only runs when op1 doesn't decide the result
+    def generate_short_circuit_operator(self, expression_node):
+        op = expression_node.elem_type
+        a, a_type = self.generate_expression(expression_node.dict['op1'])
+        if a_type not in ["int", "bool"]:
+            raise Unsupported(f"{a_type} {op}")
+        result = self.temp("bool", f"({a} != 0)")
+        self.emit(f"if ({result if op == '&&' else '!' + result}) {{")
+        self.indent += 1
+        b, b_type = self.generate_expression(expression_node.dict['op2'])
+        if b_type not in ["int", "bool"]:
+            raise Unsupported(f"{a_type} {op} {b_type}")
+        self.emit(f"{result} = ({b} != 0);")
+        self.indent -= 1
+        self.emit("}")
+        return result, "bool"
+
+# where compiled programs are kept, BREWIN_C_CACHE overrides it
+def cache_dir():
+    return os.environ.get("BREWIN_C_CACHE") or os.path.join(tempfile.gettempdir(), "brewin_c_cache")
+
+# the binary gets a big stack so deep brewin recursion works
+def raise_stack_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_STACK)
+        target = 1 << 30
+        if hard != resource.RLIM_INFINITY:
+            target = min(target, hard)
+        if soft == resource.RLIM_INFINITY or soft < target:
+            resource.setrlimit(resource.RLIMIT_STACK, (target, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+class NativeRunner():
+    def __init__(self, interpreter):
+        self.interp = interpreter
+        self.compiler = os.environ.get("CC", "cc")
+        self.flags = ["-O2", "-w"]
+
+    # Runs main natively if it can, otherwise on the tree walker.
+    # Interpreter.c_fallback is left as None for a native run, or says why the tree walker was used.
+    def run(self, main_func_node):
+        interp = self.interp
+        interp.c_fallback = None
+        try:
+            source = CCodeGenerator(interp).generate_program(main_func_node)
+        except Unsupported as reason:
+            interp.c_fallback = f"unsupported: {reason}"
+            return interp.run_func(main_func_node)
+        binary = self.build(source)
+        if binary is None:
+            interp.c_fallback = "compile failed"
+            return interp.run_func(main_func_node)
+        self.execute(binary, main_func_node)
+
+    # compiled binary for this source (from the cache if it's there), None if it can't be built
+    def build(self, source):
+        key = hashlib.sha256("\0".join([self.compiler, *self.flags, source]).encode("utf-8")).hexdigest()[:32]
+        directory = cache_dir()
+        binary = os.path.join(directory, key)
+        if os.path.exists(binary):
+            return binary
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=directory) as build_dir:
+                c_file = os.path.join(build_dir, "prog.c")
+                with open(c_file, "w") as f:
+                    f.write(source)
+                result = subprocess.run([self.compiler, *self.flags, "-o", os.path.join(build_dir, "prog"), c_file],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                if result.returncode != 0:
+                    return None
+                # another run may have built it in the meantime, either copy is fine
+                os.replace(os.path.join(build_dir, "prog"), binary)
+        except OSError:
+            return None
+        return binary
+
+    def execute(self, binary, main_func_node):
+        interp = self.interp
+        inputs = [] # every input handed to the binary, for a replay
+        shown = 0 # outputs already passed on, a replay skips these
+        proc = subprocess.Popen([binary], stdin=subprocess.PIPE, stdout=subprocess.PIPE, preexec_fn=raise_stack_limit)
+        try:
+            while True:
+                tag, data = self.read_message(proc.stdout)
+                match tag:
+                    case "o" | "S":
+                        interp.output(data)
+                        shown += 1
+                    case "I":
+                        interp.output(int(data))
+                        shown += 1
+                    case "B":
+                        interp.output(data == "true")
+                        shown += 1
+                    case "N":
+                        interp.output(nil)
+                        shown += 1
+                    case "r":
+                        user_in = interp.get_input()
+                        inputs.append(user_in)
+                        self.send_input(proc.stdin, user_in)
+                    case "E":
+                        error_type, message = data.split(" ", 1)
+                        interp.error(ErrorType(int(error_type)), message)
+                    case "Z":
+                        raise ZeroDivisionError("integer division or modulo by zero")
+                    case "D":
+                        return
+                    case _:
+                        # bailed out, crashed or answered with x: the tree walker takes it from the start
+                        interp.c_fallback = f"replayed: {data or 'binary stopped'}"
+                        break
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            proc.stdin.close()
+            proc.stdout.close()
+        self.replay(main_func_node, inputs, shown)
+
+    def read_message(self, stream):
+        tag = stream.read(1)
+        if not tag:
+            return None, None
+        length = b""
+        while (char := stream.read(1)) != b":":
+            if not char:
+                return None, None
+            length += char
+        return tag.decode(), stream.read(int(length)).decode("utf-8")
+
+    # same conversion as inputi/inputs, ints that don't fit in 64 bits (and None) make the binary bail out
+    def send_input(self, stream, user_in):
+        try:
+            user_in = int(user_in)
+        except:
+            pass
+        if type(user_in) is int and -2**63 <= user_in < 2**63:
+            tag, data = b"i", str(user_in).encode()
+        elif type(user_in) is str:
+            tag, data = b"s", user_in.encode("utf-8")
+        else:
+            tag, data = b"x", b""
+        try:
+            stream.write(tag + str(len(data)).encode() + b":" + data)
+            stream.flush()
+        except BrokenPipeError:
+            pass
+
+    # runs main again on the tree walker, feeding it the inputs the binary already took and hiding what it already showed
+    def replay(self, main_func_node, inputs, shown):
+        interp = self.interp
+        pending = list(inputs)
+        def output(v):
+            nonlocal shown
+            if shown:
+                shown -= 1
+            else:
+                InterpreterBase.output(interp, v)
+        def get_input():
+            return pending.pop(0) if pending else InterpreterBase.get_input(interp)
+        interp.output = output
+        interp.get_input = get_input
+        interp.variable_scope_stack = [[]]
+        interp.call_stack = []
+        try:
+            interp.run_func(main_func_node)
+        finally:
+            del interp.output
+            del interp.get_input
+
+# C source for a program, for debugging the backend
+def generate(interpreter, program):
+    ast = parse_program(program)
+    interpreter.struct_defs = interpreter.get_struct_defs(ast)
+    interpreter.build_struct_registry()
+    interpreter.func_defs = interpreter.get_func_defs(ast)
+    interpreter.build_func_table()
+    main_func_node = interpreter.get_main_func_node(ast)
+    ConstantFolder().fold_program(interpreter.func_defs)
+    ScopeResolver().resolve_program(interpreter.func_defs)
+    return CCodeGenerator(interpreter).generate_program(main_func_node)
+
+if __name__ == "__main__":
+    from interpreterv3 import Interpreter
+    with open(sys.argv[1]) as f:
+        print(generate(Interpreter(), f.read()))
@@ -0,0 +1,593 @@
+# Closure compiler for the v3 interpreter.
+# Instead of walking the AST and asking is_definition/is_assignment/... on every node, every node is turned
+# into a python closure once, and running the program is just calling closures.
+# Everything here has to behave exactly like the tree walker in interpreterv3.py (same output, same errors),
+# so the quirky bits (like non-nil statements inside if/for acting as a return) are copied on purpose.
+# Variables use the same [frame][slot] layout as the tree walker, so ScopeResolver has to run first.
+
+from intbase import *
+from type_valuev3 import *
+
+# Lightweight stand-in for the Element("return", value=...) the tree walker passes around
+class ReturnValue():
+    __slots__ = ("value",)
+    def __init__(self, value):
+        self.value = value
+
+RETURN_NIL = ReturnValue(nil)
+
+class ClosureCompiler():
+    def __init__(self, interpreter):
+        self.interp = interpreter
+        self.compiled_funcs = {} # id(func node) -> compiled body
+
+    # compiles every function, returns dict of id(func node) -> callable that runs the function body
+    def compile_program(self):
+        # compile all bodies first so recursive/forward calls can find them through this dict
+        for func_node in self.interp.func_defs:
+            self.compiled_funcs[id(func_node)] = None
+        for func_node in self.interp.func_defs:
+            self.compiled_funcs[id(func_node)] = self.compile_func(func_node)
+        return self.compiled_funcs
+
+    # same as run_func
+    def compile_func(self, func_node):
+        interp = self.interp
+        statements = self.compile_block(func_node.dict['statements'])
+        func_ret_type = func_node.dict['return_type']
+        frame_size = func_node.dict['frame_size']
+        free = interp.free_scopes[frame_size]
+        do_func_typecheck = interp.do_func_typecheck
+
+        # scopes are pushed/popped the same way as Interpreter.push_scope/pop_scope, just inlined
+        def run_func():
+            ### BEGIN FUNC SCOPE ###
+            if frame_size:
+                interp.variable_scope_stack.append(free.pop() if free else [None] * frame_size)
+            return_value = nil
+            for statement in statements:
+                return_value = statement()
+                if type(return_value) is ReturnValue:
+                    if frame_size:
+                        free.append(interp.variable_scope_stack.pop())
+                    return do_func_typecheck(func_ret_type, return_value.value)
+            ### END FUNC SCOPE ###
+            if frame_size:
+                free.append(interp.variable_scope_stack.pop())
+            return do_func_typecheck(func_ret_type, return_value)
+        return run_func
+
+    def compile_block(self, statements):
+        if not statements:
+            return ()
+        return tuple(self.compile_statement(statement) for statement in statements)
+
+    ## Statements ##
+    def compile_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "vardef":
+                return self.compile_definition(statement_node)
+            case "=":
+                return self.compile_assignment(statement_node)
+            case "fcall":
+                return self.compile_func_call(statement_node)
+            case "return":
+                return self.compile_return_statement(statement_node)
+            case "if":
+                return self.compile_if_statement(statement_node)
+            case "for":
+                return self.compile_for_loop(statement_node)
+        # anything else isn't run as a statement
+        return lambda: nil
+
+    def compile_definition(self, statement_node):
+        interp = self.interp
+        var_name = statement_node.dict['name']
+        var_type = statement_node.dict['var_type']
+        if statement_node.dict['redefined']:
+            def redefinition():
+                interp.error(ErrorType.NAME_ERROR, f"Variable {var_name} defined more than once",)
+            return redefinition
+        default_value = self.compile_default_value(var_type)
+        slot = statement_node.dict['slot']
+
+        def do_definition():
+            interp.variable_scope_stack[-1][slot] = default_value()
+            return nil
+        return do_definition
+
+    # Default values are constant for a given type, so only unknown types need to go through get_default_value (for the error)
+    def compile_default_value(self, type_name):
+        if type_name in ["int", "bool", "string", "void"] or type_name in self.interp.struct_registry:
+            value = self.interp.get_default_value(type_name)
+            return lambda: value
+        get_default_value = self.interp.get_default_value
+        return lambda: get_default_value(type_name)
+
+    def compile_assignment(self, statement_node):
+        interp = self.interp
+        var_name = statement_node.dict['var_name']
+        fields = statement_node.dict['fields']
+        expression = self.compile_expression(statement_node.dict['expression'])
+        check_valid_type = interp.check_valid_type
+        frame = statement_node.dict['frame']
+        slot = statement_node.dict['slot']
+
+        if frame is None:
+            def not_declared():
+                expression()
+                interp.error(ErrorType.NAME_ERROR, f"variable used and not declared: {var_name}",)
+            return not_declared
+
+        if not fields:
+            var_type = statement_node.dict['var_type']
+            def do_plain_assignment():
+                resulting_value = expression()
+                scope = interp.variable_scope_stack[frame]
+                if scope[slot] is None:
+                    interp.error(ErrorType.NAME_ERROR, f"variable used and not declared: {var_name}",)
+                if var_type == "bool" and type(resulting_value) is int:
+                    resulting_value = bool(resulting_value)
+                if not check_valid_type(resulting_value, var_type):
+                    interp.error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
+                scope[slot] = resulting_value
+                return nil
+            return do_plain_assignment
+
+        def do_field_assignment():
+            resulting_value = expression()
+            val = interp.variable_scope_stack[frame][slot]
+            if val is None:
+                interp.error(ErrorType.NAME_ERROR, f"variable used and not declared: {var_name}",)
+            for field in fields:
+                if val is nil:
+                    interp.error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+                if type(val) is not StructObject:
+                    interp.error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+                field_info = val._type.fields.get(field)
+                if field_info is None:
+                    interp.error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+                struct_obj = val
+                val = val._values[field_info[0]]
+            offset, var_type = field_info
+            if var_type == "bool" and type(resulting_value) is int:
+                resulting_value = bool(resulting_value)
+            if not check_valid_type(resulting_value, var_type):
+                interp.error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
+            struct_obj._values[offset] = resulting_value
+            return nil
+        return do_field_assignment
+
+    def compile_return_statement(self, statement_node):
+        if not statement_node.dict['expression']:
+            return lambda: RETURN_NIL
+        # a return with a value just hands back the raw value (see do_return_statement)
+        return self.compile_expression(statement_node.dict['expression'])
+
+    # same as do_if_statement, early exits come back as a ReturnValue
+    def compile_if_statement(self, statement_node):
+        interp = self.interp
+        condition = self.compile_expression(statement_node.dict['condition'])
+        statements = self.compile_block(statement_node.dict['statements'])
+        else_statements = self.compile_block(statement_node.dict['else_statements'])
+        frame_size = statement_node.dict['frame_size']
+        else_frame_size = statement_node.dict['else_frame_size']
+        free = interp.free_scopes[frame_size]
+        else_free = interp.free_scopes[else_frame_size]
+
+        def do_if_statement():
+            cond = condition()
+            if type(cond) is int:
+                cond = bool(cond)
+            if type(cond) is not bool:
+                interp.error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+            size, scopes = (frame_size, free) if cond else (else_frame_size, else_free)
+            ### BEGIN IF SCOPE ###
+            if size:
+                interp.variable_scope_stack.append(scopes.pop() if scopes else [None] * size)
+            for statement in (statements if cond else else_statements):
+                return_value = statement()
+                if type(return_value) is ReturnValue:
+                    if size:
+                        scopes.append(interp.variable_scope_stack.pop())
+                    return return_value
+                elif return_value is not nil:
+                    if size:
+                        scopes.append(interp.variable_scope_stack.pop())
+                    return ReturnValue(return_value)
+            ### END IF SCOPE ###
+            if size:
+                scopes.append(interp.variable_scope_stack.pop())
+            return nil
+        return do_if_statement
+
+    def compile_for_loop(self, statement_node):
+        if statement_node.dict['counting']:
+            return self.compile_counting_loop(statement_node)
+        interp = self.interp
+        init = self.compile_statement(statement_node.dict['init'])
+        update = self.compile_statement(statement_node.dict['update'])
+        condition = self.compile_expression(statement_node.dict['condition'])
+        statements = self.compile_block(statement_node.dict['statements'])
+        frame_size = statement_node.dict['frame_size']
+        free = interp.free_scopes[frame_size]
+
+        def do_for_loop():
+            init()
+            # condition is evaluated twice per iteration, just like the tree walker
+            while condition():
+                cond = condition()
+                if type(cond) is int:
+                    cond = bool(cond)
+                if type(cond) is not bool:
+                    interp.error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+                ### BEGIN VAR SCOPE ###
+                if frame_size:
+                    interp.variable_scope_stack.append(free.pop() if free else [None] * frame_size)
+                for statement in statements:
+                    return_value = statement()
+                    if type(return_value) is ReturnValue:
+                        if frame_size:
+                            free.append(interp.variable_scope_stack.pop())
+                        return return_value
+                    elif return_value is not nil:
+                        if frame_size:
+                            free.append(interp.variable_scope_stack.pop())
+                        return ReturnValue(return_value)
+                ### END VAR SCOPE ###
+                if frame_size:
+                    free.append(interp.variable_scope_stack.pop())
+                update()
+            return nil
+        return do_for_loop
+
+    # for (i = a; i < b; i = i + c), same as Interpreter.do_counting_loop: condition evaluated once per
+    # iteration, one body scope for the whole loop, and the int on int case done inline
+    def compile_counting_loop(self, statement_node):
+        interp = self.interp
+        update_node = statement_node.dict['update']
+        condition_node = statement_node.dict['condition']
+        init = self.compile_statement(statement_node.dict['init'])
+        update = self.compile_statement(update_node)
+        condition = self.compile_expression(condition_node)
+        bound = self.compile_expression(condition_node.dict['op2'])
+        amount = self.compile_expression(update_node.dict['expression'].dict['op2'])
+        statements = self.compile_block(statement_node.dict['statements'])
+        compare = {"<": int.__lt__, "<=": int.__le__, ">": int.__gt__, ">=": int.__ge__, "!=": int.__ne__}[condition_node.elem_type]
+        step = int.__add__ if update_node.dict['expression'].elem_type == "+" else int.__sub__
+        int_var = update_node.dict['var_type'] == "int"
+        frame = update_node.dict['frame']
+        slot = update_node.dict['slot']
+        frame_size = statement_node.dict['frame_size']
+        free = interp.free_scopes[frame_size]
+
+        def do_counting_loop():
+            init()
+            # the loop variable's scope is below the loop, so it's the same list the whole time
+            loop_scope = interp.variable_scope_stack[frame]
+            ### BEGIN VAR SCOPE ###
+            if frame_size:
+                interp.variable_scope_stack.append(free.pop() if free else [None] * frame_size)
+            while True:
+                counter = loop_scope[slot]
+                limit = bound()
+                if type(counter) is int and type(limit) is int:
+                    if not compare(counter, limit):
+                        break
+                else:
+                    cond = condition()
+                    if not cond:
+                        break
+                    if type(cond) is int:
+                        cond = bool(cond)
+                    if type(cond) is not bool:
+                        interp.error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+                for statement in statements:
+                    return_value = statement()
+                    if type(return_value) is ReturnValue:
+                        if frame_size:
+                            free.append(interp.variable_scope_stack.pop())
+                        return return_value
+                    elif return_value is not nil:
+                        if frame_size:
+                            free.append(interp.variable_scope_stack.pop())
+                        return ReturnValue(return_value)
+                counter = loop_scope[slot]
+                step_by = amount()
+                if type(counter) is int and type(step_by) is int and int_var:
+                    loop_scope[slot] = step(counter, step_by)
+                else:
+                    update()
+            ### END VAR SCOPE ###
+            if frame_size:
+                free.append(interp.variable_scope_stack.pop())
+            return nil
+        return do_counting_loop
+
+    ## Function Calls ##
+    def compile_func_call(self, call_node):
+        func_call = call_node.dict['name']
+        if func_call == "print":
+            return self.compile_print(call_node)
+        elif func_call in ["inputi", "inputs"]:
+            return self.compile_input(call_node)
+        return self.compile_user_func_call(call_node)
+
+    def compile_print(self, call_node):
+        interp = self.interp
+        args = tuple(self.compile_expression(arg) for arg in call_node.dict['args'])
+
+        def do_print():
+            output = ""
+            for arg in args:
+                eval = arg()
+                if type(eval) is bool:
+                    output += "true" if eval else "false"
+                else:
+                    output += str(eval)
+            interp.output(output)
+            return nil
+        return do_print
+
+    def compile_input(self, call_node):
+        interp = self.interp
+        func_call = call_node.dict['name']
+        args = call_node.dict['args']
+        if len(args) > 1:
+            def too_many_args():
+                interp.error(ErrorType.NAME_ERROR,f"No {func_call}() function found that takes > 1 parameter",)
+            return too_many_args
+        prompt = self.compile_expression(args[0]) if args else None
+
+        def do_input():
+            if prompt:
+                interp.output(prompt())
+            user_in = interp.get_input()
+            try:
+                return int(user_in)
+            except:
+                return user_in
+        return do_input
+
+    def compile_user_func_call(self, call_node):
+        interp = self.interp
+        func_call = call_node.dict['name']
+        arg_len = len(call_node.dict['args'])
+        func_def = interp.func_table.get((func_call, arg_len))
+        # Lookup failures still have to happen when the call runs, not when it compiles
+        if not interp.check_valid_func(func_call):
+            def func_not_found():
+                interp.error(ErrorType.NAME_ERROR, f"Function {func_call} was not found",)
+            return func_not_found
+        if func_def is None:
+            def wrong_arg_count():
+                interp.error(ErrorType.NAME_ERROR, f"Incorrect amount of arguments given: {arg_len} ",)
+            return wrong_arg_count
+
+        args = tuple(self.compile_expression(arg) for arg in call_node.dict['args'])
+        params = tuple((param.dict['name'], param.dict['var_type']) for param in func_def.dict['args'])
+        compiled_funcs = self.compiled_funcs
+        func_key = id(func_def)
+        check_valid_type = interp.check_valid_type
+        call_stack = interp.call_stack
+
+        # same as the user function branch of do_func_call
+        def do_func_call():
+            param_scope = [None] * arg_len
+            for i in range(0, arg_len):
+                var_name, var_type = params[i]
+                arg_value = args[i]()
+                if var_type == "bool" and type(arg_value) is int:
+                    arg_value = bool(arg_value)
+                if check_valid_type(arg_value, var_type):
+                    param_scope[i] = arg_value
+                else:
+                    arg_type = arg_value._type.name if type(arg_value) is StructObject else type(arg_value)
+                    interp.error(ErrorType.TYPE_ERROR, f"Invalid arg type {arg_type} given to formal parameter {var_name} of type {var_type}",)
+            call_stack.append(interp.variable_scope_stack)
+            interp.variable_scope_stack = [param_scope]
+            return_value = compiled_funcs[func_key]()
+            interp.variable_scope_stack = call_stack.pop()
+            return return_value
+        return do_func_call
+
+    ## Expressions ##
+    def compile_expression(self, expression_node):
+        match expression_node.elem_type:
+            case "int" | "string" | "bool":
+                value = expression_node.dict['val']
+                return lambda: value
+            case "nil":
+                return lambda: nil
+            case "var":
+                return self.compile_variable(expression_node)
+            case "+" | "-" | "*" | "/":
+                return self.compile_binary_operator(expression_node)
+            case "neg" | "!":
+                return self.compile_unary_operator(expression_node)
+            case "==" | "<" | "<=" | ">" | ">=" | "!=":
+                return self.compile_comparison_operator(expression_node)
+            case "&&" | "||":
+                return self.compile_binary_boolean_operator(expression_node)
+            case "fcall":
+                return self.compile_func_call_expression(expression_node)
+            case "new":
+                return self.compile_struct_def(expression_node)
+        return lambda: None
+
+    def compile_variable(self, expression_node):
+        interp = self.interp
+        var_name = expression_node.dict['var_name']
+        fields = expression_node.dict['fields']
+        frame = expression_node.dict['frame']
+        slot = expression_node.dict['slot']
+
+        if frame is None:
+            def not_declared():
+                interp.error(ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared",)
+            return not_declared
+
+        def get_value_of_variable():
+            val = interp.variable_scope_stack[frame][slot]
+            if val is None:
+                interp.error(ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared",)
+            for field in fields:
+                if val is nil:
+                    interp.error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+                if type(val) is not StructObject:
+                    interp.error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+                field_info = val._type.fields.get(field)
+                if field_info is None:
+                    interp.error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+                val = val._values[field_info[0]]
+            return val
+
+        # plain variables (no dots) are the hot case, skip the field loop
+        def get_value_of_plain_variable():
+            val = interp.variable_scope_stack[frame][slot]
+            if val is None:
+                interp.error(ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared",)
+            return val
+        return get_value_of_variable if fields else get_value_of_plain_variable
+
+    def compile_binary_operator(self, expression_node):
+        interp = self.interp
+        op = expression_node.elem_type
+        op1 = self.compile_expression(expression_node.dict['op1'])
+        op2 = self.compile_expression(expression_node.dict['op2'])
+
+        if op == "+":
+            def evaluate_add():
+                eval1 = op1()
+                eval2 = op2()
+                if not ((type(eval1) is int and type(eval2) is int) or (type(eval1) is str and type(eval2) is str)):
+                    interp.error(ErrorType.TYPE_ERROR, "Types for + must be both of type int or string.",)
+                return eval1 + eval2
+            return evaluate_add
+
+        arith = {"-": int.__sub__, "*": int.__mul__, "/": int.__floordiv__}[op]
+        def evaluate_arith():
+            eval1 = op1()
+            eval2 = op2()
+            if not (type(eval1) is int and type(eval2) is int):
+                interp.error(ErrorType.TYPE_ERROR, "Arguments must be of type 'int'.",)
+            return arith(eval1, eval2)
+        return evaluate_arith
+
+    def compile_unary_operator(self, expression_node):
+        interp = self.interp
+        op1 = self.compile_expression(expression_node.dict['op1'])
+        if expression_node.elem_type == "neg":
+            def evaluate_neg():
+                eval = op1()
+                if type(eval) is not int:
+                    interp.error(ErrorType.TYPE_ERROR, "'negation' can only be used on integer values.",)
+                return -eval
+            return evaluate_neg
+
+        def evaluate_not():
+            eval = op1()
+            if type(eval) is int:
+                eval = bool(eval)
+            if type(eval) is not bool:
+                interp.error(ErrorType.TYPE_ERROR, "'Not' can only be used on boolean values.",)
+            return not eval
+        return evaluate_not
+
+    def compile_comparison_operator(self, expression_node):
+        interp = self.interp
+        op = expression_node.elem_type
+        op1 = self.compile_expression(expression_node.dict['op1'])
+        op2 = self.compile_expression(expression_node.dict['op2'])
+
+        # shared coercion + nil checks from evaluate_comparison_operator
+        def evaluate_operands():
+            eval1 = op1()
+            eval2 = op2()
+            if type(eval2) is bool and type(eval1) is int:
+                eval1 = bool(eval1)
+            if type(eval1) is bool and type(eval2) is int:
+                eval2 = bool(eval2)
+            if (((eval1 is nil and eval2 is not nil) or (eval2 is nil and eval1 is not nil))
+                and not ((type(eval1) is StructObject) or (type(eval2) is StructObject))):
+                interp.error(ErrorType.TYPE_ERROR, f"Cannot compare type nil unless both are nil",)
+            return eval1, eval2
+
+        if op == "==":
+            def evaluate_eq():
+                eval1, eval2 = evaluate_operands()
+                if type(eval1) is StructObject and type(eval2) is StructObject:
+                    return eval1 is eval2
+                return eval1 == eval2
+            return evaluate_eq
+        if op == "!=":
+            def evaluate_not_eq():
+                eval1, eval2 = evaluate_operands()
+                if type(eval1) is StructObject and type(eval2) is StructObject:
+                    return eval1 is not eval2
+                return eval1 != eval2
+            return evaluate_not_eq
+
+        compare = {"<": int.__lt__, "<=": int.__le__, ">": int.__gt__, ">=": int.__ge__}[op]
+        def evaluate_int_comparison():
+            eval1, eval2 = evaluate_operands()
+            if not (type(eval1) is int and type(eval2) is int):
+                interp.error(ErrorType.TYPE_ERROR, f"Comparison args for {op} must be of same type int.",)
+            return compare(eval1, eval2)
+        return evaluate_int_comparison
+
+    def compile_binary_boolean_operator(self, expression_node):
+        interp = self.interp
+        op = expression_node.elem_type
+        op1 = self.compile_expression(expression_node.dict['op1'])
+        op2 = self.compile_expression(expression_node.dict['op2'])
+        is_and = op == "&&"
+
+        if interp.short_circuit:
+            def evaluate_short_circuit_operator():
+                eval1 = op1()
+                if type(eval1) is not bool:
+                    eval1 = interp.check_boolean_operand(expression_node, eval1)
+                # false && ..., true || ...
+                if eval1 is not is_and:
+                    return eval1
+                eval2 = op2()
+                if type(eval2) is not bool:
+                    eval2 = interp.check_boolean_operand(expression_node, eval2)
+                return eval2
+            return evaluate_short_circuit_operator
+
+        def evaluate_binary_boolean_operator():
+            # forces evaluation on both (strict evaluation)
+            eval1 = op1()
+            eval2 = op2()
+            if type(eval1) is int:
+                eval1 = bool(eval1)
+            if type(eval2) is int:
+                eval2 = bool(eval2)
+            if (type(eval1) is not bool) or (type(eval2) is not bool):
+                interp.error(ErrorType.TYPE_ERROR, f"Comparison args for {op} must be of same type bool.",)
+            return (eval1 and eval2) if is_and else (eval1 or eval2)
+        return evaluate_binary_boolean_operator
+
+    # same as evaluate_expression's fcall case: void check first, then the call itself
+    def compile_func_call_expression(self, expression_node):
+        interp = self.interp
+        func_call = expression_node.dict['name']
+        if func_call not in interp.builtin_funcs:
+            arg_len = len(expression_node.dict['args'])
+            func_def = interp.func_table.get((func_call, arg_len))
+            if func_def is None:
+                def wrong_arg_count():
+                    interp.error(ErrorType.NAME_ERROR, f"Incorrect amount of arguments given: {arg_len} ",)
+                return wrong_arg_count
+            if func_def.dict['return_type'] == "void":
+                def void_in_expression():
+                    interp.error(ErrorType.TYPE_ERROR, f"Function return type void must not be in expression.",)
+                return void_in_expression
+        return self.compile_func_call(expression_node)
+
+    def compile_struct_def(self, expression_node):
+        new_struct_object = self.interp.new_struct_object
+        struct_name = expression_node.dict['var_type']
+        return lambda: new_struct_object(struct_name)
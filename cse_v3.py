@@ -0,0 +1,190 @@
+# Common subexpression elimination for the tree walker.
+# Runs once at load time, after loop invariant code motion (licm_v3.py). Works on basic blocks: the straight-line
+# statements of a function body or if/for body up to the next if or for (an if's condition still belongs to the
+# statements before it). In each one it finds the expressions that are evaluated more than once with the same
+# value and keeps the value in a hidden slot the first time:
+#   - operators, dotted reads (`n.next.next.value`) and calls to pure functions (memo_v3.py's PurityAnalyzer)
+#   - made of literals, variables and other such expressions, and nothing in between changed what they read: an
+#     assignment or vardef of one of their variables, and for dotted reads any field assignment or call to a function
+#     that isn't pure (it could assign fields of anything it's passed) starts a new version
+# The first evaluation becomes Element("cse_def") and stores the value in frame 0 (the call's param scope, so
+# recursion can't mix them up) after the params, the ones after it become var nodes that read that slot. Nothing
+# moves: the cse_def is evaluated where the expression was, so errors happen at the same point, and the reads only
+# run after their cse_def has in that run of the block (evaluation is strict and left to right).
+# With Interpreter(short_circuit=True) the second operand of && and || might not run, so nothing in it becomes a
+# cse_def; it can still read a hidden slot whose cse_def came before.
+#
+# Only engine="tree" uses this, like licm_v3.py.
+#
+# Annotations (stored in node.dict):
+#   func -> 'temps' (how many hidden slots frame 0 needs after the params) on functions that have any
+# and the repeated expressions are replaced with cse_def -> 'expression', 'slot' nodes and var nodes named CSE_NAME.
+
+from element import Element
+from memo_v3 import PurityAnalyzer
+
+OPERATORS = ["+", "-", "*", "/", "==", "<", "<=", ">", ">=", "!=", "&&", "||", "neg", "!"]
+
+BUILTINS = ["print", "inputi", "inputs"]
+
+# name of the hidden variables (not a name the parser accepts)
+CSE_NAME = "%cse"
+
+class SubexpressionEliminator():
+    def __init__(self, func_table, short_circuit=False):
+        self.func_table = func_table
+        self.short_circuit = short_circuit
+        self.pure = {}
+        self.stats = {"eliminated": 0, "functions": {}}
+
+    def eliminate_program(self, func_defs):
+        self.pure = PurityAnalyzer(self.func_table).find_pure(func_defs)
+        for func_node in func_defs:
+            # after escape_v3.py's slots, if it made any
+            self.next_slot = len(func_node.dict['args']) + func_node.dict.get('temps', 0)
+            self.eliminated = 0
+            self.eliminate_block(func_node.dict['statements'] or [])
+            if self.next_slot > len(func_node.dict['args']):
+                func_node.dict['temps'] = self.next_slot - len(func_node.dict['args'])
+            if self.eliminated:
+                name = func_node.dict['name']
+                self.stats["functions"][name] = self.stats["functions"].get(name, 0) + self.eliminated
+                self.stats["eliminated"] += self.eliminated
+        return self.stats
+
+    # splits statements into basic blocks, and does the blocks inside ifs and fors
+    def eliminate_block(self, statements):
+        run = []
+        for statement in statements:
+            if statement.elem_type == "if":
+                run.append(statement)
+                self.eliminate_run(run)
+                run = []
+                self.eliminate_block(statement.dict['statements'] or [])
+                self.eliminate_block(statement.dict['else_statements'] or [])
+            elif statement.elem_type == "for":
+                self.eliminate_run(run)
+                run = []
+                self.eliminate_block(statement.dict['statements'] or [])
+            else:
+                run.append(statement)
+        self.eliminate_run(run)
+
+    ## One basic block ##
+    def eliminate_run(self, statements):
+        # (frame, slot) -> how many times it was assigned so far, and the same for struct fields as a whole
+        self.versions = {}
+        self.heap = 0
+        # every candidate evaluation in order: (key, node, container, index), where container[index] is node
+        self.occurrences = []
+        self.seen = {}
+        for statement in statements:
+            self.visit_statement(statement)
+        slots = {}
+        for key, node, container, index in self.occurrences:
+            if self.seen[key] < 2:
+                continue
+            if key not in slots:
+                slots[key] = self.next_slot
+                self.next_slot += 1
+                container[index] = Element("cse_def", expression=node, slot=slots[key])
+            else:
+                # a plain variable read of the hidden slot, so it's as cheap as any variable
+                container[index] = Element("var", name=CSE_NAME, var_name=CSE_NAME, fields=(), frame=0, slot=slots[key],
+                                           var_type=None)
+                self.eliminated += 1
+
+    # same order the tree walker runs things in
+    def visit_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "vardef":
+                self.assigned(statement_node)
+            case "=":
+                self.visit(statement_node.dict, 'expression')
+                if statement_node.dict['fields']:
+                    self.heap += 1
+                else:
+                    self.assigned(statement_node)
+            case "fcall":
+                # a call statement's value decides whether an if/for body returns, so only its args
+                for i in range(len(statement_node.dict['args'])):
+                    self.visit(statement_node.dict['args'], i)
+                self.called(statement_node)
+            case "return":
+                if statement_node.dict['expression']:
+                    self.visit(statement_node.dict, 'expression')
+            case "if":
+                self.visit(statement_node.dict, 'condition')
+            case "scalar_init":
+                # escape_v3.py's field slots
+                base = statement_node.dict['base']
+                for slot in range(base, base + len(statement_node.dict['values'])):
+                    self.versions[(0, slot)] = self.versions.get((0, slot), 0) + 1
+
+    def assigned(self, statement_node):
+        target = (statement_node.dict.get('frame'), statement_node.dict.get('slot'))
+        self.versions[target] = self.versions.get(target, 0) + 1
+
+    def called(self, fcall_node):
+        if fcall_node.dict['name'] not in BUILTINS and id(self.callee(fcall_node)) not in self.pure:
+            self.heap += 1
+
+    def callee(self, fcall_node):
+        return self.func_table.get((fcall_node.dict['name'], len(fcall_node.dict['args'])))
+
+    # container[index] is the expression. A candidate that was seen before will be a read of the hidden slot, so
+    # what's inside it won't run and isn't looked at. conditional: it might not run (short_circuit), so it can only
+    # be a read.
+    def visit(self, container, index, conditional=False):
+        expression_node = container[index]
+        key = self.key(expression_node)
+        if key is not None and self.is_candidate(expression_node):
+            if key in self.seen:
+                self.occurrences.append((key, expression_node, container, index))
+                self.seen[key] += 1
+                return
+            if not conditional:
+                self.occurrences.append((key, expression_node, container, index))
+                self.seen[key] = 1
+        op = expression_node.elem_type
+        if op in ["neg", "!"]:
+            self.visit(expression_node.dict, 'op1', conditional)
+        elif op in OPERATORS:
+            self.visit(expression_node.dict, 'op1', conditional)
+            self.visit(expression_node.dict, 'op2', conditional or (self.short_circuit and op in ["&&", "||"]))
+        elif op == "fcall":
+            for i in range(len(expression_node.dict['args'])):
+                self.visit(expression_node.dict['args'], i, conditional)
+            self.called(expression_node)
+
+    def is_candidate(self, expression_node):
+        op = expression_node.elem_type
+        return op in OPERATORS or op == "fcall" or (op == "var" and expression_node.dict['fields'])
+
+    # what the expression's value depends on, as of now; None if it could have side effects (or isn't worth it)
+    def key(self, expression_node):
+        op = expression_node.elem_type
+        match op:
+            case "int" | "string" | "bool":
+                return (op, expression_node.dict['val'])
+            case "nil":
+                return (op,)
+            case "var":
+                target = (expression_node.dict['frame'], expression_node.dict['slot'])
+                fields = expression_node.dict['fields']
+                return (op, expression_node.dict['name'], target, self.versions.get(target, 0), fields, self.heap if fields else 0)
+            case "neg" | "!":
+                operand = self.key(expression_node.dict['op1'])
+                return None if operand is None else (op, operand)
+            case "fcall":
+                if (expression_node.dict['name'] in BUILTINS or expression_node.dict.get('tail_call')
+                        or id(self.callee(expression_node)) not in self.pure):
+                    return None
+                args = tuple(self.key(arg) for arg in expression_node.dict['args'])
+                return None if None in args else (op, expression_node.dict['name'], args)
+        if op in OPERATORS:
+            operand1 = self.key(expression_node.dict['op1'])
+            operand2 = self.key(expression_node.dict['op2'])
+            return None if operand1 is None or operand2 is None else (op, operand1, operand2)
+        # new, loop invariants
+        return None
@@ -0,0 +1,146 @@
+# Escape analysis and scalar replacement for the tree walker.
+# Runs once at load time, before loop invariant code motion and cse (licm_v3.py/cse_v3.py treat what it makes as
+# plain variables). A struct variable doesn't escape its function if every use of it is one of
+#   - `p = new T` with T its own declared type
+#   - a dotted read or assignment through it, `p.f`, `p.f.g = ...`, with f one of T's fields
+# so it's never compared, passed, returned, printed or stored anywhere, and no one can tell whether its fields live in
+# a StructObject or not. The fields of those get hidden slots in frame 0 (the call's param scope, like cse's temps),
+# the `new` just resets them to the defaults and `p.f...` reads/assigns the slot for f like any variable.
+# Anything else that uses the variable keeps the StructObject, so `==` and `!=` on it still compare identity.
+#
+# A field slot is None while the struct is nil (from the vardef until the first `new`), so the usual "variable isn't
+# bound" check in get_value_of_variable/do_assignment is where the nil check happens, and they report it the same
+# way a nil struct would.
+#
+# Only engine="tree" uses this: the other engines compile the AST themselves.
+#
+# Annotations (stored in node.dict):
+#   func -> 'temps' (how many hidden slots frame 0 needs after the params) on functions that have any
+#   var, = -> 'scalar_field' (the field the slot holds) on the reads/assignments that now go to a hidden slot,
+#             with 'frame', 'slot', 'fields' and 'var_type' describing the slot instead of the struct variable
+# and the variable's vardef and `new`s are replaced with scalar_init -> 'base', 'values' nodes, which set frame 0's
+# slots base, base + 1, ... to the values.
+
+from element import Element
+
+OPERATORS = ["+", "-", "*", "/", "==", "<", "<=", ">", ">=", "!=", "&&", "||", "neg", "!"]
+
+class EscapeAnalyzer():
+    def __init__(self, struct_registry):
+        self.struct_registry = struct_registry
+        self.stats = {"replaced": 0, "fields": 0, "functions": {}}
+
+    def replace_program(self, func_defs):
+        for func_node in func_defs:
+            self.replace_func(func_node)
+        return self.stats
+
+    def replace_func(self, func_node):
+        # (frame, slot) -> the vardefs that declare it, and every use of it as (node, container, index)
+        self.vardefs = {}
+        self.uses = {}
+        self.visit_block(func_node.dict['statements'] or [])
+        next_slot = len(func_node.dict['args']) + func_node.dict.get('temps', 0)
+        replaced = 0
+        for target, vardefs in self.vardefs.items():
+            struct_type = self.replaceable(vardefs, self.uses.get(target, []))
+            if struct_type is None:
+                continue
+            self.replace(vardefs[0], self.uses.get(target, []), struct_type, next_slot)
+            next_slot += len(struct_type.template)
+            replaced += 1
+            self.stats["fields"] += len(struct_type.template)
+        if replaced:
+            func_node.dict['temps'] = next_slot - len(func_node.dict['args'])
+            name = func_node.dict['name']
+            self.stats["functions"][name] = self.stats["functions"].get(name, 0) + replaced
+            self.stats["replaced"] += replaced
+
+    ## Finding the uses ##
+    def visit_block(self, statements):
+        for i in range(len(statements)):
+            self.visit_statement(statements, i)
+
+    # container[index] is the statement
+    def visit_statement(self, container, index):
+        statement_node = container[index]
+        match statement_node.elem_type:
+            case "vardef":
+                # (a redefinition has no frame, it's an error when it runs)
+                if statement_node.dict.get('frame') is not None:
+                    target = (statement_node.dict['frame'], statement_node.dict['slot'])
+                    self.vardefs.setdefault(target, []).append((statement_node, container, index))
+            case "=":
+                self.visit_expression(statement_node.dict['expression'])
+                self.used(statement_node, container, index)
+            case "fcall":
+                self.visit_expression(statement_node)
+            case "return":
+                if statement_node.dict['expression']:
+                    self.visit_expression(statement_node.dict['expression'])
+            case "if":
+                self.visit_expression(statement_node.dict['condition'])
+                self.visit_block(statement_node.dict['statements'] or [])
+                self.visit_block(statement_node.dict['else_statements'] or [])
+            case "for":
+                self.visit_statement(statement_node.dict, 'init')
+                self.visit_expression(statement_node.dict['condition'])
+                self.visit_block(statement_node.dict['statements'] or [])
+                self.visit_statement(statement_node.dict, 'update')
+
+    def visit_expression(self, expression_node):
+        op = expression_node.elem_type
+        if op == "var":
+            self.used(expression_node, None, None)
+        elif op in ["neg", "!"]:
+            self.visit_expression(expression_node.dict['op1'])
+        elif op in OPERATORS:
+            self.visit_expression(expression_node.dict['op1'])
+            self.visit_expression(expression_node.dict['op2'])
+        elif op == "fcall":
+            for arg in expression_node.dict['args']:
+                self.visit_expression(arg)
+
+    def used(self, node, container, index):
+        # frame 0 is the params, they come from the caller
+        if node.dict['frame']:
+            self.uses.setdefault((node.dict['frame'], node.dict['slot']), []).append((node, container, index))
+
+    ## Rewriting ##
+    # the variable's StructType if nothing can see it's a StructObject, otherwise None
+    def replaceable(self, vardefs, uses):
+        # two variables in different blocks can have the same (frame, slot), then a use could be either one
+        if len(vardefs) != 1:
+            return None
+        struct_type = self.struct_registry.get(vardefs[0][0].dict['var_type'])
+        if struct_type is None or struct_type.template is None:
+            return None
+        for node, _, _ in uses:
+            fields = node.dict['fields']
+            if fields:
+                if fields[0] not in struct_type.fields:
+                    return None
+            elif node.elem_type == "var":
+                return None
+            else:
+                expression = node.dict['expression']
+                if expression.elem_type != "new" or expression.dict['var_type'] != struct_type.name:
+                    return None
+        return struct_type
+
+    def replace(self, vardef, uses, struct_type, base):
+        statement_node, container, index = vardef
+        # the struct starts out nil: no field slot is bound
+        container[index] = Element("scalar_init", base=base, values=[None] * len(struct_type.template))
+        for node, container, index in uses:
+            fields = node.dict['fields']
+            if not fields:
+                # `p = new T`
+                container[index] = Element("scalar_init", base=base, values=list(struct_type.template))
+                continue
+            offset, field_type = struct_type.fields[fields[0]]
+            node.dict['frame'] = 0
+            node.dict['slot'] = base + offset
+            node.dict['fields'] = tuple(fields[1:])
+            node.dict['var_type'] = field_type
+            node.dict['scalar_field'] = fields[0]
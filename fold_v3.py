@@ -0,0 +1,229 @@
+# Constant folding and dead branch elimination for the v3 interpreter.
+# Runs once right after parsing, before ScopeResolver, and rewrites the Element tree in place:
+#   - operators whose operands are all constants become a literal (int, string, bool or nil node). The rules are the
+#     tree walker's: ints coerce to bools for !, && and || and when compared with a bool, / is integer division,
+#     && and || only fold when both sides are constant (they're strict), or with short_circuit when the first one
+#     decides the result (`false && ...`, `true || ...`, the second one never runs). An operator that would error at runtime
+#     (division by zero, int + string, comparing nil with an int, ...) is left alone so the error still happens there.
+#   - ifs with a constant condition lose the branch that can't run. Where it's safe the branch that's left replaces
+#     the if in its block (see can_splice), otherwise the if stays with a `true` condition and only that branch.
+#     A constant condition that isn't a bool (or an int) is left alone too, it's a TYPE_ERROR when it runs.
+# Nothing here raises.
+#
+# The folded tree can be printed with format_ast (Interpreter(dump_ast=True), or `python fold_v3.py prog.br`).
+
+from brewparse import parse_program
+from element import Element
+from intbase import *
+from type_valuev3 import *
+
+# what fold_* gives back for anything that isn't a constant (or would error)
+NOT_CONSTANT = object()
+
+# the value of a literal node, NOT_CONSTANT for anything else
+def constant_value(node):
+    if node.elem_type in ["int", "string", "bool"]:
+        return node.dict['val']
+    if node.elem_type == "nil":
+        return nil
+    return NOT_CONSTANT
+
+def literal(value):
+    if value is nil:
+        return Element("nil")
+    if type(value) is bool:
+        return Element("bool", val=value)
+    if type(value) is int:
+        return Element("int", val=value)
+    return Element("string", val=value)
+
+def coerce(value):
+    return bool(value) if type(value) is int else value
+
+## Operators, same rules as Interpreter.apply_* ##
+def fold_binary(op, eval1, eval2):
+    if type(eval1) is int and type(eval2) is int:
+        if op == "+":
+            return eval1 + eval2
+        elif op == "-":
+            return eval1 - eval2
+        elif op == "*":
+            return eval1 * eval2
+        elif eval2 != 0:
+            # integer division
+            return eval1 // eval2
+    elif op == "+" and type(eval1) is str and type(eval2) is str:
+        return eval1 + eval2
+    return NOT_CONSTANT
+
+def fold_comparison(op, eval1, eval2):
+    eval1 = coerce(eval1) if type(eval2) is bool else eval1
+    eval2 = coerce(eval2) if type(eval1) is bool else eval2
+    if (eval1 is nil) != (eval2 is nil):
+        # there are no struct constants
+        return NOT_CONSTANT
+    if op == "==":
+        return eval1 == eval2
+    if op == "!=":
+        return eval1 != eval2
+    if not (type(eval1) is int and type(eval2) is int):
+        return NOT_CONSTANT
+    match op:
+        case '<':
+            return eval1 < eval2
+        case '<=':
+            return eval1 <= eval2
+        case '>':
+            return eval1 > eval2
+        case '>=':
+            return eval1 >= eval2
+
+def fold_boolean(op, eval1, eval2):
+    eval1 = coerce(eval1)
+    eval2 = coerce(eval2)
+    if type(eval1) is not bool or type(eval2) is not bool:
+        return NOT_CONSTANT
+    return (eval1 and eval2) if op == "&&" else (eval1 or eval2)
+
+def fold_unary(op, eval):
+    if op == "neg":
+        return -eval if type(eval) is int else NOT_CONSTANT
+    eval = coerce(eval)
+    return (not eval) if type(eval) is bool else NOT_CONSTANT
+
+class ConstantFolder():
+    # short_circuit: Interpreter(short_circuit=True), && and || skip the second operand when they can
+    def __init__(self, short_circuit=False):
+        self.short_circuit = short_circuit
+        self.stats = {"folded": 0, "dead_branches": 0}
+
+    def fold_program(self, func_defs):
+        for func_node in func_defs:
+            func_node.dict['statements'] = self.fold_block(func_node.dict['statements'], top_level=True)
+        return self.stats
+
+    ## Statements ##
+    # top_level: the block is a function body, where only `return;` and if/for results end the function
+    def fold_block(self, statements, top_level=False):
+        if not statements:
+            return statements
+        folded = []
+        for i, statement in enumerate(statements):
+            # a function body's last statement gives the function its value, and no block can end up empty
+            keep = i == len(statements) - 1 and (top_level or not folded)
+            folded += self.fold_statement(statement, top_level, keep)
+        return folded
+
+    # gives back the statements that replace statement_node in its block (keep: it can't be replaced with nothing)
+    def fold_statement(self, statement_node, top_level, keep):
+        match statement_node.elem_type:
+            case "=":
+                statement_node.dict['expression'] = self.fold_expression(statement_node.dict['expression'])
+            case "fcall":
+                self.fold_args(statement_node)
+            case "return":
+                if statement_node.dict['expression']:
+                    statement_node.dict['expression'] = self.fold_expression(statement_node.dict['expression'])
+            case "for":
+                self.fold_statement(statement_node.dict['init'], False, False)
+                statement_node.dict['condition'] = self.fold_expression(statement_node.dict['condition'])
+                statement_node.dict['statements'] = self.fold_block(statement_node.dict['statements'])
+                self.fold_statement(statement_node.dict['update'], False, False)
+            case "if":
+                return self.fold_if(statement_node, top_level, keep)
+        return [statement_node]
+
+    def fold_if(self, statement_node, top_level, keep):
+        condition = self.fold_expression(statement_node.dict['condition'])
+        statement_node.dict['condition'] = condition
+        statement_node.dict['statements'] = self.fold_block(statement_node.dict['statements'])
+        statement_node.dict['else_statements'] = self.fold_block(statement_node.dict['else_statements'])
+        value = coerce(constant_value(condition))
+        if type(value) is not bool:
+            return [statement_node]
+        live = statement_node.dict['statements' if value else 'else_statements'] or []
+        if not live and keep:
+            # `if (false) {...}` with no else: nothing to run, but there's nothing to replace it with either
+            # (the parser never makes empty blocks)
+            return [statement_node]
+        self.stats["dead_branches"] += 1
+        if self.can_splice(live, top_level):
+            return live
+        # keep the if (and its scope), minus the branch that can't run
+        statement_node.dict['condition'] = literal(True)
+        statement_node.dict['statements'] = live
+        statement_node.dict['else_statements'] = None
+        return [statement_node]
+
+    # Can the branch's statements go straight into the block the if is in? Not if it declares variables (the branch
+    # has its own scope). In a function body, also not if a statement's value would end the function inside an if
+    # but not outside one (calls that give back a value, `return x;`), see run_func vs run_if_branch.
+    def can_splice(self, statements, top_level):
+        for statement in statements:
+            if statement.elem_type == "vardef":
+                return False
+            if top_level:
+                if statement.elem_type == "fcall" and statement.dict['name'] != "print":
+                    return False
+                if statement.elem_type == "return" and statement.dict['expression']:
+                    return False
+        return True
+
+    ## Expressions ##
+    def fold_args(self, fcall_node):
+        fcall_node.dict['args'] = [self.fold_expression(arg) for arg in fcall_node.dict['args']]
+
+    # gives back the node that replaces expression_node
+    def fold_expression(self, expression_node):
+        op = expression_node.elem_type
+        match op:
+            case "fcall":
+                self.fold_args(expression_node)
+                return expression_node
+            case "neg" | "!":
+                expression_node.dict['op1'] = self.fold_expression(expression_node.dict['op1'])
+                eval = constant_value(expression_node.dict['op1'])
+                value = NOT_CONSTANT if eval is NOT_CONSTANT else fold_unary(op, eval)
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                expression_node.dict['op1'] = self.fold_expression(expression_node.dict['op1'])
+                expression_node.dict['op2'] = self.fold_expression(expression_node.dict['op2'])
+                eval1 = constant_value(expression_node.dict['op1'])
+                eval2 = constant_value(expression_node.dict['op2'])
+                if self.short_circuit and op in ["&&", "||"] and coerce(eval1) is (op == "||"):
+                    value = coerce(eval1)
+                elif eval1 is NOT_CONSTANT or eval2 is NOT_CONSTANT:
+                    value = NOT_CONSTANT
+                elif op in ["+", "-", "*", "/"]:
+                    value = fold_binary(op, eval1, eval2)
+                elif op in ["&&", "||"]:
+                    value = fold_boolean(op, eval1, eval2)
+                else:
+                    value = fold_comparison(op, eval1, eval2)
+            case _:
+                return expression_node
+        if value is NOT_CONSTANT:
+            return expression_node
+        self.stats["folded"] += 1
+        return literal(value)
+
+# Indented dump of an Element tree: one node per line, child nodes under their key
+def format_ast(node, indent=0, label=""):
+    scalars = " ".join(f"{key}={value!r}" for key, value in node.dict.items()
+                       if not isinstance(value, Element) and not isinstance(value, list))
+    lines = ["  " * indent + label + node.elem_type + (" " + scalars if scalars else "")]
+    for key, value in node.dict.items():
+        if isinstance(value, Element):
+            lines.append(format_ast(value, indent + 1, key + ": "))
+        elif isinstance(value, list):
+            lines.append("  " * (indent + 1) + key + ":")
+            lines += [format_ast(child, indent + 2) for child in value if isinstance(child, Element)]
+    return "\n".join(lines)
+
+# python fold_v3.py program.br -> prints the folded AST and what was folded
+if __name__ == "__main__":
+    import sys
+    with open(sys.argv[1]) as f:
+        ast = parse_program(f.read())
+    stats = ConstantFolder().fold_program(ast.dict['functions'])
+    print(format_ast(ast))
+    print(stats)
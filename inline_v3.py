@@ -0,0 +1,118 @@
+# Inlining of small leaf functions for the tree walker.
+# Runs once at load time, after ScopeResolver and TypeChecker. A function is inlined if its body is straight-line
+# code that can't call anything (only assignments and returns, no calls, no variables of its own) and has at most
+# `budget` nodes, e.g. getters and setters. Every call to it gets its own copy of the body in the call node's
+# 'inline', where the params (frame 0 in the function) are read and written through frame -1: do_func_call binds
+# and checks the args like any call, pushes them as one frame on top of the caller's scopes, runs the copy and
+# checks the return value (see Interpreter.run_inlined). That skips the scope stack swap and run_func. Recursion
+# never gets inlined since a leaf calls nothing.
+# Nothing changes for calls to other functions, and the other engines ignore 'inline'.
+#
+# Annotations (stored in node.dict):
+#   fcall -> 'inline' (the callee's statements) on calls to inlined functions
+
+import copy
+
+# default size budget, in AST nodes (`return p.x;` is 2)
+INLINE_BUDGET = 16
+
+class Inliner():
+    def __init__(self, func_table, budget=INLINE_BUDGET):
+        self.func_table = func_table
+        self.budget = budget
+        self.stats = {"inlined_functions": 0, "call_sites": 0}
+
+    def inline_program(self, func_defs):
+        inlined = set()
+        for func_node in func_defs:
+            if self.can_inline(func_node):
+                inlined.add(id(func_node))
+        self.stats["inlined_functions"] = len(inlined)
+        for func_node in func_defs:
+            for statement in func_node.dict['statements'] or []:
+                self.inline_calls(statement, inlined)
+        return self.stats
+
+    # small straight-line code, and nothing in it can call a function or declare a variable
+    def can_inline(self, func_node):
+        statements = func_node.dict['statements']
+        if func_node.dict['name'] == "main" or not statements:
+            return False
+        size = 0
+        for statement in statements:
+            if statement.elem_type == "=":
+                size += 1 + self.expression_size(statement.dict['expression'])
+            elif statement.elem_type == "return":
+                size += 1 + (self.expression_size(statement.dict['expression']) if statement.dict['expression'] else 0)
+            else:
+                return False
+        return size <= self.budget
+
+    # node count, or something over any budget if the expression has a call in it
+    def expression_size(self, expression_node):
+        match expression_node.elem_type:
+            case "fcall":
+                return float("inf")
+            case "neg" | "!":
+                return 1 + self.expression_size(expression_node.dict['op1'])
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                return 1 + self.expression_size(expression_node.dict['op1']) + self.expression_size(expression_node.dict['op2'])
+        return 1
+
+    ## Call sites ##
+    def inline_calls(self, statement_node, inlined):
+        match statement_node.elem_type:
+            case "=":
+                self.inline_expression(statement_node.dict['expression'], inlined)
+            case "fcall":
+                self.inline_expression(statement_node, inlined)
+            case "return":
+                if statement_node.dict['expression']:
+                    self.inline_expression(statement_node.dict['expression'], inlined)
+            case "if":
+                self.inline_expression(statement_node.dict['condition'], inlined)
+                for statement in (statement_node.dict['statements'] or []) + (statement_node.dict['else_statements'] or []):
+                    self.inline_calls(statement, inlined)
+            case "for":
+                self.inline_calls(statement_node.dict['init'], inlined)
+                self.inline_expression(statement_node.dict['condition'], inlined)
+                for statement in statement_node.dict['statements'] or []:
+                    self.inline_calls(statement, inlined)
+                self.inline_calls(statement_node.dict['update'], inlined)
+
+    def inline_expression(self, expression_node, inlined):
+        match expression_node.elem_type:
+            case "fcall":
+                for arg in expression_node.dict['args']:
+                    self.inline_expression(arg, inlined)
+                func_def = self.func_table.get((expression_node.dict['name'], len(expression_node.dict['args'])))
+                if func_def is not None and id(func_def) in inlined and expression_node.dict['name'] not in ["inputs", "inputi", "print"]:
+                    expression_node.dict['inline'] = self.copy_body(func_def)
+                    self.stats["call_sites"] += 1
+            case "neg" | "!":
+                self.inline_expression(expression_node.dict['op1'], inlined)
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                self.inline_expression(expression_node.dict['op1'], inlined)
+                self.inline_expression(expression_node.dict['op2'], inlined)
+
+    # a copy of the function's statements with its params moved from frame 0 to frame -1
+    def copy_body(self, func_def):
+        statements = copy.deepcopy(func_def.dict['statements'])
+        for statement in statements:
+            if statement.elem_type == "=" and statement.dict['frame'] == 0:
+                statement.dict['frame'] = -1
+            expression = statement.dict['expression']
+            if expression:
+                self.move_params(expression)
+        return statements
+
+    def move_params(self, expression_node):
+        match expression_node.elem_type:
+            case "var":
+                if expression_node.dict['frame'] == 0:
+                    expression_node.dict['frame'] = -1
+            case "neg" | "!":
+                self.move_params(expression_node.dict['op1'])
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                self.move_params(expression_node.dict['op1'])
+                self.move_params(expression_node.dict['op2'])
@@ -1,33 +1,163 @@
 # Author: Shelby Falde
 # Course: CS131
 
+import operator
+from collections import defaultdict
 from brewparse import *
 from intbase import *
+from type_valuev3 import *
+from closure_v3 import ClosureCompiler
+from bytecode_v3 import BytecodeCompiler
+from vm_v3 import VirtualMachine
+from resolver_v3 import ScopeResolver
+from fold_v3 import ConstantFolder, format_ast
+from reach_v3 import ReachabilityAnalyzer
+from inline_v3 import Inliner, INLINE_BUDGET
+from tailcall_v3 import TailCallMarker
+from memo_v3 import PurityAnalyzer, MemoCache, MEMO_SIZE, new_memo_stats
+from escape_v3 import EscapeAnalyzer
+from licm_v3 import LoopInvariantHoister
+from cse_v3 import SubexpressionEliminator
+from typecheck_v3 import TypeChecker
+from transpile_v3 import PythonTranspiler
+from cgen_v3 import NativeRunner
+from tracejit_v3 import TraceCompiler, JIT_THRESHOLD, EXIT, BLACKLISTED, new_jit_stats
 
-nil = Element("nil")
-
-# Way to differentiate between a specific struct and just a value
-# The probable "correct" way is to make every variable an object like this, but I felt itd require too much rewriting to pull out the value, so I decided against it.
-class StructObject():
-    def __init__(self, fields, _type):
-        self._fields = fields
-        self._type = _type
+# Operator nodes specialize themselves the first time they run (see specialize_operator). If the operand types are
+# one of these pairs the node keeps (type1, type2, op) as node.spec, and from then on evaluate_expression only checks
+# the two types and applies op. When the check fails the node is deoptimized (spec = GENERIC) for the rest of the run.
+SPECIALIZATIONS = {
+    ("+", int, int): operator.add, ("-", int, int): operator.sub, ("*", int, int): operator.mul, ("/", int, int): operator.floordiv,
+    ("+", str, str): operator.add,
+    ("<", int, int): operator.lt, ("<=", int, int): operator.le, (">", int, int): operator.gt, (">=", int, int): operator.ge,
+    ("==", int, int): operator.eq, ("!=", int, int): operator.ne,
+    ("==", bool, bool): operator.eq, ("!=", bool, bool): operator.ne,
+    ("==", str, str): operator.eq, ("!=", str, str): operator.ne,
+    ("==", StructObject, StructObject): operator.is_, ("!=", StructObject, StructObject): operator.is_not,
+}
+GENERIC = "generic" # node.spec of a node that didn't specialize or failed its guard, it always takes the generic path
 
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    # engine: "tree" walks the AST directly, "closure" compiles every node into a python closure first,
+    # "vm" compiles to bytecode (bytecode_v3.py) and runs it on the stack VM (vm_v3.py),
+    # "python" translates the program to python source (transpile_v3.py) and exec()s it,
+    # "c" builds the program with the C compiler (cgen_v3.py) and falls back to "tree" for anything it can't translate.
+    # dump_python: with engine="python", print the generated python to stderr before running it
+    # jit: with the tree walker, trace hot for loops and run them as compiled python (tracejit_v3.py)
+    # fold: fold constants and drop dead if branches before running (fold_v3.py), for every engine
+    # dump_ast: print the AST to stderr after folding
+    # short_circuit: && and || skip their second operand when the first one decides the result, for every engine
+    #   (the default evaluates both, like the reference interpreter)
+    # strip: drop the functions and structs main can't reach before running (reach_v3.py), for every engine
+    # dump_stripped: print what strip dropped to stderr
+    # inline_budget: with the tree walker, inline leaf functions of up to this many AST nodes (inline_v3.py), 0 = never
+    # tail_calls: with the tree walker, run self calls in tail position as a loop (tailcall_v3.py)
+    # memo_size: with the tree walker, cache up to this many results per pure function (memo_v3.py), 0 = never
+    # memo_exclude: names of functions never to memoize
+    # licm: with the tree walker, evaluate loop invariant expressions once per loop (licm_v3.py)
+    # cse: with the tree walker, evaluate repeated expressions once per basic block (cse_v3.py)
+    # scalar_replace: with the tree walker, keep the fields of structs that never leave their function in local slots
+    # instead of allocating them (escape_v3.py)
+    def __init__(self, console_output=True, inp=None, trace_output=False, engine="tree", dump_python=False, jit=False,
+                 fold=True, dump_ast=False, inline_budget=INLINE_BUDGET, tail_calls=True, memo_size=MEMO_SIZE,
+                 memo_exclude=(), licm=True, cse=True, scalar_replace=True, strip=True, dump_stripped=False,
+                 short_circuit=False):
         super().__init__(console_output, inp)   # call InterpreterBase's constructor
+        self.engine = engine
+        self.dump_python = dump_python
+        self.c_fallback = None # engine="c": why the tree walker ran the program instead, None if it ran natively
+        self.jit = jit
+        self.jit_stats = new_jit_stats()
+        self.typecheck_stats = None
+        self.fold = fold
+        self.dump_ast = dump_ast
+        self.fold_stats = None
+        self.short_circuit = short_circuit
+        self.strip = strip
+        self.dump_stripped = dump_stripped
+        self.strip_stats = None
+        self.inline_budget = inline_budget
+        self.inline_stats = None
+        self.tail_calls = tail_calls
+        self.tail_call_stats = None
+        self.memo_size = memo_size
+        self.memo_exclude = memo_exclude
+        self.memo_stats = None
+        self.licm = licm
+        self.licm_stats = None
+        self.cse = cse
+        self.cse_stats = None
+        self.scalar_replace = scalar_replace
+        self.escape_stats = None
         # Since functions (at the top level) can be created anywhere, we'll just do a search for function definitions and assign them 'globally'
         self.builtin_funcs = ["inputs", "inputi", "print"]
         self.func_defs = []
+        self.func_table = {} # (name, arg count) -> func node, built once per run
+        self.func_names = set()
         self.struct_defs = {} # Global Struct Def
-        self.variable_scope_stack = [{}] # Stack to hold variable scopes
+        self.struct_registry = {} # struct name -> StructType, built once per run
+        # Stack to hold variable scopes, each scope is a list of values indexed by the slots ScopeResolver assigned
+        self.variable_scope_stack = [[]]
+        self.free_scopes = defaultdict(list) # frame size -> scope lists that can be reused, see push_scope
+        self.call_stack = [] # the caller's variable_scope_stack for every brewin call in progress
+        self.specialized_nodes = 0 # operator nodes that specialized / deoptimized this run
+        self.deoptimized_nodes = 0
         
     def run(self, program):
         ast = parse_program(program) # returns list of function nodes
         #self.output(ast) # always good for start of assignment
         self.struct_defs = self.get_struct_defs(ast)
+        self.build_struct_registry()
         self.func_defs = self.get_func_defs(ast)
+        self.build_func_table()
         main_func_node = self.get_main_func_node(ast)
+        if self.fold:
+            self.fold_stats = ConstantFolder(self.short_circuit).fold_program(self.func_defs)
+        if self.strip:
+            self.strip_unreachable(ast, main_func_node)
+        if self.dump_ast:
+            import sys
+            print(format_ast(ast), file=sys.stderr)
+        # main starts with none of its params bound (None = not declared)
+        self.variable_scope_stack = [[None] * len(main_func_node.dict['args'])]
+        self.call_stack = []
+        self.specialized_nodes = 0
+        self.deoptimized_nodes = 0
+        self.jit_stats = new_jit_stats()
+        ScopeResolver().resolve_program(self.func_defs)
+        self.typecheck_stats = TypeChecker(self.struct_registry, self.func_table).check_program(self.func_defs)
+        if self.inline_budget and self.engine in ["tree", "c"]:
+            # (engine="c" can end up on the tree walker)
+            self.inline_stats = Inliner(self.func_table, self.inline_budget).inline_program(self.func_defs)
+        if self.tail_calls and self.engine in ["tree", "c"]:
+            self.tail_call_stats = TailCallMarker(self.func_table).mark_program(self.func_defs)
+        if self.memo_size and self.engine in ["tree", "c"]:
+            self.memo_stats = new_memo_stats()
+            self.memo_stats["pure_functions"] = PurityAnalyzer(self.func_table, self.memo_exclude).analyze_program(self.func_defs)
+        # these three add nodes the other passes don't know, so they go last
+        if self.scalar_replace and self.engine == "tree":
+            self.escape_stats = EscapeAnalyzer(self.struct_registry).replace_program(self.func_defs)
+        if self.licm and self.engine == "tree":
+            self.licm_stats = LoopInvariantHoister(self.func_table).hoist_program(self.func_defs)
+        if self.cse and self.engine == "tree":
+            self.cse_stats = SubexpressionEliminator(self.func_table, self.short_circuit).eliminate_program(self.func_defs)
+        # main's hidden slots (its scope was made before anything knew about them)
+        self.variable_scope_stack[0] += [None] * main_func_node.dict.get('temps', 0)
+        if self.engine == "closure":
+            # compile once up front, then only the closures run
+            compiled_funcs = ClosureCompiler(self).compile_program()
+            compiled_funcs[id(main_func_node)]()
+            return
+        if self.engine == "python":
+            PythonTranspiler(self).run(main_func_node, dump=self.dump_python)
+            return
+        if self.engine == "c":
+            NativeRunner(self).run(main_func_node)
+            return
+        if self.engine == "vm":
+            funcs = BytecodeCompiler(self).compile_program()
+            VirtualMachine(self, funcs).run(self.func_defs.index(main_func_node))
+            return
         self.run_func(main_func_node)
 
     # grabs all globally defined struct defs
@@ -41,6 +171,64 @@ class Interpreter(InterpreterBase):
         # returns functions sub-dict, 'functions' is key
         return ast.dict['functions']
 
+    # Works out each struct's field types and default field values once, instead of on every `new`
+    # (first definition of a name wins, same as the old search through struct_defs)
+    def build_struct_registry(self):
+        self.struct_registry = {}
+        first_defs = []
+        for _def in self.struct_defs:
+            if _def.dict['name'] not in self.struct_registry:
+                self.struct_registry[_def.dict['name']] = StructType(_def.dict['name'])
+                first_defs.append(_def)
+        # every struct name has to be registered before the templates, since struct fields default to nil
+        for _def in first_defs:
+            struct_type = self.struct_registry[_def.dict['name']]
+            template = []
+            for fielddef in _def.dict['fields']:
+                field_type = fielddef.dict['var_type']
+                if field_type not in ["int", "bool", "string", "void"] and field_type not in self.struct_registry:
+                    # `new` on this struct has to fail on this field, so don't build a template
+                    struct_type.bad_field_type = field_type
+                    break
+                field_name = fielddef.dict['name']
+                if field_name in struct_type.fields:
+                    # a repeated field name keeps its first offset but takes the later type/default
+                    offset = struct_type.fields[field_name][0]
+                    template[offset] = self.get_default_value(field_type)
+                else:
+                    offset = len(template)
+                    template.append(self.get_default_value(field_type))
+                struct_type.fields[field_name] = (offset, field_type)
+            else:
+                struct_type.template = template
+
+    # Hash the functions by (name, arg count) so a call doesn't have to scan func_defs
+    # (first definition wins, same as the old linear search)
+    def build_func_table(self):
+        self.func_table = {}
+        self.func_names = set()
+        for func in self.func_defs:
+            self.func_table.setdefault((func.dict['name'], len(func.dict['args'])), func)
+            self.func_names.add(func.dict['name'])
+
+    # Drops the functions and structs main can't reach (reach_v3.py) from the AST and the tables built from it.
+    # func_names keeps every name, so calling a stripped function's name with the wrong number of args (it can't be
+    # called with the right number, or it wouldn't be stripped) reports the same error as before.
+    def strip_unreachable(self, ast, main_func_node):
+        funcs, structs = ReachabilityAnalyzer(self.func_table, self.struct_registry).find_reachable(main_func_node)
+        self.strip_stats = {
+            "functions": [f"{func.dict['name']}/{len(func.dict['args'])}" for func in self.func_defs if id(func) not in funcs],
+            "structs": [name for name in self.struct_registry if name not in structs],
+        }
+        ast.dict['functions'] = self.func_defs = [func for func in self.func_defs if id(func) in funcs]
+        ast.dict['structs'] = self.struct_defs = [_def for _def in self.struct_defs if _def.dict['name'] in structs]
+        self.func_table = {key: func for key, func in self.func_table.items() if id(func) in funcs}
+        self.struct_registry = {name: struct_type for name, struct_type in self.struct_registry.items() if name in structs}
+        if self.dump_stripped:
+            import sys
+            print(f"stripped functions: {', '.join(self.strip_stats['functions']) or '-'}", file=sys.stderr)
+            print(f"stripped structs: {', '.join(self.strip_stats['structs']) or '-'}", file=sys.stderr)
+
     # returns 'main' func node from the dict input.
     def get_main_func_node(self, ast):
         # checks for function whose name is 'main'
@@ -50,43 +238,73 @@ class Interpreter(InterpreterBase):
         # define error for 'main' not found.
         super().error(ErrorType.NAME_ERROR, "No main() function was found",)
 
+    # Blocks that declare nothing have a frame_size of 0 and don't get a scope at all (the resolver doesn't give them
+    # a frame number either). Everything else reuses a list from free_scopes when there is one. A block never reads
+    # one of its slots before that slot's vardef has written it, so whatever an old scope left behind is never seen.
+    # Every push_scope needs a matching pop_scope with the same frame_size.
+    def push_scope(self, frame_size):
+        if frame_size:
+            free = self.free_scopes[frame_size]
+            self.variable_scope_stack.append(free.pop() if free else [None] * frame_size)
+
+    def pop_scope(self, frame_size):
+        if frame_size:
+            self.free_scopes[frame_size].append(self.variable_scope_stack.pop())
+
     # self explanatory
     def run_func(self, func_node):
         # statements key for sub-dict.
-        ### BEGIN FUNC SCOPE ###
-        self.variable_scope_stack.append({})
+        frame_size = func_node.dict['frame_size']
+        while True:
+            ### BEGIN FUNC SCOPE ###
+            self.push_scope(frame_size)
+            return_value = nil
+
+            for statement in func_node.dict['statements']:
+                return_value = self.run_statement(statement)
+                # check if statement results in a return, and return a return statement with 
+                if isinstance(return_value, Element) and return_value.elem_type == "return":
+                    # Return the value, dont need to continue returning.
+                    return_value = return_value.get("value")
+                    break
+
+            ### END FUNC SCOPE ###
+            self.pop_scope(frame_size)
+            if not (isinstance(return_value, Element) and return_value.elem_type == "tailcall"):
+                return self.check_return_value(func_node, return_value) # Perform type checking
+            # self call in tail position (tailcall_v3.py): run the function again with the new args as its params
+            self.variable_scope_stack[0] = return_value.get("args")
+    
+    # run_func for a call site's copy of an inlined function: only assignments and returns, no scope of its own.
+    # Same return rules: a bare `return;` stops it, otherwise the last statement's value is returned.
+    def run_inlined(self, func_node, statements):
+        if len(statements) == 1 and statements[0].elem_type == "return" and statements[0].dict['expression']:
+            # getter: `return expr;`
+            return self.check_return_value(func_node, self.evaluate_expression(statements[0].dict['expression']))
         return_value = nil
-        func_ret_type = func_node.dict['return_type']
-        
-        for statement in func_node.dict['statements']:
+        for statement in statements:
             return_value = self.run_statement(statement)
-            # check if statement results in a return, and return a return statement with 
             if isinstance(return_value, Element) and return_value.elem_type == "return":
-                # Return the value, dont need to continue returning.
-                self.variable_scope_stack.pop()
                 return_value = return_value.get("value")
-                return_value = self.do_func_typecheck(func_ret_type, return_value) # Perform type checking
-                return return_value
-        
-        ### END FUNC SCOPE ###
-        self.variable_scope_stack.pop()
-        return_value = self.do_func_typecheck(func_ret_type, return_value) # Perform type checking
-        #self.output(return_value)
-        return return_value
-    
+                break
+        return self.check_return_value(func_node, return_value)
+
+    # do_func_typecheck, unless the type checker proved it can only be the right type (nil still becomes the default)
+    def check_return_value(self, func_node, return_value):
+        if func_node.dict['return_checked']:
+            return self.get_default_value(func_node.dict['return_type']) if return_value is nil else return_value
+        return self.do_func_typecheck(func_node.dict['return_type'], return_value)
+
     # Let's define the default values here, and just assign in the definition.
-    # Switching to if else to do 'type_name in self.struct_defs'
+    # Switching to if else to do 'type_name in self.struct_registry'
     def get_default_value(self, type_name):
-        struct_def_names = []
-        for _def in self.struct_defs:
-            struct_def_names.append(_def.dict['name'])
         if type_name == "int":
             return 0
         elif type_name == "bool":
             return False
         elif type_name == "string":
             return ""
-        elif type_name in struct_def_names:
+        elif type_name in self.struct_registry:
             return nil
         elif type_name == "void":
             return nil
@@ -107,6 +325,11 @@ class Interpreter(InterpreterBase):
             return self.do_if_statement(statement_node)
         elif self.is_for_loop(statement_node):
             return self.do_for_loop(statement_node)
+        elif statement_node.elem_type == "scalar_init":
+            # vardef or `new` of a struct escape_v3.py replaced with its fields
+            base = statement_node.dict['base']
+            values = statement_node.dict['values']
+            self.variable_scope_stack[0][base:base + len(values)] = values
         return nil
     
     def is_definition(self, statement_node):
@@ -123,69 +346,78 @@ class Interpreter(InterpreterBase):
         return (True if statement_node.elem_type == "for" else False)
 
     def do_definition(self, statement_node):
-        # just add to var_name_to_value dict
+        # just put the default value in the slot the resolver gave this var
         target_var_name = self.get_target_variable_name(statement_node)
         target_var_type = self.get_target_variable_type(statement_node)
-        if target_var_name in self.variable_scope_stack[-1]:
+        if statement_node.dict['redefined']:
             super().error(ErrorType.NAME_ERROR, f"Variable {target_var_name} defined more than once",)
         else:
-            # I liked variables being a dict with 'value' and 'type', let's do that again
-            self.variable_scope_stack[-1][target_var_name] = {
-                'value' : self.get_default_value(target_var_type),
-                'type' : target_var_type
-            }
+            # the type doesn't need storing, the resolver put it on every assignment to this var
+            self.variable_scope_stack[-1][statement_node.dict['slot']] = self.get_default_value(target_var_type)
         
     def do_assignment(self, statement_node):
-        target_var_name = self.get_target_variable_name(statement_node)
         source_node = self.get_expression_node(statement_node)
         resulting_value = self.evaluate_expression(source_node)
-        
-        fields = target_var_name.split('.')
-        target_var_name = fields[0]
-        fields = fields[1:]
-            
-        for scope in reversed(self.variable_scope_stack): 
-            if target_var_name in scope: 
-                # Does not evaluate until after checking if valid variable
-                curr = scope[target_var_name]
-                #self.output(curr)
-                for field in fields: # traverse excluding last field
-                    if (curr['value'] is nil):
-                        super().error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
-                    if (type(curr['value']) != StructObject):
-                        super().error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
-                    # previous field is struct object is implicit now
-                    if (field not in curr['value']._fields):
-                        super().error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
-                    # Everything must be valid!
-                    curr = curr['value']._fields[field]
-  
-                #last_field = fields[-1]  
-                var_type = curr['type'] # type check against field type, not struct type
+
+        # "a.b.c" was already split by the resolver
+        target_var_name = statement_node.dict['var_name']
+        fields = statement_node.dict['fields']
+
+        frame = statement_node.dict['frame']
+        slot = statement_node.dict['slot']
+        # None frame = not declared anywhere, None value = declared but never bound (main's params)
+        if frame is None or self.variable_scope_stack[frame][slot] is None:
+            if 'scalar_field' in statement_node.dict:
+                # a field of a struct escape_v3.py replaced, and the struct is nil
+                super().error(ErrorType.FAULT_ERROR, f"Cannot apply field {statement_node.dict['scalar_field']} to nil-value variable",)
+            super().error(ErrorType.NAME_ERROR, f"variable used and not declared: {target_var_name}",)
+        # 'checked': the type checker proved the value already has the right type
+        checked = statement_node.dict['checked']
+        if not fields:
+            if not checked:
+                var_type = statement_node.dict['var_type']
                 ## Perform Type Checking ##
                 resulting_value = self.check_coercion(resulting_value) if var_type == "bool" else resulting_value
-                if type(resulting_value) is bool:
-                    curr['type'] = 'bool'
-                if self.check_valid_type(resulting_value, var_type):
-                    curr['value'] = resulting_value
-                    return
-                else:
+                if not self.check_valid_type(resulting_value, var_type):
                     super().error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
-        super().error(ErrorType.NAME_ERROR, f"variable used and not declared: {target_var_name}",)
+            self.variable_scope_stack[frame][slot] = resulting_value
+            return
+
+        curr = self.variable_scope_stack[frame][slot]
+        for field in fields: # traverse to the last field
+            if (curr is nil):
+                super().error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+            if (type(curr) != StructObject):
+                super().error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+            # previous field is struct object is implicit now
+            field_info = curr._type.fields.get(field)
+            if (field_info is None):
+                super().error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+            # Everything must be valid!
+            struct_obj = curr
+            curr = curr._values[field_info[0]]
+
+        offset, var_type = field_info # type check against field type, not struct type
+        if checked:
+            struct_obj._values[offset] = resulting_value
+            return
+        ## Perform Type Checking ##
+        resulting_value = self.check_coercion(resulting_value) if var_type == "bool" else resulting_value
+        if self.check_valid_type(resulting_value, var_type):
+            struct_obj._values[offset] = resulting_value
+        else:
+            super().error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
 
 
     # Checks if function is defined
     def check_valid_func(self, func_call):
-        for func in self.func_defs:
-            if func.dict['name'] == func_call:
-                return True
-        return False
+        return func_call in self.func_names
 
-    # Allows function overloading by first searching for func_defs for a matching name and arg length
+    # Allows function overloading by looking up a matching name and arg length
     def get_func_def(self, func_call, arg_len):
-        for func in self.func_defs:
-            if func.dict['name'] == func_call and len(func.dict['args']) == arg_len:
-                return func
+        func = self.func_table.get((func_call, arg_len))
+        if func is not None:
+            return func
         # Already check if func exists before calling
         # So, must not have correct args.
         #self.output(func_call)
@@ -221,7 +453,7 @@ class Interpreter(InterpreterBase):
                 arg = statement_node.dict['args'][0]
                 # THIS IS 2/3 OF ONLY REAL SELF.OUTPUT
                 self.output(self.evaluate_expression(arg))
-            user_in = super().get_input()
+            user_in = self.get_input()
             try:
                 user_in = int(user_in)
                 return user_in
@@ -237,7 +469,7 @@ class Interpreter(InterpreterBase):
                 arg = statement_node.dict['args'][0]
                 # THIS IS 3/3 OF ONLY REAL SELF.OUTPUT
                 self.output(self.evaluate_expression(arg))
-            user_in = super().get_input()
+            user_in = self.get_input()
             try:
                 user_in = int(user_in)
                 return user_in
@@ -245,45 +477,74 @@ class Interpreter(InterpreterBase):
                 return user_in
         else:
             ## USER-DEFINED FUNCTION ##
-            # Check if function is defined
-            if not self.check_valid_func(func_call):
-                super().error(ErrorType.NAME_ERROR,
-                                f"Function {func_call} was not found",
-                                )
-            func_def = self.get_func_def(func_call, len(statement_node.dict['args']))
+            # Each call site remembers what it resolved to (the function table can't change during a run)
+            func_def = getattr(statement_node, 'func_def', None)
+            if func_def is None:
+                # Check if function is defined
+                if not self.check_valid_func(func_call):
+                    super().error(ErrorType.NAME_ERROR,
+                                    f"Function {func_call} was not found",
+                                    )
+                func_def = self.get_func_def(func_call, len(statement_node.dict['args']))
+                statement_node.func_def = func_def
             ##### Start Function Call ######
 
             #### START FUNC SCOPE ####
-            # Assign parameters to the local variable dict
+            # Assign parameters straight into the callee's param scope (slot i = param i)
             args = statement_node.dict['args'] # passed in arguments
             params = func_def.dict['args'] # function parameters
-            processed_args = [{}]
-            # intialize params, and then assign to them each arg in order
+            checked_args = statement_node.dict['checked_args'] # args the type checker proved have the param's type
+            # (plus the hidden slots cse_v3.py and escape_v3.py gave the function, if any)
+            param_scope = [None] * (len(params) + func_def.dict.get('temps', 0))
             for i in range(0,len(params)):
                 # define params
+                arg_value = self.evaluate_expression(args[i])
+                if checked_args[i]:
+                    param_scope[i] = arg_value
+                    continue
                 var_name = params[i].dict['name']
                 var_type = params[i].dict['var_type']
-                arg_value = self.evaluate_expression(args[i])
                 #self.output(args[i])
                 arg_value = self.check_coercion(arg_value) if var_type == "bool" else arg_value
-                arg_type = arg_value._type if type(arg_value) is StructObject else type(arg_value) # only used for debugging really
+                arg_type = arg_value._type.name if type(arg_value) is StructObject else type(arg_value) # only used for debugging really
                 # Perform Type Checking..
                 if self.check_valid_type(arg_value, var_type):
-                    processed_args[-1][var_name] = {
-                        'value' : arg_value,
-                        'type' : var_type
-                    }
+                    param_scope[i] = arg_value
                 else:
                     super().error(ErrorType.TYPE_ERROR, f"Invalid arg type {arg_type} given to formal parameter {var_name} of type {var_type}",)
 
-            main_vars = self.variable_scope_stack.copy()
+            if statement_node.dict.get('tail_call'):
+                # run_func restarts this function with these args instead of calling it (tailcall_v3.py)
+                return Element("tailcall", args=param_scope)
 
-            # wipe all prev vars except arguments
-            self.variable_scope_stack = processed_args
+            inlined = statement_node.dict.get('inline')
+            if inlined is not None:
+                # small leaf function (inline_v3.py): its params go on top of the caller's scopes as frame -1
+                self.variable_scope_stack.append(param_scope)
+                return_value = self.run_inlined(func_def, inlined)
+                self.variable_scope_stack.pop()
+                return return_value
+
+            cache = None
+            if func_def.dict.get('memo'):
+                # pure function (memo_v3.py): same args, same result
+                cache = getattr(func_def, 'memo_cache', None)
+                if cache is None:
+                    cache = func_def.memo_cache = MemoCache(self.memo_size, self.memo_stats)
+                key = tuple(param_scope)
+                return_value = cache.get(key)
+                if return_value is not None:
+                    return return_value
+
+            # the callee only sees its own scopes, the caller's are parked on call_stack until it returns
+            self.call_stack.append(self.variable_scope_stack)
+            self.variable_scope_stack = [param_scope]
             return_value = self.run_func(func_def)
-            
+
             #### END FUNC SCOPE ####
-            self.variable_scope_stack = main_vars.copy()
+            self.variable_scope_stack = self.call_stack.pop()
+            if cache is not None:
+                cache.put(key, return_value)
             return return_value          
             ##### End Function Call ######
     
@@ -302,20 +563,28 @@ class Interpreter(InterpreterBase):
         # error if condition is non-boolean
         if type(condition) is not bool:
             super().error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+        if self.jit:
+            # traces follow the way each if went the last time it ran (see tracejit_v3.py)
+            statement_node.taken = condition
+        return self.run_if_branch(statement_node, condition)
+
+    # runs the branch `condition` picks (also how a trace runs the branch it didn't record)
+    def run_if_branch(self, statement_node, condition):
         statements = statement_node.dict['statements']
         else_statements = statement_node.dict['else_statements']
 
+        frame_size = statement_node.dict['frame_size' if condition else 'else_frame_size']
         ### BEGIN IF SCOPE ###
-        self.variable_scope_stack.append({})
+        self.push_scope(frame_size)
         if condition:
             for statement in statements:
                 return_value = self.run_statement(statement)     
                 if isinstance(return_value, Element) and return_value.elem_type == "return":
                     #end scope early and return
-                    self.variable_scope_stack.pop()
+                    self.pop_scope(frame_size)
                     return Element("return", value=return_value.get("value"))
                 elif return_value is not nil:
-                    self.variable_scope_stack.pop()
+                    self.pop_scope(frame_size)
                     return Element("return", value=return_value)
                     # if return needed, stop running statements, immediately return the value.
         else:
@@ -325,23 +594,41 @@ class Interpreter(InterpreterBase):
                     
                     if isinstance(return_value, Element) and return_value.elem_type == "return":
                         #end scope early and return
-                        self.variable_scope_stack.pop()
+                        self.pop_scope(frame_size)
                         return Element("return", value=return_value.get("value"))
                     elif return_value is not nil:
-                        self.variable_scope_stack.pop()
+                        self.pop_scope(frame_size)
                         return Element("return", value=return_value)
         ### END IF SCOPE ###
-        self.variable_scope_stack.pop()
+        self.pop_scope(frame_size)
         return nil
 
     def do_for_loop(self, statement_node):
+        invariants = statement_node.dict.get('invariants')
+        if invariants is None:
+            return self.run_for_loop(statement_node)
+        # every run of the loop evaluates its invariants (licm_v3.py) again. A call in the loop can run the same loop
+        # (recursion) while this run is using them, so whatever they held before is put back afterwards.
+        saved = [invariant.value for invariant in invariants]
+        for invariant in invariants:
+            invariant.value = None
+        try:
+            return self.run_for_loop(statement_node)
+        finally:
+            for invariant, value in zip(invariants, saved):
+                invariant.value = value
+
+    def run_for_loop(self, statement_node):
+        if statement_node.dict['counting']:
+            return self.do_counting_loop(statement_node)
         # Run initializer
         init_node = statement_node.dict['init']
         self.run_statement(init_node)
         update = statement_node.dict['update']
         condition = statement_node.dict['condition']
         statements = statement_node.dict['statements']
-        
+        frame_size = statement_node.dict['frame_size']
+
         # Run the loop again (exits on condition false)
         while self.evaluate_expression(condition):
             if type(self.check_coercion(self.evaluate_expression(condition))) is not bool:
@@ -349,7 +636,7 @@ class Interpreter(InterpreterBase):
                 super().error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
             
             ### BEGIN VAR SCOPE ###
-            self.variable_scope_stack.append({})
+            self.push_scope(frame_size)
 
             for statement in statements:
                 return_value = self.run_statement(statement)
@@ -357,17 +644,154 @@ class Interpreter(InterpreterBase):
                 if isinstance(return_value, Element) and return_value.elem_type == "return":
 
                     #end scope early and return
-                    self.variable_scope_stack.pop()
+                    self.pop_scope(frame_size)
                     return Element("return", value=return_value.get("value"))
                 elif return_value is not nil:
+                    self.pop_scope(frame_size)
                     return Element("return", value=return_value)
 
             ### END VAR SCOPE ###
-            self.variable_scope_stack.pop()
+            self.pop_scope(frame_size)
 
             self.run_statement(update)
+            if self.jit:
+                result = self.jit_loop_iteration(statement_node)
+                if result is not EXIT:
+                    return self.loop_result(result)
         return nil
-        
+
+    # for (i = a; i < b; i = i + c), marked by the resolver. The condition has no side effects so it's only
+    # evaluated once per iteration, and the body gets one scope for the whole loop instead of one per iteration
+    # (fine for the same reason reusing scopes is, see push_scope).
+    # Anything other than int on int goes through the normal expression/assignment code so the errors stay the same.
+    def do_counting_loop(self, statement_node):
+        self.run_statement(statement_node.dict['init'])
+        update = statement_node.dict['update']
+        condition = statement_node.dict['condition']
+        statements = statement_node.dict['statements']
+        bound = condition.dict['op2']
+        step = update.dict['expression']
+        compare = {"<": int.__lt__, "<=": int.__le__, ">": int.__gt__, ">=": int.__ge__, "!=": int.__ne__}[condition.elem_type]
+        # the loop variable's scope is below the loop, so it's the same list the whole time
+        loop_scope = self.variable_scope_stack[update.dict['frame']]
+        slot = update.dict['slot']
+        frame_size = statement_node.dict['frame_size']
+
+        ### BEGIN VAR SCOPE ###
+        self.push_scope(frame_size)
+        while True:
+            counter = loop_scope[slot]
+            limit = self.evaluate_expression(bound)
+            if type(counter) is int and type(limit) is int:
+                if not compare(counter, limit):
+                    break
+            else:
+                cond = self.evaluate_expression(condition)
+                if not cond:
+                    break
+                if type(self.check_coercion(cond)) is not bool:
+                    super().error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+
+            for statement in statements:
+                return_value = self.run_statement(statement)
+                # if return keyword
+                if isinstance(return_value, Element) and return_value.elem_type == "return":
+                    #end scope early and return
+                    self.pop_scope(frame_size)
+                    return Element("return", value=return_value.get("value"))
+                elif return_value is not nil:
+                    self.pop_scope(frame_size)
+                    return Element("return", value=return_value)
+
+            counter = loop_scope[slot]
+            amount = self.evaluate_expression(step.dict['op2'])
+            if type(counter) is int and type(amount) is int and update.dict['var_type'] == "int":
+                loop_scope[slot] = counter + amount if step.elem_type == "+" else counter - amount
+            else:
+                self.do_assignment(update)
+            if self.jit:
+                # the trace runs in the body scope pushed above
+                result = self.jit_loop_iteration(statement_node)
+                if result is not EXIT:
+                    self.pop_scope(frame_size)
+                    return self.loop_result(result)
+        ### END VAR SCOPE ###
+        self.pop_scope(frame_size)
+        return nil
+
+    # Tracing mode (jit=True), called by both for loop drivers after every iteration's update. Once a loop has done
+    # JIT_THRESHOLD iterations (over all the times it ran), the iteration that just finished is compiled into a trace
+    # (tracejit_v3.py) and the trace runs the rest of the loop, and the rest of every later run of it after the first
+    # iteration. Gives back what the loop body gave back, or EXIT if the interpreter should keep running the loop.
+    def jit_loop_iteration(self, statement_node):
+        trace = getattr(statement_node, 'trace', None)
+        if trace is not None:
+            return EXIT if trace is BLACKLISTED else trace()
+        iterations = getattr(statement_node, 'iterations', 0) + 1
+        statement_node.iterations = iterations
+        if iterations < JIT_THRESHOLD:
+            return EXIT
+        statement_node.trace = TraceCompiler(self).compile_loop(statement_node)
+        self.jit_stats["traces"] += 1
+        return statement_node.trace()
+
+    # a loop's result from what its body (or its trace) gave back, same as in do_for_loop
+    def loop_result(self, return_value):
+        if isinstance(return_value, Element) and return_value.elem_type == "return":
+            return Element("return", value=return_value.get("value"))
+        elif return_value is not nil:
+            return Element("return", value=return_value)
+        return nil
+
+    # what the tracing JIT did during the last run
+    def get_jit_stats(self):
+        return dict(self.jit_stats)
+
+    # how many functions were inlined and at how many call sites (None if nothing ran the inliner)
+    def get_inline_stats(self):
+        return None if self.inline_stats is None else dict(self.inline_stats)
+
+    # how many functions had self calls in tail position and how many of those calls (None if nothing marked them)
+    def get_tail_call_stats(self):
+        return None if self.tail_call_stats is None else dict(self.tail_call_stats)
+
+    # how many functions were memoized and how their caches did (None if nothing ran the purity analysis)
+    def get_memo_stats(self):
+        return None if self.memo_stats is None else dict(self.memo_stats)
+
+    # how many expression evaluations common subexpression elimination removed, in total and by function name
+    # (None if nothing ran the pass)
+    def get_cse_stats(self):
+        if self.cse_stats is None:
+            return None
+        return {"eliminated": self.cse_stats["eliminated"], "functions": dict(self.cse_stats["functions"])}
+
+    # how many struct variables scalar replacement kept in local slots, their field count, and the variables by
+    # function name (None if nothing ran the pass)
+    def get_escape_stats(self):
+        if self.escape_stats is None:
+            return None
+        return {"replaced": self.escape_stats["replaced"], "fields": self.escape_stats["fields"],
+                "functions": dict(self.escape_stats["functions"])}
+
+    # how many loops had invariant expressions and how many there were (None if nothing ran the pass)
+    def get_licm_stats(self):
+        return None if self.licm_stats is None else dict(self.licm_stats)
+
+    # the functions (as name/arg count) and structs strip dropped (None if strip=False)
+    def get_strip_stats(self):
+        if self.strip_stats is None:
+            return None
+        return {"functions": list(self.strip_stats["functions"]), "structs": list(self.strip_stats["structs"])}
+
+    # how many constant expressions were folded and dead if branches dropped (None if fold=False)
+    def get_fold_stats(self):
+        return None if self.fold_stats is None else dict(self.fold_stats)
+
+    # how many assignment/argument/return checks the type checker saw, proved unnecessary, and found will fail
+    def get_typecheck_stats(self):
+        return dict(self.typecheck_stats)
+
     # helper functions
     def get_target_variable_name(self, statement_node):
         return statement_node.dict['name']
@@ -395,12 +819,27 @@ class Interpreter(InterpreterBase):
 
     # basically pseudcode, self-explanatory
     def evaluate_expression(self, expression_node):
-        
         if self.is_value_node(expression_node):
             return self.get_value(expression_node)
         elif self.is_variable_node(expression_node):
             return self.get_value_of_variable(expression_node)
-        elif self.is_binary_operator(expression_node):
+        elif expression_node.elem_type == "cse_def":
+            # first evaluation of a repeated expression (cse_v3.py), the later ones read the hidden slot as a variable
+            value = self.evaluate_expression(expression_node.dict['expression'])
+            self.variable_scope_stack[0][expression_node.dict['slot']] = value
+            return value
+        spec = getattr(expression_node, 'spec', None)
+        if spec is not None and spec is not GENERIC:
+            # specialized operator node: one type check and the operator
+            eval1 = self.evaluate_expression(expression_node.dict['op1'])
+            eval2 = self.evaluate_expression(expression_node.dict['op2'])
+            if type(eval1) is spec[0] and type(eval2) is spec[1]:
+                return spec[2](eval1, eval2)
+            self.deoptimize_operator(expression_node)
+            if self.is_binary_operator(expression_node):
+                return self.apply_binary_operator(expression_node, eval1, eval2)
+            return self.apply_comparison_operator(expression_node, eval1, eval2)
+        if self.is_binary_operator(expression_node):
             return self.evaluate_binary_operator(expression_node)
         elif self.is_unary_operator(expression_node):
             return self.evaluate_unary_operator(expression_node)
@@ -413,6 +852,12 @@ class Interpreter(InterpreterBase):
             return self.do_func_call(expression_node)
         elif self.is_struct_def(expression_node):
             return self.do_struct_def(expression_node)
+        elif expression_node.elem_type == "invariant":
+            # loop invariant (licm_v3.py): evaluated the first time a run of its loop gets here, then reused
+            value = expression_node.value
+            if value is None:
+                value = expression_node.value = self.evaluate_expression(expression_node.dict['expression'])
+            return value
 
     # Check if void return turn type, but called as expression node (must be done here since do_func_call can also be called as w/ statement_node)
     def check_void_in_expression(self, expression_node):
@@ -421,7 +866,10 @@ class Interpreter(InterpreterBase):
         # need to exclude builtin funcs (input and print)
         if func_call in self.builtin_funcs:
             return
-        func_def = self.get_func_def(func_call, len(expression_node.dict['args']))
+        func_def = getattr(expression_node, 'func_def', None)
+        if func_def is None:
+            func_def = self.get_func_def(func_call, len(expression_node.dict['args']))
+            expression_node.func_def = func_def
         func_ret_type = func_def.dict['return_type']
         if func_ret_type == "void":
             #self.output("Void in return type, error")
@@ -439,35 +887,63 @@ class Interpreter(InterpreterBase):
     def get_value_of_variable(self, expression_node): 
         if expression_node == 'nil':
             return nil
-        var_name = expression_node.dict['name']
-        fields = var_name.split('.')
-        var_name = fields[0]
-        fields = fields[1:]
-            
-        for scope in reversed(self.variable_scope_stack): 
-            if var_name in scope: 
-                val = scope[var_name]['value']
-                # If fields (a.next or a.next.next, etc.) walk the tree of vars in scope
-                for field in fields:
-                    if (val is nil):
-                        super().error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
-                    if (type(val) != StructObject):
-                        super().error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
-                    # previous field is struct object is implicit now
-                    if (field not in val._fields):
-                        super().error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
-                    # Everything must be valid!
-                    val = val._fields[field]['value']
-                return val
+        var_name = expression_node.dict['var_name']
+        fields = expression_node.dict['fields']
+
+        frame = expression_node.dict['frame']
+        val = None if frame is None else self.variable_scope_stack[frame][expression_node.dict['slot']]
         # if varname not found
-        super().error(ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared",)
+        if val is None:
+            if 'scalar_field' in expression_node.dict:
+                # a field of a struct escape_v3.py replaced, and the struct is nil
+                super().error(ErrorType.FAULT_ERROR, f"Cannot apply field {expression_node.dict['scalar_field']} to nil-value variable",)
+            super().error(ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared",)
+        # If fields (a.next or a.next.next, etc.) walk the tree of vars in scope
+        for field in fields:
+            if (val is nil):
+                super().error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+            if (type(val) != StructObject):
+                super().error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+            # previous field is struct object is implicit now
+            field_info = val._type.fields.get(field)
+            if (field_info is None):
+                super().error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+            # Everything must be valid!
+            val = val._values[field_info[0]]
+        return val
+
+
+    # Picks the node's specialization from the operand types of its first run, after that evaluate_expression
+    # runs the specialized code itself (or the generic code, for GENERIC nodes)
+    def specialize_operator(self, expression_node, eval1, eval2):
+        if getattr(expression_node, 'spec', None) is not None:
+            return
+        op = SPECIALIZATIONS.get((expression_node.elem_type, type(eval1), type(eval2)))
+        if op is None:
+            expression_node.spec = GENERIC
+        else:
+            expression_node.spec = (type(eval1), type(eval2), op)
+            self.specialized_nodes += 1
+
+    # guard failed: the node stays on the generic path from now on
+    def deoptimize_operator(self, expression_node):
+        expression_node.spec = GENERIC
+        self.deoptimized_nodes += 1
 
+    # how many operator nodes specialized and deoptimized during the last run (tree walker only)
+    def get_specialization_stats(self):
+        return {"specialized": self.specialized_nodes, "deoptimized": self.deoptimized_nodes}
 
     # + or -
     def evaluate_binary_operator(self, expression_node):
         # can *only* be +, -, *, / for now.
         eval1 = self.evaluate_expression(expression_node.dict['op1'])
         eval2 = self.evaluate_expression(expression_node.dict['op2'])
+        self.specialize_operator(expression_node, eval1, eval2)
+        return self.apply_binary_operator(expression_node, eval1, eval2)
+
+    # the generic code, with the operands already evaluated (a node that fails its guard ends up here too)
+    def apply_binary_operator(self, expression_node, eval1, eval2):
         # for all operators other than + (for concat), both must be of type 'int'
         if (expression_node.elem_type != "+") and not (type(eval1) == int and type(eval2) == int):
             super().error(ErrorType.TYPE_ERROR, "Arguments must be of type 'int'.",)
@@ -488,6 +964,10 @@ class Interpreter(InterpreterBase):
     def evaluate_unary_operator(self, expression_node):
         # can be 'neg' (-b) or  '!' for boolean
         eval = self.evaluate_expression(expression_node.dict['op1'])
+        return self.apply_unary_operator(expression_node, eval)
+
+    # same as apply_binary_operator
+    def apply_unary_operator(self, expression_node, eval):
         if expression_node.elem_type == "neg":
             if not (type(eval) == int):
                 super().error(ErrorType.TYPE_ERROR, "'negation' can only be used on integer values.",)
@@ -502,6 +982,11 @@ class Interpreter(InterpreterBase):
     def evaluate_comparison_operator(self, expression_node):
         eval1 = self.evaluate_expression(expression_node.dict['op1'])
         eval2 = self.evaluate_expression(expression_node.dict['op2'])
+        self.specialize_operator(expression_node, eval1, eval2)
+        return self.apply_comparison_operator(expression_node, eval1, eval2)
+
+    # same as apply_binary_operator
+    def apply_comparison_operator(self, expression_node, eval1, eval2):
         eval1 = self.check_coercion(eval1) if type(eval2) is bool else eval1
         eval2 = self.check_coercion(eval2) if type(eval1) is bool else eval2
 
@@ -540,8 +1025,18 @@ class Interpreter(InterpreterBase):
                     return (eval1 != eval2)
     
     def evaluate_binary_boolean_operator(self, expression_node):
+        if self.short_circuit:
+            eval1 = self.check_boolean_operand(expression_node, self.evaluate_expression(expression_node.dict['op1']))
+            # false && ..., true || ...
+            if eval1 is (expression_node.elem_type == "||"):
+                return eval1
+            return self.check_boolean_operand(expression_node, self.evaluate_expression(expression_node.dict['op2']))
         eval1 = self.evaluate_expression(expression_node.dict['op1'])
         eval2 = self.evaluate_expression(expression_node.dict['op2'])
+        return self.apply_binary_boolean_operator(expression_node, eval1, eval2)
+
+    # same as apply_binary_operator
+    def apply_binary_boolean_operator(self, expression_node, eval1, eval2):
         eval1 = self.check_coercion(eval1)
         eval2 = self.check_coercion(eval2)
         
@@ -555,35 +1050,31 @@ class Interpreter(InterpreterBase):
                 return (eval1 and eval2)
             case '||':
                 return (eval1 or eval2)
+
+    # short_circuit: one operand of && / ||, coerced and checked the same way apply_binary_boolean_operator does both
+    def check_boolean_operand(self, expression_node, value):
+        value = self.check_coercion(value)
+        if type(value) is not bool:
+            super().error(ErrorType.TYPE_ERROR, f"Comparison args for {expression_node.elem_type} must be of same type bool.",)
+        return value
             
     def do_struct_def(self, expression_node):
-        struct_name = expression_node.dict['var_type']
-        struct_def = nil
-        for _def in self.struct_defs:
-            struct_def = _def if (_def.dict['name'] == struct_name) else nil
-            if (struct_def is not nil):
-                break
+        return self.new_struct_object(expression_node.dict['var_type'])
+
+    # split out of do_struct_def so the other engines can allocate by name
+    def new_struct_object(self, struct_name):
+        struct_type = self.struct_registry.get(struct_name)
         # Check if struct even exists first
-        if struct_def is nil:
+        if struct_type is None:
             super().error(ErrorType.TYPE_ERROR, f"struct '{struct_name}' used but not defined",)
-
-        struct_fields = {}
-        for fielddef in struct_def.dict['fields']:
-            field_name = fielddef.dict['name']
-            field_type = fielddef.dict['var_type']
-            struct_fields[field_name] = {
-                'value' : self.get_default_value(field_type),
-                'type' : field_type                
-            }
-        # Defines the struct as a StructObject
-        return StructObject(struct_fields, struct_name)
+        if struct_type.template is None:
+            self.get_default_value(struct_type.bad_field_type) # errors with the unknown type
+        # Defines the struct as a StructObject, all default values are immutable so a shallow copy is enough
+        return StructObject(struct_type.template.copy(), struct_type)
 
     ## Type Checking Functions ##
     # Check if a value holds the correct type for what's needed
     def check_valid_type(self, val, needs_type):
-        struct_def_names = []
-        for _def in self.struct_defs:
-            struct_def_names.append(_def.dict['name'])
         if needs_type == "int":
             return type(val).__name__ == "int"
         elif needs_type == "bool":
@@ -593,10 +1084,10 @@ class Interpreter(InterpreterBase):
             return type(val).__name__ == "str"
         elif needs_type == "void":
             return val == nil
-        elif needs_type in struct_def_names:
+        elif needs_type in self.struct_registry:
             # Either the val is nil, or it's an assigned struct obj with fields & type
             # This prevents Duck Typing (need to strictly type against structs like C)
-            return (val is nil) or ((type(val) is StructObject) and (val._type == needs_type))
+            return (val is nil) or ((type(val) is StructObject) and (val._type.name == needs_type))
         return False
     
     def check_coercion(self, val):
@@ -618,7 +1109,8 @@ class Interpreter(InterpreterBase):
     # No more functions remain... for now... :)
 
 #DEBUGGING
-program = """
+if __name__ == "__main__":
+    program = """
 func main(): void {
  foo(5+3);
 }
@@ -628,5 +1120,5 @@ func foo(xx: int): int {
 }
 
 """
-interpreter = Interpreter()
-interpreter.run(program)
\ No newline at end of file
+    interpreter = Interpreter()
+    interpreter.run(program)
@@ -0,0 +1,142 @@
+# Loop invariant code motion for the tree walker.
+# Runs once at load time, after the other passes but cse_v3.py (escape_v3.py, this and cse add nodes). Inside a for loop, an expression
+# is invariant if every variable it reads is one the loop never assigns or declares, and it can't do anything but
+# give back a value (or error): operators, literals, plain variables (no struct fields, another part of the program
+# can change those) and calls to pure functions (memo_v3.py's PurityAnalyzer, so never print/inputi/inputs).
+#
+# Each maximal invariant operator or call is wrapped in an Element("invariant") node that belongs to the outermost
+# loop it's invariant in (listed in that loop's 'invariants'). The wrapper is still evaluated where the expression
+# was, so the first evaluation in a run of the loop happens at the same point as before and any error along with it.
+# After that the wrapper gives back the same value until the loop ends (Interpreter.do_for_loop resets it), which is
+# what evaluating it again would have given. So the generic for loop's condition (evaluated twice per iteration) and
+# helper calls/arithmetic in the body run once per loop instead of once per iteration.
+# Return statements are left alone, they end the loop anyway.
+#
+# Only engine="tree" uses this: the other engines compile the AST themselves and don't know "invariant" nodes.
+#
+# Annotations (stored in node.dict):
+#   for -> 'invariants' (the wrappers it resets) on loops that have any
+# and the wrapped expressions are replaced with invariant -> 'expression' nodes, whose value (None until evaluated)
+# is kept in the node's value attribute.
+
+from element import Element
+from memo_v3 import PurityAnalyzer
+
+OPERATORS = ["+", "-", "*", "/", "==", "<", "<=", ">", ">=", "!=", "&&", "||", "neg", "!"]
+
+class LoopInvariantHoister():
+    def __init__(self, func_table):
+        self.func_table = func_table
+        self.pure = {}
+        self.stats = {"loops": 0, "hoisted": 0}
+
+    def hoist_program(self, func_defs):
+        self.pure = PurityAnalyzer(self.func_table).find_pure(func_defs)
+        for func_node in func_defs:
+            self.find_loops(func_node.dict['statements'] or [])
+        return self.stats
+
+    def find_loops(self, statements):
+        for statement in statements:
+            if statement.elem_type == "if":
+                self.find_loops(statement.dict['statements'] or [])
+                self.find_loops(statement.dict['else_statements'] or [])
+            elif statement.elem_type == "for":
+                self.hoist_loop(statement)
+
+    def hoist_loop(self, loop_node):
+        written = set()
+        self.collect_writes(loop_node.dict['statements'] or [], written)
+        self.collect_writes([loop_node.dict['update']], written)
+        invariants = []
+        loop_node.dict['condition'] = self.hoist(loop_node.dict['condition'], written, invariants)
+        self.hoist_block(loop_node.dict['statements'] or [], written, invariants)
+        self.hoist_statement(loop_node.dict['update'], written, invariants)
+        if invariants:
+            loop_node.dict['invariants'] = invariants
+            self.stats["loops"] += 1
+            self.stats["hoisted"] += len(invariants)
+        # loops inside this one, for what's invariant in them but not in this one
+        self.find_loops(loop_node.dict['statements'] or [])
+
+    # the (frame, slot)s assigned or declared anywhere in the statements. Two variables in different blocks can have
+    # the same (frame, slot), which only makes this more careful.
+    def collect_writes(self, statements, written):
+        for statement in statements:
+            match statement.elem_type:
+                case "=" | "vardef":
+                    # (a redefinition has no frame, it's an error when it runs)
+                    written.add((statement.dict.get('frame'), statement.dict.get('slot')))
+                case "scalar_init":
+                    # escape_v3.py's field slots
+                    base = statement.dict['base']
+                    written.update((0, slot) for slot in range(base, base + len(statement.dict['values'])))
+                case "if":
+                    self.collect_writes(statement.dict['statements'] or [], written)
+                    self.collect_writes(statement.dict['else_statements'] or [], written)
+                case "for":
+                    self.collect_writes([statement.dict['init'], statement.dict['update']], written)
+                    self.collect_writes(statement.dict['statements'] or [], written)
+
+    def hoist_block(self, statements, written, invariants):
+        for statement in statements:
+            self.hoist_statement(statement, written, invariants)
+
+    def hoist_statement(self, statement_node, written, invariants):
+        match statement_node.elem_type:
+            case "=":
+                statement_node.dict['expression'] = self.hoist(statement_node.dict['expression'], written, invariants)
+            case "fcall":
+                self.hoist_args(statement_node, written, invariants)
+            case "if":
+                statement_node.dict['condition'] = self.hoist(statement_node.dict['condition'], written, invariants)
+                self.hoist_block(statement_node.dict['statements'] or [], written, invariants)
+                self.hoist_block(statement_node.dict['else_statements'] or [], written, invariants)
+            case "for":
+                self.hoist_statement(statement_node.dict['init'], written, invariants)
+                statement_node.dict['condition'] = self.hoist(statement_node.dict['condition'], written, invariants)
+                self.hoist_block(statement_node.dict['statements'] or [], written, invariants)
+                self.hoist_statement(statement_node.dict['update'], written, invariants)
+
+    def hoist_args(self, fcall_node, written, invariants):
+        fcall_node.dict['args'] = [self.hoist(arg, written, invariants) for arg in fcall_node.dict['args']]
+
+    # gives back the node that replaces expression_node
+    def hoist(self, expression_node, written, invariants):
+        op = expression_node.elem_type
+        if self.is_invariant(expression_node, written):
+            if op not in OPERATORS and op != "fcall":
+                # literals and variables are as cheap as the wrapper
+                return expression_node
+            wrapper = Element("invariant", expression=expression_node)
+            wrapper.value = None
+            invariants.append(wrapper)
+            return wrapper
+        if op in ["neg", "!"]:
+            expression_node.dict['op1'] = self.hoist(expression_node.dict['op1'], written, invariants)
+        elif op in OPERATORS:
+            expression_node.dict['op1'] = self.hoist(expression_node.dict['op1'], written, invariants)
+            expression_node.dict['op2'] = self.hoist(expression_node.dict['op2'], written, invariants)
+        elif op == "fcall":
+            self.hoist_args(expression_node, written, invariants)
+        return expression_node
+
+    def is_invariant(self, expression_node, written):
+        match expression_node.elem_type:
+            case "int" | "string" | "bool" | "nil" | "invariant":
+                return True
+            case "var":
+                frame = expression_node.dict['frame']
+                return (frame is not None and not expression_node.dict['fields']
+                        and (frame, expression_node.dict['slot']) not in written)
+            case "neg" | "!":
+                return self.is_invariant(expression_node.dict['op1'], written)
+            case "fcall":
+                callee = self.func_table.get((expression_node.dict['name'], len(expression_node.dict['args'])))
+                if callee is None or id(callee) not in self.pure or expression_node.dict['name'] in ["print", "inputi", "inputs"]:
+                    return False
+                return all(self.is_invariant(arg, written) for arg in expression_node.dict['args'])
+        if expression_node.elem_type in OPERATORS:
+            return self.is_invariant(expression_node.dict['op1'], written) and self.is_invariant(expression_node.dict['op2'], written)
+        # new
+        return False
@@ -0,0 +1,134 @@
+# Automatic memoization of pure functions for the tree walker.
+# Runs once at load time, after ScopeResolver and TypeChecker. A function is pure if a call to it can't do anything
+# but give back a value (or error) that depends only on its args:
+#   - its params are all int/bool/string and it returns an int, bool or string
+#   - it never calls print/inputi/inputs, never uses new or a struct field, and only calls pure functions
+#     (recursion is fine, purity is worked out as a fixpoint over the call graph)
+# Pure functions get 'memo' = True. do_func_call binds and checks the args like any call, then looks the arg tuple
+# up in the function's MemoCache (a bounded LRU) and only runs the function on a miss, so the result that gets cached
+# has been through the return type check. Functions named in Interpreter(memo_exclude=...) and main are never
+# memoized. Calls that get inlined (inline_v3.py) or are tail calls (tailcall_v3.py) don't go through the cache.
+#
+# Annotations (stored in node.dict):
+#   func -> 'memo' = True on memoized functions
+
+from collections import OrderedDict
+
+# default number of cached results per function
+MEMO_SIZE = 4096
+
+# param/return types a memoized function may have (anything with a struct in it could change between calls)
+VALUE_TYPES = ["int", "bool", "string"]
+
+BUILTINS = ["print", "inputi", "inputs"]
+
+class PurityAnalyzer():
+    def __init__(self, func_table, exclude=()):
+        self.func_table = func_table
+        self.exclude = set(exclude)
+
+    # marks the pure functions, gives back how many there are
+    def analyze_program(self, func_defs):
+        pure = self.find_pure(func_defs)
+        for func_node in pure.values():
+            func_node.dict['memo'] = True
+        return len(pure)
+
+    # the pure functions by id(), without marking them (loop invariant code motion uses this too)
+    def find_pure(self, func_defs):
+        pure = {}
+        callees = {}
+        for func_node in func_defs:
+            calls = set()
+            if self.is_candidate(func_node) and self.is_pure_block(func_node.dict['statements'] or [], calls):
+                pure[id(func_node)] = func_node
+                callees[id(func_node)] = calls
+        # drop functions that call something impure until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            for key in list(pure):
+                if not callees[key] <= pure.keys():
+                    del pure[key]
+                    changed = True
+        return pure
+
+    def is_candidate(self, func_node):
+        if func_node.dict['name'] == "main" or func_node.dict['name'] in self.exclude:
+            return False
+        if func_node.dict['return_type'] not in VALUE_TYPES:
+            return False
+        return all(param.dict['var_type'] in VALUE_TYPES for param in func_node.dict['args'])
+
+    # calls: collects id()s of the user functions called
+    def is_pure_block(self, statements, calls):
+        return all(self.is_pure_statement(statement, calls) for statement in statements)
+
+    def is_pure_statement(self, statement_node, calls):
+        match statement_node.elem_type:
+            case "vardef":
+                return True
+            case "=":
+                return not statement_node.dict['fields'] and self.is_pure_expression(statement_node.dict['expression'], calls)
+            case "fcall":
+                return self.is_pure_expression(statement_node, calls)
+            case "return":
+                return not statement_node.dict['expression'] or self.is_pure_expression(statement_node.dict['expression'], calls)
+            case "if":
+                return (self.is_pure_expression(statement_node.dict['condition'], calls)
+                        and self.is_pure_block(statement_node.dict['statements'] or [], calls)
+                        and self.is_pure_block(statement_node.dict['else_statements'] or [], calls))
+            case "for":
+                return (self.is_pure_statement(statement_node.dict['init'], calls)
+                        and self.is_pure_expression(statement_node.dict['condition'], calls)
+                        and self.is_pure_block(statement_node.dict['statements'] or [], calls)
+                        and self.is_pure_statement(statement_node.dict['update'], calls))
+        return False
+
+    def is_pure_expression(self, expression_node, calls):
+        match expression_node.elem_type:
+            case "int" | "string" | "bool" | "nil":
+                return True
+            case "var":
+                return not expression_node.dict['fields']
+            case "neg" | "!":
+                return self.is_pure_expression(expression_node.dict['op1'], calls)
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                return (self.is_pure_expression(expression_node.dict['op1'], calls)
+                        and self.is_pure_expression(expression_node.dict['op2'], calls))
+            case "fcall":
+                if expression_node.dict['name'] in BUILTINS:
+                    return False
+                callee = self.func_table.get((expression_node.dict['name'], len(expression_node.dict['args'])))
+                if callee is None:
+                    return False
+                calls.add(id(callee))
+                return all(self.is_pure_expression(arg, calls) for arg in expression_node.dict['args'])
+        # new
+        return False
+
+# Results of one function by arg tuple, least recently used goes first. stats is shared by all the caches of a run.
+class MemoCache():
+    def __init__(self, size, stats):
+        self.size = size
+        self.stats = stats
+        self.results = OrderedDict()
+
+    # the cached result, or None on a miss (results are never None, nil is a value of its own)
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+            self.stats["evictions"] += 1
+
+def new_memo_stats():
+    return {"pure_functions": 0, "hits": 0, "misses": 0, "evictions": 0}
@@ -0,0 +1,85 @@
+# Whole program reachability from main.
+# Runs once at load time, right after constant folding (so calls in if branches fold_v3.py dropped don't count).
+# A function is reachable if main calls it, or a reachable function does, with that many args; a struct is reachable
+# if a reachable function names it (param/return/vardef types, `new`) or a reachable struct has a field of its type.
+# Interpreter.strip_unreachable drops everything else from func_defs/func_table and struct_defs/struct_registry, so
+# the later passes and every engine only see what can run. Nothing that can't be reached can be looked up either, and
+# a call that doesn't match any function still doesn't after stripping (the interpreter keeps every function name for
+# its "wrong number of args" check).
+
+OPERATORS = ["+", "-", "*", "/", "==", "<", "<=", ">", ">=", "!=", "&&", "||", "neg", "!"]
+
+class ReachabilityAnalyzer():
+    def __init__(self, func_table, struct_registry):
+        self.func_table = func_table
+        self.struct_registry = struct_registry
+
+    # gives back (id(func node) -> func node, struct names) for everything main can reach
+    def find_reachable(self, main_func_node):
+        self.funcs = {}
+        self.structs = set()
+        pending = [main_func_node]
+        while pending:
+            func_node = pending.pop()
+            if id(func_node) in self.funcs:
+                continue
+            self.funcs[id(func_node)] = func_node
+            self.calls = []
+            self.named(func_node.dict['return_type'])
+            for arg in func_node.dict['args']:
+                self.named(arg.dict['var_type'])
+            self.visit_block(func_node.dict['statements'] or [])
+            pending += self.calls
+        # fields can name more structs
+        pending = list(self.structs)
+        while pending:
+            for _, field_type in self.struct_registry[pending.pop()].fields.values():
+                if field_type in self.struct_registry and field_type not in self.structs:
+                    self.structs.add(field_type)
+                    pending.append(field_type)
+        return self.funcs, self.structs
+
+    def named(self, type_name):
+        if type_name in self.struct_registry:
+            self.structs.add(type_name)
+
+    def visit_block(self, statements):
+        for statement in statements:
+            self.visit_statement(statement)
+
+    def visit_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "vardef":
+                self.named(statement_node.dict['var_type'])
+            case "=":
+                self.visit_expression(statement_node.dict['expression'])
+            case "fcall":
+                self.visit_expression(statement_node)
+            case "return":
+                if statement_node.dict['expression']:
+                    self.visit_expression(statement_node.dict['expression'])
+            case "if":
+                self.visit_expression(statement_node.dict['condition'])
+                self.visit_block(statement_node.dict['statements'] or [])
+                self.visit_block(statement_node.dict['else_statements'] or [])
+            case "for":
+                self.visit_statement(statement_node.dict['init'])
+                self.visit_expression(statement_node.dict['condition'])
+                self.visit_block(statement_node.dict['statements'] or [])
+                self.visit_statement(statement_node.dict['update'])
+
+    def visit_expression(self, expression_node):
+        op = expression_node.elem_type
+        if op == "fcall":
+            callee = self.func_table.get((expression_node.dict['name'], len(expression_node.dict['args'])))
+            if callee is not None:
+                self.calls.append(callee)
+            for arg in expression_node.dict['args']:
+                self.visit_expression(arg)
+        elif op == "new":
+            self.named(expression_node.dict['var_type'])
+        elif op in ["neg", "!"]:
+            self.visit_expression(expression_node.dict['op1'])
+        elif op in OPERATORS:
+            self.visit_expression(expression_node.dict['op1'])
+            self.visit_expression(expression_node.dict['op2'])
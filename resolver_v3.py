@@ -0,0 +1,130 @@
+# Static scope resolution for the v3 interpreter.
+# Runs once at load time and works out, for every variable use, which scope it lives in and where in that scope.
+# At runtime each scope on variable_scope_stack is then just a list, and a lookup is variable_scope_stack[frame][slot].
+#
+# Frames line up with what the tree walker pushes for a call: frame 0 holds the params, then the function body and
+# every nested if/else/for body that declares at least one variable gets the next frame. Blocks that declare nothing
+# get a frame_size of 0 and no frame, the engines don't push a scope for them. Nothing here raises, undeclared variables
+# and redefinitions are only marked on the node so the interpreter can report them when (and if) that statement runs.
+#
+# It also splits dotted names once, so "a.b.c" never has to be split at runtime.
+#
+# Annotations (all stored in node.dict):
+#   func   -> 'frame_size'
+#   if     -> 'frame_size', 'else_frame_size'
+#   for    -> 'frame_size', 'counting' (True for the `for (i = a; i < b; i = i + c)` shape, see is_counting_loop)
+#   vardef -> 'frame', 'slot', 'redefined'
+#   var    -> 'var_name', 'fields', 'frame', 'slot' (frame is None if the variable isn't declared anywhere visible), 'var_type'
+#   =      -> 'var_name', 'fields', 'frame', 'slot', 'var_type' (of the variable before any dots)
+# where for "a.b.c", 'var_name' is "a" and 'fields' is ("b", "c").
+
+class ScopeResolver():
+    def resolve_program(self, func_defs):
+        for func_node in func_defs:
+            self.resolve_func(func_node)
+
+    def resolve_func(self, func_node):
+        # scopes are name -> (slot, type)
+        self.scopes = [{}]
+        for i, arg in enumerate(func_node.dict['args']):
+            # if a name is used twice, the last param wins (same as the dict the tree walker used to build)
+            self.scopes[0][arg.dict['name']] = (i, arg.dict['var_type'])
+        func_node.dict['frame_size'] = self.resolve_block(func_node.dict['statements'])
+
+    # returns how many slots the block's frame needs (0 = no frame)
+    def resolve_block(self, statements):
+        statements = statements or []
+        # vardefs can only be direct children of a block
+        if not any(statement.elem_type == "vardef" for statement in statements):
+            for statement in statements:
+                self.resolve_statement(statement)
+            return 0
+        self.scopes.append({})
+        for statement in statements:
+            self.resolve_statement(statement)
+        return len(self.scopes.pop())
+
+    # splits node.dict['name'] into 'var_name' and a tuple of 'fields'
+    def split_path(self, node):
+        var_name, *fields = node.dict['name'].split('.')
+        node.dict['var_name'] = var_name
+        node.dict['fields'] = tuple(fields)
+        return var_name
+
+    def lookup(self, var_name):
+        for frame in range(len(self.scopes) - 1, -1, -1):
+            if var_name in self.scopes[frame]:
+                slot, var_type = self.scopes[frame][var_name]
+                return frame, slot, var_type
+        return None, None, None
+
+    def resolve_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "vardef":
+                var_name = statement_node.dict['name']
+                scope = self.scopes[-1]
+                statement_node.dict['redefined'] = var_name in scope
+                if var_name not in scope:
+                    statement_node.dict['frame'] = len(self.scopes) - 1
+                    statement_node.dict['slot'] = len(scope)
+                    scope[var_name] = (len(scope), statement_node.dict['var_type'])
+            case "=":
+                self.resolve_expression(statement_node.dict['expression'])
+                frame, slot, var_type = self.lookup(self.split_path(statement_node))
+                statement_node.dict['frame'] = frame
+                statement_node.dict['slot'] = slot
+                statement_node.dict['var_type'] = var_type
+            case "fcall":
+                self.resolve_expression(statement_node)
+            case "return":
+                if statement_node.dict['expression']:
+                    self.resolve_expression(statement_node.dict['expression'])
+            case "if":
+                self.resolve_expression(statement_node.dict['condition'])
+                statement_node.dict['frame_size'] = self.resolve_block(statement_node.dict['statements'])
+                statement_node.dict['else_frame_size'] = self.resolve_block(statement_node.dict['else_statements'])
+            case "for":
+                self.resolve_statement(statement_node.dict['init'])
+                self.resolve_expression(statement_node.dict['condition'])
+                statement_node.dict['frame_size'] = self.resolve_block(statement_node.dict['statements'])
+                self.resolve_statement(statement_node.dict['update'])
+                statement_node.dict['counting'] = self.is_counting_loop(statement_node)
+
+    # for (i = a; i < b; i = i + c): any comparison of a plain declared variable against an int constant or
+    # a variable, and an update that adds/subtracts an int constant or a variable to that same variable.
+    # Nothing in the condition can have side effects, so the engines only need to evaluate it once per iteration.
+    def is_counting_loop(self, for_node):
+        init = for_node.dict['init']
+        condition = for_node.dict['condition']
+        update = for_node.dict['update']
+        if init.elem_type != "=" or init.dict['fields'] or init.dict['frame'] is None:
+            return False
+        loop_var = init.dict['var_name']
+        if condition.elem_type not in ["<", "<=", ">", ">=", "!="]:
+            return False
+        if not self.is_plain_var(condition.dict['op1'], loop_var) or condition.dict['op2'].elem_type not in ["int", "var"]:
+            return False
+        if update.elem_type != "=" or update.dict['fields'] or update.dict['var_name'] != loop_var:
+            return False
+        step = update.dict['expression']
+        return (step.elem_type in ["+", "-"] and self.is_plain_var(step.dict['op1'], loop_var)
+                and step.dict['op2'].elem_type in ["int", "var"])
+
+    def is_plain_var(self, expression_node, var_name):
+        return expression_node.elem_type == "var" and expression_node.dict['name'] == var_name
+
+    def resolve_expression(self, expression_node):
+        match expression_node.elem_type:
+            case "var":
+                frame, slot, var_type = self.lookup(self.split_path(expression_node))
+                expression_node.dict['frame'] = frame
+                expression_node.dict['slot'] = slot
+                expression_node.dict['var_type'] = var_type
+            case "fcall":
+                for arg in expression_node.dict['args']:
+                    self.resolve_expression(arg)
+            case "neg" | "!":
+                self.resolve_expression(expression_node.dict['op1'])
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                self.resolve_expression(expression_node.dict['op1'])
+                self.resolve_expression(expression_node.dict['op2'])
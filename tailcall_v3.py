@@ -0,0 +1,60 @@
+# Tail call elimination for self-recursive functions in the tree walker.
+# Runs once at load time, after ScopeResolver and TypeChecker, and marks the calls a function makes to itself whose
+# value is what the function gives back anyway. do_func_call binds and checks the args of a marked call like any
+# call, then hands them back as Element("tailcall") instead of running the function. That goes up through the
+# ifs/loops like any other value that ends a function (their scopes get popped on the way), and run_func restarts
+# the function with the args as its new param scope. So `return count(n - 1);` runs as a loop: no python recursion,
+# no new scope stack, no call_stack entry.
+#
+# A call is in tail position (see run_func/run_if_branch for why):
+#   - it's the function's last statement, as `f(...);` or `return f(...);`, or the last statement of an if branch
+#     that is itself in tail position (not through loops, they'd run again)
+#   - it's anywhere inside an if or for body and the function returns an int, bool or string: that call's value is
+#     never nil, so the function returns it right away. (A top level `return f(...);` that isn't last doesn't end
+#     the function, so it's never a tail call.)
+# Only calls that resolve to the function itself are marked, and the other engines ignore the mark.
+#
+# Annotations (stored in node.dict):
+#   fcall -> 'tail_call' = True on marked calls
+
+# return types whose calls can't give back nil
+NEVER_NIL = ["int", "bool", "string"]
+
+class TailCallMarker():
+    def __init__(self, func_table):
+        self.func_table = func_table
+        self.stats = {"functions": 0, "call_sites": 0}
+
+    def mark_program(self, func_defs):
+        for func_node in func_defs:
+            call_sites = self.stats["call_sites"]
+            self.mark_block(func_node, func_node.dict['statements'] or [], top_level=True, tail=True)
+            if self.stats["call_sites"] > call_sites:
+                self.stats["functions"] += 1
+        return self.stats
+
+    # tail: the block's last statement gives the function its value (when nothing before it ended the function)
+    def mark_block(self, func_node, statements, top_level, tail):
+        never_nil = func_node.dict['return_type'] in NEVER_NIL
+        for i, statement in enumerate(statements):
+            last = tail and i == len(statements) - 1
+            call = self.self_call(func_node, statement)
+            if call is not None and (last or (never_nil and not top_level)):
+                call.dict['tail_call'] = True
+                self.stats["call_sites"] += 1
+            elif statement.elem_type == "if":
+                self.mark_block(func_node, statement.dict['statements'] or [], False, last)
+                self.mark_block(func_node, statement.dict['else_statements'] or [], False, last)
+            elif statement.elem_type == "for":
+                self.mark_block(func_node, statement.dict['statements'] or [], False, False)
+
+    # the fcall node if the statement is `f(...);` or `return f(...);` with f the function itself, otherwise None
+    def self_call(self, func_node, statement):
+        call = statement
+        if statement.elem_type == "return":
+            call = statement.dict['expression']
+        if call is None or call.elem_type != "fcall":
+            return None
+        if self.func_table.get((call.dict['name'], len(call.dict['args']))) is not func_node:
+            return None
+        return call
@@ -0,0 +1,380 @@
+# Tracing JIT for hot for loops in the tree walker (Interpreter(jit=True)).
+# do_for_loop counts the iterations of every loop (jit_loop_iteration in interpreterv3.py). Once a loop is hot, the
+# iteration that just ran is turned into a trace: one python function with the loop's condition, body and update
+# inlined as straight-line code, compiled with compile()/exec() like transpile_v3.py does for whole programs. The
+# interpreter then calls it to run the rest of the loop.
+#
+# What the trace takes for granted is guarded, and every guard falls back to the interpreter's own code:
+#   - ifs follow the way they went in the traced iteration (do_if_statement leaves it in node.taken). When one goes
+#     the other way it's a side exit: the interpreter runs that branch (run_if_branch) and the trace carries on after
+#     the if. A trace that keeps side exiting hands the loop back to the interpreter, which traces it again (the ifs
+#     may have settled the other way) or, after MAX_RETRACES, blacklists it and runs it without a trace from then on.
+#   - operators that specialized (node.spec, see specialize_operator) run inline behind a check on both operand
+#     types, and go through the interpreter's apply_* code when it fails.
+#   - variables read and written straight from their scope list, with the same unbound/type checks as the interpreter.
+# Anything else (calls, struct fields, nested loops, ...) is handed to the interpreter one node at a time, so output
+# and errors are the same as without the JIT. Nested loops get traces of their own.
+#
+# Needs ScopeResolver to have run. Scopes are addressed by frame number, frame k is variable_scope_stack[k].
+
+from intbase import *
+from element import Element
+from type_valuev3 import *
+
+# iterations (over every time the loop ran) before a loop gets a trace
+JIT_THRESHOLD = 50
+# a trace that side exited on more than this many iterations, and on more than half of them, is thrown away and the
+# loop is traced again from its next iteration, up to MAX_RETRACES times before it's blacklisted
+BLACKLIST_EXITS = 16
+MAX_RETRACES = 3
+
+# what jit_loop_iteration gives back when the interpreter should keep running the loop itself
+EXIT = object()
+# node.trace of a blacklisted loop
+BLACKLISTED = object()
+
+SYMBOLS = {"+": "+", "-": "-", "*": "*", "/": "//", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "==": "==", "!=": "!="}
+TYPE_NAMES = {int: "int", str: "str", bool: "bool", StructObject: "StructObject"}
+DEFAULTS = {"int": "0", "bool": "False", "string": "''"}
+
+def new_jit_stats():
+    return {"traces": 0, "trace_iterations": 0, "side_exits": 0, "type_guard_failures": 0, "retraces": 0, "blacklisted": 0}
+
+# Helpers the generated code calls, bound to the interpreter running the program
+def make_runtime(interp, loop_node):
+    error = interp.error
+    check_valid_type = interp.check_valid_type
+
+    def assign(resulting_value, var_type):
+        if var_type == "bool" and type(resulting_value) is int:
+            resulting_value = bool(resulting_value)
+        if not check_valid_type(resulting_value, var_type):
+            error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
+        return resulting_value
+
+    def undeclared(var_name):
+        error(ErrorType.NAME_ERROR, f"variable used and not declared: {var_name}",)
+
+    # assigning a field of a nil struct that escape_v3.py replaced with slots
+    def nil_field(field):
+        error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+
+    def check_cond(condition):
+        condition = interp.check_coercion(condition)
+        if type(condition) is not bool:
+            error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+        return condition
+
+    # an operator's type guard failed, the interpreter's generic code does the rest
+    def guard_failed(apply, node, eval1, eval2):
+        interp.jit_stats["type_guard_failures"] += 1
+        return apply(node, eval1, eval2)
+
+    def done(iterations, exits):
+        interp.jit_stats["trace_iterations"] += iterations
+        interp.jit_stats["side_exits"] += exits
+
+    # too many side exits
+    def give_up():
+        retraces = getattr(loop_node, 'retraces', 0)
+        if retraces < MAX_RETRACES:
+            # jit_loop_iteration traces the next iteration
+            loop_node.retraces = retraces + 1
+            loop_node.trace = None
+            loop_node.iterations = JIT_THRESHOLD - 1
+            interp.jit_stats["retraces"] += 1
+        else:
+            loop_node.trace = BLACKLISTED
+            interp.jit_stats["blacklisted"] += 1
+
+    return {
+        "interp": interp, "nil": nil, "StructObject": StructObject, "EXIT": EXIT,
+        "_eval": interp.evaluate_expression, "_run": interp.run_statement, "_call": interp.do_func_call,
+        "_do_assignment": interp.do_assignment, "_branch": interp.run_if_branch,
+        "_binop": interp.apply_binary_operator, "_cmp": interp.apply_comparison_operator,
+        "_unary": interp.apply_unary_operator, "_logic": interp.apply_binary_boolean_operator,
+        "_operand": interp.check_boolean_operand,
+        "_push": interp.push_scope, "_pop": interp.pop_scope,
+        "_assign": assign, "_undeclared": undeclared, "_nil_field": nil_field, "_cond": check_cond, "_guard": guard_failed,
+        "_done": done, "_give_up": give_up,
+        "_return": Element("return", value=nil),
+    }
+
+class TraceCompiler():
+    def __init__(self, interpreter):
+        self.interp = interpreter
+
+    # Compiles the loop from where the interpreter is right now (between two iterations, after the update) and gives
+    # back the trace. Calling it runs the loop to the end and gives back the body's return value (nil if it just ended),
+    # or EXIT if it gave up on the loop.
+    def compile_loop(self, loop_node):
+        self.lines = []
+        self.nodes = [] # N[i] in the generated code
+        self.temp_count = 0
+        self.side_exits = False
+        counting = loop_node.dict['counting']
+        frame_size = loop_node.dict['frame_size']
+        entry_depth = len(self.interp.variable_scope_stack)
+        # a counting loop's body scope is already pushed (do_counting_loop keeps one for the whole loop)
+        body_frame = entry_depth - 1 if counting and frame_size else entry_depth
+        self.depth = body_frame
+        self.pushed = [] # frame sizes of the scopes the trace pushed, innermost last
+
+        self.emit(0, "def _trace():")
+        self.emit(1, "stack = interp.variable_scope_stack")
+        for frame in range(body_frame):
+            self.emit(1, f"f{frame} = stack[{frame}]")
+        self.emit(1, "iterations = exits = 0")
+        if frame_size:
+            if not counting:
+                self.emit(1, f"_push({frame_size})")
+                self.pushed.append(frame_size)
+            self.emit(1, f"f{body_frame} = stack[{body_frame}]")
+            self.depth += 1
+        self.emit(1, "while True:")
+        if counting:
+            self.compile_counting_condition(loop_node, 2)
+        else:
+            self.compile_condition(loop_node.dict['condition'], 2)
+        self.compile_statements(loop_node.dict['statements'], 2)
+        if counting:
+            self.compile_counting_update(loop_node.dict['update'], 2)
+        else:
+            self.compile_assignment(loop_node.dict['update'], 2)
+        self.emit(2, "iterations += 1")
+        if self.side_exits:
+            self.emit(2, f"if exits > {BLACKLIST_EXITS} and exits * 2 > iterations:")
+            self.emit(3, "_give_up()")
+            self.emit_exit(3, "EXIT")
+        self.emit_exit(1, "nil")
+
+        source = "\n".join(self.lines)
+        namespace = make_runtime(self.interp, loop_node)
+        namespace["N"] = self.nodes
+        exec(compile(source, "<trace>", "exec"), namespace)
+        trace = namespace["_trace"]
+        trace.source = source
+        return trace
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def temp(self):
+        self.temp_count += 1
+        return f"t{self.temp_count}"
+
+    # N[i] for a node the generated code hands to the interpreter
+    def node_ref(self, node):
+        self.nodes.append(node)
+        return f"N[{len(self.nodes) - 1}]"
+
+    # leaving the trace: pop what it pushed and give back value
+    def emit_exit(self, indent, value):
+        self.emit(indent, "_done(iterations, exits)")
+        for frame_size in reversed(self.pushed):
+            self.emit(indent, f"_pop({frame_size})")
+        self.emit(indent, f"return {value}")
+
+    # same as the interpreter's `if (return_value := ...) is not nil` in the loop and if bodies
+    def emit_return_if_not_nil(self, indent, expression):
+        self.emit(indent, f"if (r := {expression}) is not nil:")
+        self.emit_exit(indent + 1, "r")
+
+    ## Loop condition and update ##
+    # do_for_loop evaluates the condition twice: once for truthiness, then again for the bool check
+    def compile_condition(self, condition, indent):
+        self.emit(indent, f"if not ({self.compile_expression(condition)}):")
+        self.emit(indent + 1, "break")
+        temp = self.temp()
+        self.emit(indent, f"{temp} = {self.compile_expression(condition)}")
+        self.emit(indent, f"if type({temp}) is not bool:")
+        self.emit(indent + 1, f"_cond({temp})")
+
+    # same as do_counting_loop: the int/int comparison, anything else goes through the whole condition
+    def compile_counting_condition(self, loop_node, indent):
+        condition = loop_node.dict['condition']
+        update = loop_node.dict['update']
+        counter, limit, cond = self.temp(), self.temp(), self.temp()
+        self.emit(indent, f"{counter} = f{update.dict['frame']}[{update.dict['slot']}]")
+        self.emit(indent, f"{limit} = {self.compile_expression(condition.dict['op2'])}")
+        self.emit(indent, f"if type({counter}) is int and type({limit}) is int:")
+        self.emit(indent + 1, f"if not ({counter} {SYMBOLS[condition.elem_type]} {limit}):")
+        self.emit(indent + 2, "break")
+        self.emit(indent, "else:")
+        self.emit(indent + 1, f"{cond} = _eval({self.node_ref(condition)})")
+        self.emit(indent + 1, f"if not {cond}:")
+        self.emit(indent + 2, "break")
+        self.emit(indent + 1, f"if type({cond}) is not bool:")
+        self.emit(indent + 2, f"_cond({cond})")
+
+    def compile_counting_update(self, update, indent):
+        step = update.dict['expression']
+        scope = f"f{update.dict['frame']}"
+        slot = update.dict['slot']
+        counter, amount = self.temp(), self.temp()
+        self.emit(indent, f"{counter} = {scope}[{slot}]")
+        self.emit(indent, f"{amount} = {self.compile_expression(step.dict['op2'])}")
+        if update.dict['var_type'] == "int":
+            self.emit(indent, f"if type({counter}) is int and type({amount}) is int:")
+            self.emit(indent + 1, f"{scope}[{slot}] = {counter} {step.elem_type} {amount}")
+            self.emit(indent, "else:")
+            indent += 1
+        self.emit(indent, f"_do_assignment({self.node_ref(update)})")
+
+    ## Statements ##
+    def compile_statements(self, statements, indent):
+        statements = statements or []
+        for statement in statements:
+            self.compile_statement(statement, indent)
+        if not statements:
+            self.emit(indent, "pass")
+
+    def compile_statement(self, statement, indent):
+        match statement.elem_type:
+            case "vardef":
+                default = DEFAULTS.get(statement.dict['var_type'])
+                if default is None and statement.dict['var_type'] in self.interp.struct_registry:
+                    default = "nil"
+                if statement.dict['redefined'] or default is None:
+                    # the interpreter reports it
+                    self.emit(indent, f"_run({self.node_ref(statement)})")
+                else:
+                    self.emit(indent, f"f{statement.dict['frame']}[{statement.dict['slot']}] = {default}")
+            case "=":
+                self.compile_assignment(statement, indent)
+            case "fcall":
+                self.emit_return_if_not_nil(indent, f"_call({self.node_ref(statement)})")
+            case "return":
+                if not statement.dict['expression']:
+                    self.emit_exit(indent, "_return")
+                else:
+                    self.emit_return_if_not_nil(indent, self.compile_expression(statement.dict['expression']))
+            case "if":
+                self.compile_if(statement, indent)
+            case "scalar_init":
+                base = statement.dict['base']
+                self.emit(indent, f"f0[{base}:{base + len(statement.dict['values'])}] = {self.node_ref(statement)}.dict['values']")
+            case _:
+                self.emit_return_if_not_nil(indent, f"_run({self.node_ref(statement)})")
+
+    def compile_assignment(self, statement, indent):
+        frame = statement.dict['frame']
+        if statement.elem_type != "=" or frame is None or statement.dict['fields']:
+            self.emit(indent, f"_run({self.node_ref(statement)})")
+            return
+        slot = statement.dict['slot']
+        var_type = statement.dict['var_type']
+        value = self.temp()
+        self.emit(indent, f"{value} = {self.compile_expression(statement.dict['expression'])}")
+        if frame == 0:
+            # main's params start unbound
+            self.emit(indent, f"if f0[{slot}] is None:")
+            if 'scalar_field' in statement.dict:
+                self.emit(indent + 1, f"_nil_field({statement.dict['scalar_field']!r})")
+            else:
+                self.emit(indent + 1, f"_undeclared({statement.dict['var_name']!r})")
+        fast_type = {"int": "int", "bool": "bool", "string": "str"}.get(var_type)
+        if statement.dict['checked']:
+            self.emit(indent, f"f{frame}[{slot}] = {value}")
+        elif fast_type is None:
+            self.emit(indent, f"f{frame}[{slot}] = _assign({value}, {var_type!r})")
+        else:
+            self.emit(indent, f"f{frame}[{slot}] = {value} if type({value}) is {fast_type} else _assign({value}, {var_type!r})")
+
+    # the branch the traced iteration took is inlined, the other one is a side exit
+    def compile_if(self, statement, indent):
+        taken = getattr(statement, 'taken', None)
+        if taken is None:
+            # didn't run yet, nothing to follow
+            self.emit_return_if_not_nil(indent, f"_run({self.node_ref(statement)})")
+            return
+        self.side_exits = True
+        condition = self.temp()
+        self.emit(indent, f"{condition} = {self.compile_expression(statement.dict['condition'])}")
+        self.emit(indent, f"if type({condition}) is not bool:")
+        self.emit(indent + 1, f"{condition} = _cond({condition})")
+        self.emit(indent, f"if {condition} is not {taken}:")
+        self.emit(indent + 1, "exits += 1")
+        self.emit_return_if_not_nil(indent + 1, f"_branch({self.node_ref(statement)}, {condition})")
+        self.emit(indent, "else:")
+        frame_size = statement.dict['frame_size' if taken else 'else_frame_size']
+        if frame_size:
+            self.emit(indent + 1, f"_push({frame_size})")
+            self.emit(indent + 1, f"f{self.depth} = stack[{self.depth}]")
+            self.pushed.append(frame_size)
+            self.depth += 1
+        self.compile_statements(statement.dict['statements' if taken else 'else_statements'], indent + 1)
+        if frame_size:
+            self.pushed.pop()
+            self.depth -= 1
+            self.emit(indent + 1, f"_pop({frame_size})")
+
+    ## Expressions ##
+    # gives back a python expression, operands are evaluated left to right like evaluate_expression does
+    def compile_expression(self, node):
+        match node.elem_type:
+            case "int" | "string" | "bool":
+                return repr(node.dict['val'])
+            case "nil":
+                return "nil"
+            case "var":
+                frame = node.dict['frame']
+                if frame is None or node.dict['fields']:
+                    return f"_eval({self.node_ref(node)})"
+                if frame == 0:
+                    # unbound main param, the interpreter reports it
+                    value = self.temp()
+                    return f"({value} if ({value} := f0[{node.dict['slot']}]) is not None else _eval({self.node_ref(node)}))"
+                return f"f{frame}[{node.dict['slot']}]"
+            case "+" | "-" | "*" | "/":
+                return self.compile_operator(node, "_binop")
+            case "<" | "<=" | ">" | ">=" | "==" | "!=":
+                return self.compile_operator(node, "_cmp")
+            case "neg" | "!":
+                operand = self.temp()
+                op1 = self.compile_expression(node.dict['op1'])
+                if node.elem_type == "neg":
+                    return f"(-{operand} if type({operand} := {op1}) is int else _unary({self.node_ref(node)}, {operand}))"
+                return f"(not {operand} if type({operand} := {op1}) is bool else _unary({self.node_ref(node)}, {operand}))"
+            case "&&" | "||":
+                eval1, eval2 = self.temp(), self.temp()
+                op1 = self.compile_expression(node.dict['op1'])
+                op2 = self.compile_expression(node.dict['op2'])
+                if self.interp.short_circuit:
+                    # op2 only runs when op1 doesn't decide the result
+                    ref = self.node_ref(node)
+                    first = f"({eval1} if type({eval1} := {op1}) is bool else _operand({ref}, {eval1}))"
+                    second = f"({eval2} if type({eval2} := {op2}) is bool else _operand({ref}, {eval2}))"
+                    if node.elem_type == "&&":
+                        return f"({second} if {first} else False)"
+                    return f"(True if {first} else {second})"
+                python_op = "and" if node.elem_type == "&&" else "or"
+                return (f"(({eval1} {python_op} {eval2}) if (type({eval1} := {op1}) is bool) & (type({eval2} := {op2}) is bool)"
+                        f" else _logic({self.node_ref(node)}, {eval1}, {eval2}))")
+            case "invariant":
+                # loop invariant (licm_v3.py): its value once the interpreter has evaluated it in this run of the loop
+                value, ref = self.temp(), self.node_ref(node)
+                return f"({value} if ({value} := {ref}.value) is not None else _eval({ref}))"
+            case "cse_def":
+                # first evaluation of a repeated expression (cse_v3.py), stored in frame 0 for the var nodes after it
+                value = self.temp()
+                return f"(f0.__setitem__({node.dict['slot']}, {value} := {self.compile_expression(node.dict['expression'])}) or {value})"
+        return f"_eval({self.node_ref(node)})"
+
+    # a specialized operator runs inline behind its type guard, a generic one calls the interpreter's apply_* code
+    def compile_operator(self, node, apply):
+        spec = getattr(node, 'spec', None)
+        if spec is None:
+            # never ran, let the interpreter specialize it
+            return f"_eval({self.node_ref(node)})"
+        eval1, eval2 = self.temp(), self.temp()
+        op1 = self.compile_expression(node.dict['op1'])
+        op2 = self.compile_expression(node.dict['op2'])
+        if type(spec) is not tuple:
+            return f"{apply}({self.node_ref(node)}, {op1}, {op2})"
+        type1, type2, _ = spec
+        symbol = SYMBOLS[node.elem_type]
+        if type1 is StructObject:
+            symbol = "is" if node.elem_type == "==" else "is not"
+        return (f"({eval1} {symbol} {eval2} if (type({eval1} := {op1}) is {TYPE_NAMES[type1]}) & (type({eval2} := {op2}) is {TYPE_NAMES[type2]})"
+                f" else _guard({apply}, {self.node_ref(node)}, {eval1}, {eval2}))")
@@ -0,0 +1,516 @@
+# Brewin -> python transpiler for the v3 interpreter (engine="python").
+# Every brewin function becomes one python function, every brewin variable a python local, and the whole program is
+# compiled with compile() and run with exec(). The checks the tree walker does (coercion, nil, struct types, arg and
+# return types) are either inlined with an int/bool fast path or done by the small runtime helpers in make_runtime,
+# so output and errors match interpreterv3.py. Like closure_v3.py, errors the tree walker only reports at runtime
+# are turned into code that raises them at the same spot.
+# Needs ScopeResolver to have run: variables are named after their [frame][slot] (p<slot> for params, v<frame>_<slot>).
+#
+# Return values follow run_func: a function returns (type checked) whatever its last top level statement gave back,
+# a bare `return;` stops it, and inside if/for bodies any non-nil statement value (return or call) returns it.
+
+from brewparse import parse_program
+from intbase import *
+from type_valuev3 import *
+from resolver_v3 import ScopeResolver
+from fold_v3 import ConstantFolder
+
+# main's params before they've been assigned (main is started without arguments)
+UNBOUND = object()
+
+# Helpers the generated code calls, bound to the interpreter running the program
+def make_runtime(interp):
+    error = interp.error
+    check_valid_type = interp.check_valid_type
+
+    def get_field(val, field):
+        if val is nil:
+            error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+        if type(val) is not StructObject:
+            error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+        field_info = val._type.fields.get(field)
+        if field_info is None:
+            error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+        return val._values[field_info[0]]
+
+    # value comes first, it's evaluated before the struct is looked up
+    def store_field(resulting_value, val, field):
+        if val is nil:
+            error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+        if type(val) is not StructObject:
+            error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+        field_info = val._type.fields.get(field)
+        if field_info is None:
+            error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+        offset, var_type = field_info
+        val._values[offset] = assign(resulting_value, var_type)
+
+    def assign(resulting_value, var_type):
+        if var_type == "bool" and type(resulting_value) is int:
+            resulting_value = bool(resulting_value)
+        if not check_valid_type(resulting_value, var_type):
+            error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
+        return resulting_value
+
+    def check_arg(arg_value, var_name, var_type):
+        if var_type == "bool" and type(arg_value) is int:
+            arg_value = bool(arg_value)
+        if not check_valid_type(arg_value, var_type):
+            arg_type = arg_value._type.name if type(arg_value) is StructObject else type(arg_value)
+            error(ErrorType.TYPE_ERROR, f"Invalid arg type {arg_type} given to formal parameter {var_name} of type {var_type}",)
+        return arg_value
+
+    def check_cond(cond):
+        if type(cond) is int:
+            cond = bool(cond)
+        if type(cond) is not bool:
+            error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+        return cond
+
+    def add(eval1, eval2):
+        if not ((type(eval1) is int and type(eval2) is int) or (type(eval1) is str and type(eval2) is str)):
+            error(ErrorType.TYPE_ERROR, "Types for + must be both of type int or string.",)
+        return eval1 + eval2
+
+    def arith_error():
+        error(ErrorType.TYPE_ERROR, "Arguments must be of type 'int'.",)
+
+    def neg_error():
+        error(ErrorType.TYPE_ERROR, "'negation' can only be used on integer values.",)
+
+    def logical_not(eval):
+        if type(eval) is int:
+            eval = bool(eval)
+        if type(eval) is not bool:
+            error(ErrorType.TYPE_ERROR, "'Not' can only be used on boolean values.",)
+        return not eval
+
+    # same as evaluate_comparison_operator (the generated code handles int on int itself)
+    def compare(op, eval1, eval2):
+        if type(eval2) is bool and type(eval1) is int:
+            eval1 = bool(eval1)
+        if type(eval1) is bool and type(eval2) is int:
+            eval2 = bool(eval2)
+        if (((eval1 is nil and eval2 is not nil) or (eval2 is nil and eval1 is not nil))
+            and not ((type(eval1) is StructObject) or (type(eval2) is StructObject))):
+            error(ErrorType.TYPE_ERROR, f"Cannot compare type nil unless both are nil",)
+        both_structs = type(eval1) is StructObject and type(eval2) is StructObject
+        if op == "==":
+            return (eval1 is eval2) if both_structs else (eval1 == eval2)
+        if op == "!=":
+            return (eval1 is not eval2) if both_structs else (eval1 != eval2)
+        if not (type(eval1) is int and type(eval2) is int):
+            error(ErrorType.TYPE_ERROR, f"Comparison args for {op} must be of same type int.",)
+        return {"<": int.__lt__, "<=": int.__le__, ">": int.__gt__, ">=": int.__ge__}[op](eval1, eval2)
+
+    def bool_op(op, eval1, eval2):
+        if type(eval1) is int:
+            eval1 = bool(eval1)
+        if type(eval2) is int:
+            eval2 = bool(eval2)
+        if (type(eval1) is not bool) or (type(eval2) is not bool):
+            error(ErrorType.TYPE_ERROR, f"Comparison args for {op} must be of same type bool.",)
+        return (eval1 and eval2) if op == "&&" else (eval1 or eval2)
+
+    # short_circuit: one operand, checked on its own
+    def bool_operand(op, value):
+        if type(value) is int:
+            return bool(value)
+        if type(value) is not bool:
+            error(ErrorType.TYPE_ERROR, f"Comparison args for {op} must be of same type bool.",)
+        return value
+
+    def do_print(*args):
+        output = ""
+        for eval in args:
+            if type(eval) is bool:
+                output += "true" if eval else "false"
+            else:
+                output += str(eval)
+        interp.output(output)
+        return nil
+
+    def do_input(*prompt):
+        if prompt:
+            interp.output(prompt[0])
+        user_in = interp.get_input()
+        try:
+            return int(user_in)
+        except:
+            return user_in
+
+    return {
+        "nil": nil,
+        "UNBOUND": UNBOUND,
+        "ErrorType": ErrorType,
+        "_error": error,
+        "_field": get_field,
+        "_store_field": store_field,
+        "_assign": assign,
+        "_arg": check_arg,
+        "_cond": check_cond,
+        "_add": add,
+        "_arith_error": arith_error,
+        "_neg_error": neg_error,
+        "_not": logical_not,
+        "_compare": compare,
+        "_bool_op": bool_op, "_bool_operand": bool_operand,
+        "_print": do_print,
+        "_input": do_input,
+        "_typecheck": interp.do_func_typecheck,
+        "_default": interp.get_default_value,
+        "_new": interp.new_struct_object,
+    }
+
+class PythonTranspiler():
+    def __init__(self, interpreter):
+        self.interp = interpreter
+        self.func_names = {id(func_node): f"_f{i}" for i, func_node in enumerate(interpreter.func_defs)}
+
+    # python source for the whole program, one def per brewin function
+    def transpile_program(self, main_func_node=None):
+        funcs = []
+        for func_node in self.interp.func_defs:
+            funcs.append(self.transpile_func(func_node, unbound_params=func_node is main_func_node))
+        return "\n\n".join(funcs) + "\n"
+
+    # compiles and runs the generated source, returns main's return value
+    def run(self, main_func_node, dump=False):
+        source = self.transpile_program(main_func_node)
+        if dump:
+            import sys
+            print(source, file=sys.stderr)
+        namespace = make_runtime(self.interp)
+        exec(compile(source, "<brewin>", "exec"), namespace)
+        main = namespace[self.func_names[id(main_func_node)]]
+        return main(*[UNBOUND] * len(main_func_node.dict['args']))
+
+    ## Functions ##
+    def transpile_func(self, func_node, unbound_params=False):
+        self.lines = []
+        self.temp_count = 0
+        self.return_type = repr(func_node.dict['return_type'])
+        self.unbound_params = unbound_params
+        params = ", ".join(f"p{i}" for i in range(len(func_node.dict['args'])))
+        signature = ", ".join(f"{arg.dict['name']}: {arg.dict['var_type']}" for arg in func_node.dict['args'])
+        self.emit(0, f"def {self.func_names[id(func_node)]}({params}): # {func_node.dict['name']}({signature}): {func_node.dict['return_type']}")
+        statements = func_node.dict['statements'] or []
+        for statement in statements[:-1]:
+            self.transpile_statement(statement, 1, nested=False)
+        if statements:
+            self.transpile_last_statement(statements[-1])
+        else:
+            self.emit(1, f"return _typecheck({self.return_type}, nil)")
+        return "\n".join(self.lines)
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    # fresh local for walrus temporaries (_t1, _t2, ...)
+    def temp(self):
+        self.temp_count += 1
+        return f"_t{self.temp_count}"
+
+    def local_name(self, frame, slot):
+        return f"p{slot}" if frame == 0 else f"v{frame}_{slot}"
+
+    def error(self, error_type, message):
+        return f"_error(ErrorType.{error_type.name}, {message!r})"
+
+    ## Statements ##
+    # the function's value is whatever its last top level statement gives back
+    def transpile_last_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "return" if statement_node.dict['expression']:
+                self.emit(1, f"return _typecheck({self.return_type}, {self.transpile_expression(statement_node.dict['expression'])})")
+                return
+            case "fcall":
+                self.emit(1, f"return _typecheck({self.return_type}, {self.transpile_func_call(statement_node)})")
+                return
+        self.transpile_statement(statement_node, 1, nested=False)
+        self.emit(1, f"return _typecheck({self.return_type}, nil)")
+
+    # nested = inside an if/for body, where any non-nil value returns from the function
+    def transpile_statement(self, statement_node, indent, nested):
+        match statement_node.elem_type:
+            case "vardef":
+                self.transpile_definition(statement_node, indent)
+            case "=":
+                self.transpile_assignment(statement_node, indent)
+            case "fcall":
+                call = self.transpile_func_call(statement_node)
+                if nested and statement_node.dict['name'] != "print":
+                    self.emit_return_if_not_nil(call, indent)
+                else:
+                    self.emit(indent, call)
+            case "return":
+                if not statement_node.dict['expression']:
+                    self.emit(indent, f"return _typecheck({self.return_type}, nil)")
+                elif nested:
+                    self.emit_return_if_not_nil(self.transpile_expression(statement_node.dict['expression']), indent)
+                else:
+                    # a top level return with a value doesn't stop the function (see do_return_statement)
+                    self.emit(indent, self.transpile_expression(statement_node.dict['expression']))
+            case "if":
+                self.transpile_if_statement(statement_node, indent)
+            case "for":
+                self.transpile_for_loop(statement_node, indent)
+            case _:
+                # anything else isn't run as a statement
+                self.emit(indent, "pass")
+
+    def emit_return_if_not_nil(self, value, indent):
+        temp = self.temp()
+        self.emit(indent, f"if ({temp} := {value}) is not nil:")
+        self.emit(indent + 1, f"return _typecheck({self.return_type}, {temp})")
+
+    def transpile_block(self, statements, indent):
+        if not statements:
+            self.emit(indent, "pass")
+        for statement in statements or []:
+            self.transpile_statement(statement, indent, nested=True)
+
+    def transpile_definition(self, statement_node, indent):
+        var_name = statement_node.dict['name']
+        var_type = statement_node.dict['var_type']
+        if statement_node.dict['redefined']:
+            self.emit(indent, self.error(ErrorType.NAME_ERROR, f"Variable {var_name} defined more than once"))
+            return
+        target = self.local_name(statement_node.dict['frame'], statement_node.dict['slot'])
+        if var_type in ["int", "bool", "string", "void"] or var_type in self.interp.struct_registry:
+            default_value = self.interp.get_default_value(var_type)
+            self.emit(indent, f"{target} = {'nil' if default_value is nil else repr(default_value)}")
+        else:
+            self.emit(indent, f"{target} = _default({var_type!r})") # errors at runtime
+
+    def transpile_assignment(self, statement_node, indent):
+        var_name = statement_node.dict['var_name']
+        fields = statement_node.dict['fields']
+        frame = statement_node.dict['frame']
+        not_declared = self.error(ErrorType.NAME_ERROR, f"variable used and not declared: {var_name}")
+        # right side first, then the variable
+        if frame is None:
+            self.emit(indent, self.transpile_expression(statement_node.dict['expression']))
+            self.emit(indent, not_declared)
+            return
+        target = self.local_name(frame, statement_node.dict['slot'])
+        checked = frame == 0 and self.unbound_params
+
+        if fields:
+            value = self.transpile_expression(statement_node.dict['expression'])
+            obj = f"({target} if {target} is not UNBOUND else {not_declared})" if checked else target
+            for field in fields[:-1]:
+                obj = f"_field({obj}, {field!r})"
+            self.emit(indent, f"_store_field({value}, {obj}, {fields[-1]!r})")
+            return
+
+        var_type = statement_node.dict['var_type']
+        expression = statement_node.dict['expression']
+        if expression.elem_type == "+" and var_type == "int" and not checked:
+            # int + int is already an int, only the string + result needs the assignment check
+            a, b, check = self.both_int(expression)
+            self.emit(indent, f"{target} = {self.guarded(f'{a} + {b}', check, f'_assign(_add({a}, {b}), {var_type!r})')}")
+            return
+        value = self.transpile_expression(expression)
+        if checked:
+            temp = self.temp()
+            self.emit(indent, f"{temp} = {value}")
+            self.emit(indent, f"if {target} is UNBOUND: {not_declared}")
+            value = temp
+        if self.static_type(expression) == var_type:
+            self.emit(indent, f"{target} = {value}")
+        elif var_type in ["int", "bool"]:
+            temp = self.temp()
+            self.emit(indent, f"{target} = {temp} if type({temp} := {value}) is {var_type} else _assign({temp}, {var_type!r})")
+        else:
+            self.emit(indent, f"{target} = _assign({value}, {var_type!r})")
+
+    def transpile_condition(self, condition_node):
+        if self.static_type(condition_node) == "bool":
+            return self.transpile_expression(condition_node)
+        temp = self.temp()
+        return f"({temp} if type({temp} := {self.transpile_expression(condition_node)}) is bool else _cond({temp}))"
+
+    def transpile_if_statement(self, statement_node, indent):
+        self.emit(indent, f"if {self.transpile_condition(statement_node.dict['condition'])}:")
+        self.transpile_block(statement_node.dict['statements'], indent + 1)
+        if statement_node.dict['else_statements']:
+            self.emit(indent, "else:")
+            self.transpile_block(statement_node.dict['else_statements'], indent + 1)
+
+    def transpile_for_loop(self, statement_node, indent):
+        self.transpile_statement(statement_node.dict['init'], indent, nested=False)
+        condition = statement_node.dict['condition']
+        if statement_node.dict['counting']:
+            # no side effects in a counting loop condition (ScopeResolver.is_counting_loop), so evaluate it once
+            self.emit(indent, f"while {self.transpile_condition(condition)}:")
+        else:
+            # condition is evaluated twice per iteration, just like the tree walker
+            self.emit(indent, "while True:")
+            self.emit(indent + 1, f"if not {self.transpile_expression(condition)}: break")
+            self.emit(indent + 1, self.transpile_condition(condition))
+        self.transpile_block(statement_node.dict['statements'], indent + 1)
+        self.transpile_statement(statement_node.dict['update'], indent + 1, nested=False)
+
+    ## Function Calls ##
+    # statement context, same checks as do_func_call
+    def transpile_func_call(self, call_node):
+        func_call = call_node.dict['name']
+        args = call_node.dict['args']
+        if func_call == "print":
+            return f"_print({', '.join(self.transpile_expression(arg) for arg in args)})"
+        if func_call in ["inputi", "inputs"]:
+            if len(args) > 1:
+                return self.error(ErrorType.NAME_ERROR, f"No {func_call}() function found that takes > 1 parameter")
+            return f"_input({', '.join(self.transpile_expression(arg) for arg in args)})"
+        if not self.interp.check_valid_func(func_call):
+            return self.error(ErrorType.NAME_ERROR, f"Function {func_call} was not found")
+        func_def = self.interp.func_table.get((func_call, len(args)))
+        if func_def is None:
+            return self.error(ErrorType.NAME_ERROR, f"Incorrect amount of arguments given: {len(args)} ")
+        # args are evaluated and checked one at a time, in order
+        checked_args = []
+        for arg, param in zip(args, func_def.dict['args']):
+            value = self.transpile_expression(arg)
+            var_name, var_type = param.dict['name'], param.dict['var_type']
+            if self.static_type(arg) == var_type:
+                checked_args.append(value)
+            elif var_type in ["int", "bool"]:
+                temp = self.temp()
+                checked_args.append(f"({temp} if type({temp} := {value}) is {var_type} else _arg({temp}, {var_name!r}, {var_type!r}))")
+            else:
+                checked_args.append(f"_arg({value}, {var_name!r}, {var_type!r})")
+        return f"{self.func_names[id(func_def)]}({', '.join(checked_args)})"
+
+    ## Expressions ##
+    def transpile_expression(self, expression_node):
+        match expression_node.elem_type:
+            case "int" | "string" | "bool":
+                return repr(expression_node.dict['val'])
+            case "nil":
+                return "nil"
+            case "var":
+                return self.transpile_variable(expression_node)
+            case "+" | "-" | "*" | "/":
+                return self.transpile_binary_operator(expression_node)
+            case "neg" | "!":
+                return self.transpile_unary_operator(expression_node)
+            case "==" | "<" | "<=" | ">" | ">=" | "!=":
+                return self.transpile_comparison_operator(expression_node)
+            case "&&" | "||":
+                return self.transpile_binary_boolean_operator(expression_node)
+            case "fcall":
+                return self.transpile_func_call_expression(expression_node)
+            case "new":
+                return f"_new({expression_node.dict['var_type']!r})"
+        return "None"
+
+    def transpile_variable(self, expression_node):
+        var_name = expression_node.dict['var_name']
+        frame = expression_node.dict['frame']
+        not_declared = self.error(ErrorType.NAME_ERROR, f"variable '{var_name}' used and not declared")
+        if frame is None:
+            return not_declared
+        value = self.local_name(frame, expression_node.dict['slot'])
+        if frame == 0 and self.unbound_params:
+            value = f"({value} if {value} is not UNBOUND else {not_declared})"
+        for field in expression_node.dict['fields']:
+            value = f"_field({value}, {field!r})"
+        return value
+
+    # type an expression is guaranteed to have (when it doesn't raise), or None if it depends on runtime values.
+    # "+" is left out since it can give back a string
+    def static_type(self, expression_node):
+        match expression_node.elem_type:
+            case "int" | "-" | "*" | "/" | "neg":
+                return "int"
+            case "bool" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||" | "!":
+                return "bool"
+            case "new":
+                return expression_node.dict['var_type']
+        return None
+
+    # int on int is done inline, anything else goes to a helper for the error (or string +).
+    # int literals are used as is, operands that are known ints are bound to a temp but not type checked
+    def both_int(self, expression_node):
+        names, checks = [], []
+        for key in ['op1', 'op2']:
+            operand = expression_node.dict[key]
+            value = self.transpile_expression(operand)
+            if operand.elem_type == "int":
+                names.append(value)
+                continue
+            temp = self.temp()
+            names.append(temp)
+            if self.static_type(operand) == "int":
+                checks.append(f"(({temp} := {value}) is not None)")
+            else:
+                checks.append(f"(type({temp} := {value}) is int)")
+        return names[0], names[1], " & ".join(checks)
+
+    # `fast if check else slow`, just `fast` when both_int had nothing left to check
+    def guarded(self, fast, check, slow):
+        return f"({fast} if {check} else {slow})" if check else f"({fast})"
+
+    def transpile_binary_operator(self, expression_node):
+        op = expression_node.elem_type
+        a, b, check = self.both_int(expression_node)
+        if op == "+":
+            return self.guarded(f"{a} + {b}", check, f"_add({a}, {b})")
+        py_op = {"-": "-", "*": "*", "/": "//"}[op]
+        return self.guarded(f"{a} {py_op} {b}", check, "_arith_error()")
+
+    def transpile_unary_operator(self, expression_node):
+        a = self.temp()
+        op1 = self.transpile_expression(expression_node.dict['op1'])
+        if expression_node.elem_type == "neg":
+            return f"(-{a} if type({a} := {op1}) is int else _neg_error())"
+        return f"(not {a} if type({a} := {op1}) is bool else _not({a}))"
+
+    def transpile_comparison_operator(self, expression_node):
+        op = expression_node.elem_type
+        a, b, check = self.both_int(expression_node)
+        return self.guarded(f"{a} {op} {b}", check, f"_compare({op!r}, {a}, {b})")
+
+    def transpile_binary_boolean_operator(self, expression_node):
+        op = expression_node.elem_type
+        a, b = self.temp(), self.temp()
+        op1 = self.transpile_expression(expression_node.dict['op1'])
+        op2 = self.transpile_expression(expression_node.dict['op2'])
+        if self.interp.short_circuit:
+            # op2 only runs when op1 doesn't decide the result
+            first = f"({a} if type({a} := {op1}) is bool else _bool_operand({op!r}, {a}))"
+            second = f"({b} if type({b} := {op2}) is bool else _bool_operand({op!r}, {b}))"
+            return f"({second} if {first} else False)" if op == "&&" else f"(True if {first} else {second})"
+        py_op = "and" if op == "&&" else "or"
+        # both sides are always evaluated (strict)
+        return f"({a} {py_op} {b} if (type({a} := {op1}) is bool) & (type({b} := {op2}) is bool) else _bool_op({op!r}, {a}, {b}))"
+
+    # same as evaluate_expression's fcall case: void check first, then the call itself
+    def transpile_func_call_expression(self, expression_node):
+        func_call = expression_node.dict['name']
+        if func_call not in self.interp.builtin_funcs:
+            arg_len = len(expression_node.dict['args'])
+            func_def = self.interp.func_table.get((func_call, arg_len))
+            if func_def is None:
+                return self.error(ErrorType.NAME_ERROR, f"Incorrect amount of arguments given: {arg_len} ")
+            if func_def.dict['return_type'] == "void":
+                return self.error(ErrorType.TYPE_ERROR, f"Function return type void must not be in expression.")
+        return self.transpile_func_call(expression_node)
+
+def transpile(interpreter, program):
+    ast = parse_program(program)
+    interpreter.struct_defs = interpreter.get_struct_defs(ast)
+    interpreter.build_struct_registry()
+    interpreter.func_defs = interpreter.get_func_defs(ast)
+    interpreter.build_func_table()
+    ConstantFolder().fold_program(interpreter.func_defs)
+    ScopeResolver().resolve_program(interpreter.func_defs)
+    return PythonTranspiler(interpreter).transpile_program(interpreter.get_main_func_node(ast))
+
+# python transpile_v3.py program.br -> prints the generated python
+if __name__ == "__main__":
+    import sys
+    from interpreterv3 import Interpreter
+    with open(sys.argv[1]) as f:
+        print(transpile(Interpreter(), f.read()))
@@ -0,0 +1,23 @@
+from element import Element
+
+# Shared by every v3 execution engine so they all agree on what nil and a struct instance are
+nil = Element("nil")
+
+# Way to differentiate between a specific struct and just a value
+# The probable "correct" way is to make every variable an object like this, but I felt itd require too much rewriting to pull out the value, so I decided against it.
+# _type is the struct's StructType and _values is a fixed size list of field values, in the order of _type.fields.
+# __slots__ so an instance is just those two references (no per-instance __dict__), linked lists get big.
+class StructObject():
+    __slots__ = ('_values', '_type')
+
+    def __init__(self, values, _type):
+        self._values = values
+        self._type = _type
+
+# One of these per struct definition, built once per run (see Interpreter.build_struct_registry)
+class StructType():
+    def __init__(self, name):
+        self.name = name
+        self.fields = {} # field name -> (offset into _values, type name)
+        self.template = None # default value for each offset, `new` just copies this
+        self.bad_field_type = None # set instead of template if a field has a type that doesn't exist
@@ -0,0 +1,195 @@
+# Static type checking for the v3 interpreter.
+# Runs once at load time, after ScopeResolver, and works out the type of every expression it can from the declared
+# types of variables, params, struct fields and function returns. Every assignment, argument and function return
+# whose value provably already has the type it's checked against is marked, and the tree walker skips that check.
+#
+# Nothing here raises. A check that can't be proven (unknown type, an int going into a bool, or a value that will
+# fail the check) is left unmarked, so the interpreter still does it and a bad program gets the same TYPE_ERROR at
+# the same point it always did. Checks that will fail are only counted (the 'mismatches' stat).
+#
+# Why the declared types can be trusted: a variable, param or field only ever gets a value through one of the checks
+# (or a default value of the right type), so an int var always holds an int, a bool var a bool (ints are coerced when
+# they go in), and a struct var either nil or an object of that struct. Function calls give back their declared
+# return type, do_func_typecheck makes sure of that.
+#
+# Static types are "int", "bool", "string", a struct name (that struct or nil), "nil", or None for "don't know"
+# (inputi/inputs, undeclared variables, unknown types, ...).
+#
+# Annotations (all stored in node.dict):
+#   =      -> 'checked' (the value always fits var_type or the field's type)
+#   fcall  -> 'checked_args' (one bool per arg, the arg always fits its param) for calls to user functions
+#   func   -> 'return_checked' (the function only ever gives back its return type or nil)
+
+from intbase import *
+
+BUILTIN_FUNCS = ["inputs", "inputi", "print"]
+
+class TypeChecker():
+    def __init__(self, struct_registry, func_table):
+        self.struct_registry = struct_registry
+        self.func_table = func_table
+        self.stats = {"checks": 0, "proven": 0, "mismatches": 0}
+
+    def check_program(self, func_defs):
+        for func_node in func_defs:
+            self.check_func(func_node)
+        return self.stats
+
+    # Does a value of static type value_type always pass check_valid_type(value, needs_type) without coercion?
+    def fits(self, value_type, needs_type):
+        if value_type is None:
+            return False
+        if needs_type in ["int", "bool", "string"]:
+            return value_type == needs_type
+        if needs_type == "void":
+            return value_type == "nil"
+        if needs_type in self.struct_registry:
+            return value_type == needs_type or value_type == "nil"
+        return False
+
+    # counts one check, gives back whether it can be skipped
+    def prove(self, value_type, needs_type):
+        self.stats["checks"] += 1
+        if self.fits(value_type, needs_type):
+            self.stats["proven"] += 1
+            return True
+        if value_type is not None and not (needs_type == "bool" and value_type == "int"):
+            # this check is going to fail (if it runs)
+            self.stats["mismatches"] += 1
+        return False
+
+    # the static type of a value declared as type_name
+    def declared_type(self, type_name):
+        if type_name in ["int", "bool", "string"] or type_name in self.struct_registry:
+            return type_name
+        if type_name == "void":
+            return "nil"
+        return None
+
+    # static type of var_type.fields[0].fields[1]...
+    def field_type(self, var_type, fields):
+        for field in fields:
+            struct_type = self.struct_registry.get(var_type)
+            field_info = struct_type.fields.get(field) if struct_type else None
+            if field_info is None:
+                return None
+            var_type = self.declared_type(field_info[1])
+        return var_type
+
+    ## Functions ##
+    def check_func(self, func_node):
+        return_type = func_node.dict['return_type']
+        statements = func_node.dict['statements'] or []
+        for statement in statements:
+            self.check_statement(statement)
+        # what run_func can give back: any non-nil value from inside an if/for body, or the last statement's value
+        # (nil becomes the default value, which always fits)
+        value_types = []
+        for statement in statements[:-1]:
+            if statement.elem_type in ["if", "for"]:
+                value_types += self.statement_value_types(statement)
+        if statements:
+            value_types += self.statement_value_types(statements[-1])
+        self.stats["checks"] += 1
+        known_type = return_type == "void" or self.declared_type(return_type) is not None
+        return_checked = known_type and all(value_type == "nil" or self.fits(value_type, return_type) for value_type in value_types)
+        func_node.dict['return_checked'] = return_checked
+        self.stats["proven"] += return_checked
+
+    # static types of the values a statement can hand back to run_func (nothing for nil)
+    def statement_value_types(self, statement_node):
+        match statement_node.elem_type:
+            case "fcall":
+                return [self.expression_type(statement_node)]
+            case "return":
+                if statement_node.dict['expression']:
+                    return [self.expression_type(statement_node.dict['expression'])]
+            case "if":
+                value_types = []
+                for statement in (statement_node.dict['statements'] or []) + (statement_node.dict['else_statements'] or []):
+                    value_types += self.statement_value_types(statement)
+                return value_types
+            case "for":
+                value_types = []
+                for statement in statement_node.dict['statements'] or []:
+                    value_types += self.statement_value_types(statement)
+                return value_types
+        return []
+
+    ## Statements ##
+    def check_statement(self, statement_node):
+        match statement_node.elem_type:
+            case "=":
+                self.check_expression(statement_node.dict['expression'])
+                value_type = self.expression_type(statement_node.dict['expression'])
+                if statement_node.dict['frame'] is None:
+                    needs_type = None
+                else:
+                    needs_type = self.field_type(self.declared_type(statement_node.dict['var_type']), statement_node.dict['fields'])
+                statement_node.dict['checked'] = needs_type is not None and self.prove(value_type, needs_type)
+            case "fcall":
+                self.check_expression(statement_node)
+            case "return":
+                if statement_node.dict['expression']:
+                    self.check_expression(statement_node.dict['expression'])
+            case "if":
+                self.check_expression(statement_node.dict['condition'])
+                for statement in (statement_node.dict['statements'] or []) + (statement_node.dict['else_statements'] or []):
+                    self.check_statement(statement)
+            case "for":
+                self.check_statement(statement_node.dict['init'])
+                self.check_expression(statement_node.dict['condition'])
+                for statement in statement_node.dict['statements'] or []:
+                    self.check_statement(statement)
+                self.check_statement(statement_node.dict['update'])
+
+    # only calls have something to mark
+    def check_expression(self, expression_node):
+        match expression_node.elem_type:
+            case "fcall":
+                args = expression_node.dict['args']
+                for arg in args:
+                    self.check_expression(arg)
+                if expression_node.dict['name'] in BUILTIN_FUNCS:
+                    return
+                func_def = self.func_table.get((expression_node.dict['name'], len(args)))
+                if func_def is None:
+                    return
+                expression_node.dict['checked_args'] = tuple(self.prove(self.expression_type(arg), param.dict['var_type'])
+                                                             for arg, param in zip(args, func_def.dict['args']))
+            case "neg" | "!":
+                self.check_expression(expression_node.dict['op1'])
+            case "+" | "-" | "*" | "/" | "==" | "<" | "<=" | ">" | ">=" | "!=" | "&&" | "||":
+                self.check_expression(expression_node.dict['op1'])
+                self.check_expression(expression_node.dict['op2'])
+
+    ## Expressions ##
+    # the static type of what the expression evaluates to (if it doesn't error)
+    def expression_type(self, expression_node):
+        match expression_node.elem_type:
+            case "int" | "bool" | "string" | "nil":
+                return expression_node.elem_type
+            case "var":
+                if expression_node.dict['frame'] is None:
+                    return None
+                return self.field_type(self.declared_type(expression_node.dict['var_type']), expression_node.dict['fields'])
+            case "+":
+                op1 = self.expression_type(expression_node.dict['op1'])
+                op2 = self.expression_type(expression_node.dict['op2'])
+                return op1 if op1 == op2 and op1 in ["int", "string"] else None
+            case "-" | "*" | "/" | "neg":
+                # these only ever give back ints
+                return "int"
+            case "==" | "!=" | "<" | "<=" | ">" | ">=" | "&&" | "||" | "!":
+                return "bool"
+            case "new":
+                return expression_node.dict['var_type'] if expression_node.dict['var_type'] in self.struct_registry else None
+            case "fcall":
+                name = expression_node.dict['name']
+                if name == "print":
+                    return "nil"
+                if name in BUILTIN_FUNCS:
+                    return None
+                func_def = self.func_table.get((name, len(expression_node.dict['args'])))
+                return None if func_def is None else self.declared_type(func_def.dict['return_type'])
+        return None
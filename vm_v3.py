@@ -0,0 +1,303 @@
+# Stack VM that runs the bytecode from bytecode_v3.py.
+# One dispatch loop for the whole program: brewin calls push a frame onto the `frames` list instead of recursing in
+# python, and every frame shares one operand stack. So unlike the tree walker and the closure engine (which recurse a
+# few python frames per brewin call and hit the recursion limit after a few hundred levels), brewin recursion depth
+# here is only limited by memory. This is the engine to use for deeply recursive programs (see benchmarks/bench_deep.py).
+# Semantics (coercion, struct field access, default return values, error messages) follow interpreterv3.py.
+
+from intbase import *
+from type_valuev3 import *
+from bytecode_v3 import *
+
+# marks main's params, which are never bound when the program starts
+UNBOUND = object()
+
+class VirtualMachine():
+    def __init__(self, interpreter, funcs):
+        self.interp = interpreter
+        self.funcs = funcs
+        self.struct_registry = interpreter.struct_registry
+
+    # same as check_valid_type, minus the method lookups
+    def check_valid_type(self, val, needs_type):
+        if needs_type == "int":
+            return type(val) is int
+        elif needs_type == "bool":
+            return type(val) is bool or type(val) is int
+        elif needs_type == "string":
+            return type(val) is str
+        elif needs_type == "void":
+            return val is nil
+        elif needs_type in self.struct_registry:
+            return (val is nil) or ((type(val) is StructObject) and (val._type.name == needs_type))
+        return False
+
+    def run(self, main_index):
+        interp = self.interp
+        error = interp.error
+        check_valid_type = self.check_valid_type
+        do_func_typecheck = interp.do_func_typecheck
+        funcs = self.funcs
+
+        frames = [] # saved (code_obj, code, consts, pc, locals_, base) of every caller
+        code_obj = funcs[main_index]
+        code = code_obj.code
+        consts = code_obj.consts
+        locals_ = [UNBOUND] * code_obj.nlocals
+        stack = [] # operand stack, shared by every frame
+        base = 0 # where the current frame's part of the stack starts
+        pc = 0
+
+        # ops are roughly ordered by how often they show up in hot loops
+        while True:
+            op = code[pc]
+            if op == LOAD_LOCAL:
+                stack.append(locals_[code[pc + 1]])
+                pc += 2
+            elif op == LOAD_CONST:
+                stack.append(consts[code[pc + 1]])
+                pc += 2
+            elif op == STORE_LOCAL:
+                val = stack.pop()
+                var_type = consts[code[pc + 2]]
+                if var_type == "int":
+                    if type(val) is not int:
+                        error(ErrorType.TYPE_ERROR, f"Invalid type {type(val).__name__} assigned to variable with type {var_type}",)
+                else:
+                    if var_type == "bool" and type(val) is int:
+                        val = bool(val)
+                    if not check_valid_type(val, var_type):
+                        error(ErrorType.TYPE_ERROR, f"Invalid type {type(val).__name__} assigned to variable with type {var_type}",)
+                locals_[code[pc + 1]] = val
+                pc += 3
+            elif op == BINARY_ADD:
+                eval2 = stack.pop()
+                eval1 = stack[-1]
+                if not ((type(eval1) is int and type(eval2) is int) or (type(eval1) is str and type(eval2) is str)):
+                    error(ErrorType.TYPE_ERROR, "Types for + must be both of type int or string.",)
+                stack[-1] = eval1 + eval2
+                pc += 1
+            elif op == BINARY_SUB or op == BINARY_MUL or op == BINARY_DIV:
+                eval2 = stack.pop()
+                eval1 = stack[-1]
+                if not (type(eval1) is int and type(eval2) is int):
+                    error(ErrorType.TYPE_ERROR, "Arguments must be of type 'int'.",)
+                if op == BINARY_SUB:
+                    stack[-1] = eval1 - eval2
+                elif op == BINARY_MUL:
+                    stack[-1] = eval1 * eval2
+                else:
+                    # integer division
+                    stack[-1] = eval1 // eval2
+                pc += 1
+            elif COMPARE_EQ <= op <= COMPARE_GE:
+                eval2 = stack.pop()
+                eval1 = stack[-1]
+                if type(eval2) is bool and type(eval1) is int:
+                    eval1 = bool(eval1)
+                if type(eval1) is bool and type(eval2) is int:
+                    eval2 = bool(eval2)
+                if (((eval1 is nil and eval2 is not nil) or (eval2 is nil and eval1 is not nil))
+                    and not ((type(eval1) is StructObject) or (type(eval2) is StructObject))):
+                    error(ErrorType.TYPE_ERROR, f"Cannot compare type nil unless both are nil",)
+                if op == COMPARE_EQ:
+                    stack[-1] = (eval1 is eval2) if type(eval1) is StructObject and type(eval2) is StructObject else (eval1 == eval2)
+                elif op == COMPARE_NE:
+                    stack[-1] = (eval1 is not eval2) if type(eval1) is StructObject and type(eval2) is StructObject else (eval1 != eval2)
+                else:
+                    if not (type(eval1) is int and type(eval2) is int):
+                        error(ErrorType.TYPE_ERROR, f"Comparison args for {OPERATOR_SYMBOLS[op]} must be of same type int.",)
+                    if op == COMPARE_LT:
+                        stack[-1] = eval1 < eval2
+                    elif op == COMPARE_LE:
+                        stack[-1] = eval1 <= eval2
+                    elif op == COMPARE_GT:
+                        stack[-1] = eval1 > eval2
+                    else:
+                        stack[-1] = eval1 >= eval2
+                pc += 1
+            elif op == POP_JUMP_IF_NOT_COND:
+                cond = stack.pop()
+                if type(cond) is int:
+                    cond = bool(cond)
+                if type(cond) is not bool:
+                    error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+                pc = pc + 2 if cond else code[pc + 1]
+            elif op == POP_JUMP_IF_FALSY:
+                pc = pc + 2 if stack.pop() else code[pc + 1]
+            elif op == CHECK_COND:
+                cond = stack.pop()
+                if type(cond) is int:
+                    cond = bool(cond)
+                if type(cond) is not bool:
+                    error(ErrorType.TYPE_ERROR, "Condition is not of type bool",)
+                pc += 1
+            elif op == JUMP:
+                pc = code[pc + 1]
+            elif op == LOAD_FIELD:
+                val = stack[-1]
+                field = consts[code[pc + 1]]
+                if val is nil:
+                    error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+                if type(val) is not StructObject:
+                    error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+                field_info = val._type.fields.get(field)
+                if field_info is None:
+                    error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+                stack[-1] = val._values[field_info[0]]
+                pc += 2
+            elif op == CHECK_ARG:
+                arg_value = stack[-1]
+                var_name, var_type = consts[code[pc + 1]]
+                if var_type == "bool" and type(arg_value) is int:
+                    arg_value = stack[-1] = bool(arg_value)
+                if not check_valid_type(arg_value, var_type):
+                    arg_type = arg_value._type.name if type(arg_value) is StructObject else type(arg_value)
+                    error(ErrorType.TYPE_ERROR, f"Invalid arg type {arg_type} given to formal parameter {var_name} of type {var_type}",)
+                pc += 2
+            elif op == CALL:
+                callee = funcs[code[pc + 1]]
+                arg_len = code[pc + 2]
+                if arg_len:
+                    new_locals = stack[-arg_len:]
+                    del stack[-arg_len:]
+                else:
+                    new_locals = []
+                frames.append((code_obj, code, consts, pc + 3, locals_, base))
+                new_locals.extend([None] * (callee.nlocals - arg_len))
+                code_obj = callee
+                code = callee.code
+                consts = callee.consts
+                locals_ = new_locals
+                base = len(stack)
+                pc = 0
+            elif op == RETURN or op == RETURN_IF_NOT_NIL:
+                return_value = stack.pop()
+                if op == RETURN_IF_NOT_NIL and return_value is nil:
+                    pc += 1
+                    continue
+                return_value = do_func_typecheck(code_obj.return_type, return_value)
+                if not frames:
+                    return return_value
+                # anything the callee left on the stack goes with it
+                del stack[base:]
+                code_obj, code, consts, pc, locals_, base = frames.pop()
+                stack.append(return_value)
+            elif op == POP:
+                stack.pop()
+                pc += 1
+            elif op == DEFINE_LOCAL:
+                locals_[code[pc + 1]] = stack.pop()
+                pc += 2
+            elif op == STORE_FIELD:
+                val = stack.pop()
+                resulting_value = stack.pop()
+                field = consts[code[pc + 1]]
+                if val is nil:
+                    error(ErrorType.FAULT_ERROR, f"Cannot apply field {field} to nil-value variable",)
+                if type(val) is not StructObject:
+                    error(ErrorType.TYPE_ERROR, f"Cannot apply field {field} to non-struct variable.",)
+                field_info = val._type.fields.get(field)
+                if field_info is None:
+                    error(ErrorType.NAME_ERROR, f"Field: {field} was not found",)
+                offset, var_type = field_info
+                if var_type == "bool" and type(resulting_value) is int:
+                    resulting_value = bool(resulting_value)
+                if not check_valid_type(resulting_value, var_type):
+                    error(ErrorType.TYPE_ERROR, f"Invalid type {type(resulting_value).__name__} assigned to variable with type {var_type}",)
+                val._values[offset] = resulting_value
+                pc += 2
+            elif op == UNARY_NEG:
+                eval = stack[-1]
+                if type(eval) is not int:
+                    error(ErrorType.TYPE_ERROR, "'negation' can only be used on integer values.",)
+                stack[-1] = -eval
+                pc += 1
+            elif op == UNARY_NOT:
+                eval = stack[-1]
+                if type(eval) is int:
+                    eval = bool(eval)
+                if type(eval) is not bool:
+                    error(ErrorType.TYPE_ERROR, "'Not' can only be used on boolean values.",)
+                stack[-1] = not eval
+                pc += 1
+            elif op == JUMP_IF_FALSE_OR_POP or op == JUMP_IF_TRUE_OR_POP:
+                cond = stack[-1]
+                if type(cond) is int:
+                    cond = bool(cond)
+                if type(cond) is not bool:
+                    error(ErrorType.TYPE_ERROR, f"Comparison args for {'&&' if op == JUMP_IF_FALSE_OR_POP else '||'} must be of same type bool.",)
+                if cond is (op == JUMP_IF_TRUE_OR_POP):
+                    stack[-1] = cond
+                    pc = code[pc + 1]
+                else:
+                    stack.pop()
+                    pc += 2
+            elif op == CHECK_BOOL_OPERAND:
+                if type(stack[-1]) is int:
+                    stack[-1] = bool(stack[-1])
+                elif type(stack[-1]) is not bool:
+                    error(ErrorType.TYPE_ERROR, f"Comparison args for {consts[code[pc + 1]]} must be of same type bool.",)
+                pc += 2
+            elif op == BOOL_AND or op == BOOL_OR:
+                eval2 = stack.pop()
+                eval1 = stack[-1]
+                if type(eval1) is int:
+                    eval1 = bool(eval1)
+                if type(eval2) is int:
+                    eval2 = bool(eval2)
+                if (type(eval1) is not bool) or (type(eval2) is not bool):
+                    error(ErrorType.TYPE_ERROR, f"Comparison args for {OPERATOR_SYMBOLS[op]} must be of same type bool.",)
+                stack[-1] = (eval1 and eval2) if op == BOOL_AND else (eval1 or eval2)
+                pc += 1
+            elif op == NEW:
+                stack.append(interp.new_struct_object(consts[code[pc + 1]]))
+                pc += 2
+            elif op == PRINT:
+                arg_len = code[pc + 1]
+                output = ""
+                for eval in (stack[-arg_len:] if arg_len else []):
+                    if type(eval) is bool:
+                        output += "true" if eval else "false"
+                    else:
+                        output += str(eval)
+                if arg_len:
+                    del stack[-arg_len:]
+                interp.output(output)
+                stack.append(nil)
+                pc += 2
+            elif op == INPUT:
+                if code[pc + 1]:
+                    interp.output(stack.pop())
+                user_in = interp.get_input()
+                try:
+                    user_in = int(user_in)
+                except:
+                    pass
+                stack.append(user_in)
+                pc += 2
+            elif op == LOAD_LOCAL_CHECKED:
+                val = locals_[code[pc + 1]]
+                if val is UNBOUND:
+                    error(*consts[code[pc + 2]])
+                stack.append(val)
+                pc += 3
+            elif op == STORE_LOCAL_CHECKED:
+                if locals_[code[pc + 1]] is UNBOUND:
+                    error(*consts[code[pc + 3]])
+                # the rest is a normal STORE_LOCAL
+                val = stack.pop()
+                var_type = consts[code[pc + 2]]
+                if var_type == "bool" and type(val) is int:
+                    val = bool(val)
+                if not check_valid_type(val, var_type):
+                    error(ErrorType.TYPE_ERROR, f"Invalid type {type(val).__name__} assigned to variable with type {var_type}",)
+                locals_[code[pc + 1]] = val
+                pc += 4
+            elif op == DEFAULT_VALUE:
+                stack.append(interp.get_default_value(consts[code[pc + 1]]))
+                pc += 2
+            elif op == RAISE_ERROR:
+                error(*consts[code[pc + 1]])
+            else:
+                raise RuntimeError(f"Unknown opcode {op} at {pc} in {code_obj.name}")